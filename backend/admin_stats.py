@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ID = "global"
+
+
+# Daily series on the dashboard: name -> (collection, value summed per document)
+DAILY_SERIES = {
+    "signups": ("users", 1),
+    "trips": ("trips", 1),
+    "chats": ("chats", 1),
+    # Payments are stored in paise
+    "revenue": ("payments", "$amount"),
+}
+
+
+def daily_counts_pipeline(since: datetime, value: Any = 1) -> list:
+    # The leading $match on created_at is what lets Mongo use the created index
+    return [
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+            "value": {"$sum": value}
+        }}
+    ]
+
+
+class AdminStats:
+    """Materialized admin dashboard stats.
+
+    Each refresh runs a handful of indexed queries (estimated totals,
+    per-plan counts and created_at-bounded daily series) and stores the
+    result in the admin_stats collection; the endpoint only reads that
+    snapshot. Workers skip a refresh another worker has just done.
+    """
+
+    def __init__(self, db, plans: Iterable[str], plan_prices: Dict[str, int], refresh_seconds: float = 300, history_days: int = 30):
+        self.db = db
+        self.plans = list(plans)
+        self.plan_prices = plan_prices
+        self.refresh_seconds = refresh_seconds
+        self.history_days = history_days
+
+    async def _daily(self, collection: str, value: Any, since: datetime) -> Dict[str, Any]:
+        rows = await self.db[collection].aggregate(daily_counts_pipeline(since, value)).to_list(None)
+        return {row["_id"]: row["value"] for row in rows}
+
+    async def compute(self) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        since = (now - timedelta(days=self.history_days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        # Totals come from collection metadata rather than a scan
+        totals = asyncio.gather(*(self.db[name].estimated_document_count() for name in ("users", "trips", "chats")))
+        plan_counts = asyncio.gather(*(self.db.users.count_documents({"subscription_plan": plan}) for plan in self.plans))
+        daily_series = asyncio.gather(*(self._daily(collection, value, since) for collection, value in DAILY_SERIES.values()))
+        (total_users, total_trips, total_chats), counts, series = await asyncio.gather(totals, plan_counts, daily_series)
+
+        plan_breakdown = dict(zip(self.plans, counts))
+        series = dict(zip(DAILY_SERIES, series))
+        daily = []
+        for offset in range(self.history_days):
+            day = (since + timedelta(days=offset)).strftime("%Y-%m-%d")
+            daily.append({
+                "date": day,
+                "signups": series["signups"].get(day, 0),
+                "trips": series["trips"].get(day, 0),
+                "chats": series["chats"].get(day, 0),
+                "revenue": series["revenue"].get(day, 0) / 100
+            })
+
+        return {
+            "total_users": total_users,
+            "total_trips": total_trips,
+            "total_chats": total_chats,
+            "plan_breakdown": plan_breakdown,
+            "revenue_estimate": sum(plan_breakdown[plan] * self.plan_prices.get(plan, 0) // 100 for plan in self.plans),
+            "daily": daily,
+            "computed_at": now
+        }
+
+    async def refresh(self) -> Dict[str, Any]:
+        stats = await self.compute()
+        await self.db.admin_stats.replace_one({"_id": SNAPSHOT_ID}, stats, upsert=True)
+        return stats
+
+    async def get(self, force: bool = False) -> Dict[str, Any]:
+        if not force:
+            snapshot = await self.db.admin_stats.find_one({"_id": SNAPSHOT_ID}, {"_id": 0})
+            if snapshot:
+                return snapshot
+        return await self.refresh()
+
+    async def _is_fresh(self) -> bool:
+        snapshot: Optional[Dict[str, Any]] = await self.db.admin_stats.find_one({"_id": SNAPSHOT_ID}, {"computed_at": 1})
+        if not snapshot or not isinstance(snapshot.get("computed_at"), datetime):
+            return False
+        computed_at = snapshot["computed_at"]
+        if computed_at.tzinfo is None:
+            computed_at = computed_at.replace(tzinfo=timezone.utc)
+        age = (datetime.now(timezone.utc) - computed_at).total_seconds()
+        return age < self.refresh_seconds / 2
+
+    async def ensure_fresh(self):
+        if not await self._is_fresh():
+            await self.refresh()
+
+    async def run(self):
+        # The lifespan computes the first snapshot before serving
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.ensure_fresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Admin stats refresh failed: {e!r}")
@@ -0,0 +1,43 @@
+"""Fill in search_text for trips saved before full-text search existed.
+
+Itineraries are stored compressed, so the trips text index reads the
+keywords that save_trip now keeps in search_text. Each update only
+applies if the trip still has no search_text, so a trip saved meanwhile
+keeps the keywords it was saved with.
+
+Usage:
+    python backfill_search_text.py [--batch-size 200] [--dry-run]
+"""
+import asyncio
+from typing import List
+
+from pymongo import UpdateOne
+
+from batch_migration import migrate_in_batches, migration_database, parse_args
+from itinerary_codec import decode_itinerary
+from text_search import search_keywords
+
+
+def build_updates(docs) -> List[UpdateOne]:
+    return [
+        UpdateOne(
+            {"_id": doc["_id"], "search_text": {"$exists": False}},
+            {"$set": {"search_text": search_keywords(decode_itinerary(doc.get("itinerary")) or "")}}
+        )
+        for doc in docs
+    ]
+
+
+async def backfill_trips(collection, batch_size: int, dry_run: bool):
+    return await migrate_in_batches(collection, {"search_text": {"$exists": False}}, {"itinerary": 1}, build_updates, batch_size, dry_run)
+
+
+async def main(batch_size: int, dry_run: bool):
+    async with migration_database() as db:
+        updated = await backfill_trips(db.trips, batch_size, dry_run)
+        print(f"trips: {'would index' if dry_run else 'indexed'} {updated} trip(s)")
+
+
+if __name__ == "__main__":
+    args = parse_args("Backfill trip search keywords", batch_size=200)
+    asyncio.run(main(args.batch_size, args.dry_run))
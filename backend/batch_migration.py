@@ -0,0 +1,66 @@
+"""Shared driver for the one-off data migration scripts.
+
+The scripts walk documents in _id order in small batches, so they are
+safe to run while the API is serving traffic and can be stopped and
+re-run at any point. Each update they build is guarded by the value it
+read, so a concurrent write is never clobbered.
+"""
+import argparse
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from pymongo import UpdateOne
+
+
+async def migrate_in_batches(
+    collection,
+    query: Dict[str, Any],
+    projection: Dict[str, Any],
+    build_updates: Callable[[List[Dict[str, Any]]], List[UpdateOne]],
+    batch_size: int,
+    dry_run: bool
+) -> int:
+    """Applies ``build_updates(batch)`` to every document matching ``query``.
+
+    Each batch's updates go out as one unordered bulk_write. Returns the
+    number of documents modified, or with ``dry_run`` the number of
+    updates that would have been sent.
+    """
+    changed = 0
+    last_id = None
+
+    while True:
+        batch_query = query if last_id is None else {"$and": [query, {"_id": {"$gt": last_id}}]}
+        docs = await collection.find(batch_query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return changed
+
+        operations = build_updates(docs)
+        if operations and not dry_run:
+            result = await collection.bulk_write(operations, ordered=False)
+            changed += result.modified_count
+        else:
+            changed += len(operations)
+        last_id = docs[-1]["_id"]
+
+
+@asynccontextmanager
+async def migration_database():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        yield client[os.environ['DB_NAME']]
+    finally:
+        client.close()
+
+
+def parse_args(description: str, batch_size: int) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--batch-size", type=int, default=batch_size)
+    parser.add_argument("--dry-run", action="store_true")
+    return parser.parse_args()
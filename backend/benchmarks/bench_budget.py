@@ -0,0 +1,51 @@
+"""Budget breakdown latency from the local cost tables.
+
+Usage:
+    python benchmarks/bench_budget.py --repeat 20000
+
+Times BudgetEngine.load once, then estimate() over a mix of destinations
+(exact names, aliases, "City, Country" forms and unknown places that fall
+back to the default row), durations, budgets and travel styles.
+"""
+import argparse
+import itertools
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from budget_engine import BudgetEngine  # noqa: E402
+
+DESTINATIONS = ["Goa", "Munnar", "Leh Ladakh", "Old Jaipur, Rajasthan", "Phuket, Thailand", "Atlantis"]
+DURATIONS = ["1-3 days", "4-7 days", "1-2 weeks", "2+ weeks"]
+BUDGETS = ["Budget-friendly (₹5,000-10,000)", "Mid-range (₹10,000-30,000)", "Luxury (₹30,000+)"]
+STYLES = ["Solo", "Couple", "Family", "Group"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    engine = BudgetEngine.load()
+    print(f"load: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    cases = list(itertools.product(DESTINATIONS, DURATIONS, BUDGETS, STYLES))
+    samples = []
+    for destination, duration, budget, style in itertools.islice(itertools.cycle(cases), args.repeat):
+        started = time.perf_counter()
+        engine.estimate(destination, duration, budget, style)
+        samples.append(time.perf_counter() - started)
+    print(f"estimate: p50={percentile(samples, 50) * 1e6:.1f}us p95={percentile(samples, 95) * 1e6:.1f}us "
+          f"p99={percentile(samples, 99) * 1e6:.1f}us over {len(samples)} calls")
+
+
+if __name__ == "__main__":
+    main()
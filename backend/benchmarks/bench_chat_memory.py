@@ -0,0 +1,88 @@
+"""Prompt size for /api/chat as one user's history grows.
+
+Usage:
+    python benchmarks/bench_chat_memory.py --sizes 10 100 1000 5000
+    python benchmarks/bench_chat_memory.py --mongo-url mongodb://localhost:27017
+
+Synthetic chat turns are inserted for a throwaway user, the summary is
+brought up to date with a stub summarizer, and the prompt ChatMemory
+builds is compared with one that replays the whole history (what a
+single ever-growing LLM session amounts to). Without --mongo-url the run
+uses mongomock-motor.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chat_memory import ChatMemory, count_tokens, format_turn  # noqa: E402
+
+QUESTION = "What should I pack for {days} days in Ladakh in October, and how much should I budget for cabs?"
+ANSWER = ("Pack thermal layers, a down jacket, sunscreen and a power bank. Shared cabs between Leh and "
+          "Nubra cost about ₹2,500 per seat; a private Innova runs ₹9,000-12,000 a day. Turn {n}.")
+
+
+async def stub_summarize(prompt: str, user_id: str) -> str:
+    # Stands in for the LLM: keeps a bounded slice of what it is asked to fold in
+    return prompt[-1200:]
+
+
+async def run(mongo_url: str, sizes):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url, tz_aware=True)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    db = client[f"bench_chat_memory_{uuid.uuid4().hex[:8]}"]
+    memory = ChatMemory(db.chats, db.chat_memory, stub_summarize)
+    user_id = str(uuid.uuid4())
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+
+    print(f"{'history':>8} {'full history tokens':>20} {'memory prompt tokens':>21} {'window turns':>13} {'build ms':>9}")
+    inserted, full_tokens = 0, 0
+    try:
+        for size in sizes:
+            batch = []
+            for n in range(inserted, size):
+                turn = {
+                    "id": str(uuid.uuid4()),
+                    "user_id": user_id,
+                    "message": QUESTION.format(days=n % 10 + 3),
+                    "response": ANSWER.format(n=n),
+                    "created_at": start + timedelta(minutes=n)
+                }
+                full_tokens += count_tokens(format_turn(turn))
+                batch.append(turn)
+            if batch:
+                await db.chats.insert_many(batch)
+            inserted = size
+
+            # The server refreshes once per message; catch up in one go here
+            while await memory.refresh(user_id):
+                pass
+
+            started = time.perf_counter()
+            _, usage = await memory.build_prompt(user_id, "Any last tips?")
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"{size:>8} {full_tokens:>20} {usage['prompt_tokens']:>21} {usage['window_turns']:>13} {elapsed:>9.1f}")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    args = parser.parse_args()
+    asyncio.run(run(args.mongo_url, sorted(args.sizes)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Cold start: import time, lifespan startup and time to first request.
+
+Usage:
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --runs 5 --mongo-url mongodb://localhost:27017 --top 15
+
+Each run starts a fresh interpreter that imports server, runs the app's
+lifespan and serves GET /api/ over httpx's ASGI transport, timing each
+phase. Without --mongo-url the app runs against mongomock-motor. --top
+lists the packages that took longest to import in the last run (from
+python -X importtime).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import asyncio, json, os, time
+import httpx
+if os.environ.get("COLD_START_MONGOMOCK"):
+    import mongomock_motor
+    import motor.motor_asyncio
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+
+async def main():
+    app = server.create_app()
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://cold-start") as client:
+            response = await client.get("/api/")
+            response.raise_for_status()
+        served = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - imported) * 1000,
+        "first_request_ms": (served - ready) * 1000,
+    }))
+
+asyncio.run(main())
+"""
+
+
+def slowest_imports(stderr: str, top: int):
+    # python -X importtime: "import time: self [us] | cumulative | imported package";
+    # self time is summed per top-level package
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(self_us) / 1000
+    return sorted(((ms, name) for name, ms in totals.items()), reverse=True)[:top]
+
+
+def run_once(args, importtime: bool):
+    env = {
+        **os.environ,
+        "LLM_PROVIDER": "fake",
+        "MONGO_URL": args.mongo_url or "mongodb://mongomock",
+        "DB_NAME": f"cold_start_{uuid.uuid4().hex[:8]}",
+    }
+    if not args.mongo_url:
+        env["COLD_START_MONGOMOCK"] = "1"
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD]
+    spawned = time.perf_counter()
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+    total = (time.perf_counter() - spawned) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process_ms"] = total
+    return timings, result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mongo-url", default=None)
+    parser.add_argument("--top", type=int, default=0, help="list the N packages slowest to import")
+    args = parser.parse_args()
+
+    runs = []
+    stderr = ""
+    for index in range(args.runs):
+        timings, stderr = run_once(args, importtime=args.top > 0 and index == args.runs - 1)
+        runs.append(timings)
+
+    print(f"{'phase':<18}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for phase in ("import_ms", "startup_ms", "first_request_ms", "process_ms"):
+        values = [run[phase] for run in runs]
+        print(f"{phase:<18}{statistics.median(values):>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+    if args.top:
+        print("\nslowest packages to import (last run, self time under -X importtime):")
+        for ms, name in slowest_imports(stderr, args.top):
+            print(f"{ms:>10.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
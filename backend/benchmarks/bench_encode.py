@@ -0,0 +1,96 @@
+"""Encode time per endpoint payload: FastAPI's default path vs FastJSONResponse.
+
+Usage:
+    python benchmarks/bench_encode.py --repeat 2000
+
+"before" is what FastAPI did for a returned model or dict: jsonable_encoder
+followed by JSONResponse.render. "after" is FastJSONResponse.render on the
+same object, which is what the routes now return.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from fast_json import FastJSONResponse  # noqa: E402
+from server import ChatMessage, Trip, User  # noqa: E402
+
+DAY = ("## Day {n}\n- Morning: Amber Fort and the Panna Meena ka Kund stepwell (₹200 entry)\n"
+       "- Afternoon: Thali lunch at a local bhojanalaya, then Hawa Mahal and Jantar Mantar\n"
+       "- Evening: Johari Bazaar for textiles; dinner on a rooftop facing Nahargarh\n"
+       "- Tips: carry cash for autos, start early to beat the heat\n\n")
+
+
+def make_trip(n: int = 0, days: int = 7) -> Trip:
+    return Trip(
+        user_id=str(uuid.uuid4()),
+        destination=f"Jaipur {n}",
+        duration="4-7 days",
+        budget="Moderate (₹10,000-25,000)",
+        interests=["History", "Food", "Shopping"],
+        travel_style="Family",
+        itinerary="".join(DAY.format(n=day) for day in range(1, days + 1)),
+        budget_breakdown={"accommodation": 9000, "food": 4500, "activities": 3000, "transport": 2500, "shopping": 2000, "miscellaneous": 1000},
+        share_token=str(uuid.uuid4())
+    )
+
+
+def payloads():
+    trip = make_trip(days=14)
+    summaries = []
+    for n in range(100):
+        doc = make_trip(n).model_dump()
+        doc.pop("itinerary")
+        doc.pop("budget_breakdown")
+        summaries.append(doc)
+    start = datetime.now(timezone.utc) - timedelta(days=1)
+    chats = [
+        ChatMessage(user_id="u", message="Best time to visit Ladakh?", response=DAY.format(n=n) * 2, created_at=start + timedelta(minutes=n)).model_dump()
+        for n in range(100)
+    ]
+    user = User(email="someone@example.com", name="Someone")
+    return {
+        "POST /api/trips (Trip model)": trip,
+        "GET /api/trips/{id} (Mongo dict)": trip.model_dump(),
+        "GET /api/trips (100 summaries)": summaries,
+        "GET /api/chat/history (100 chats)": chats,
+        "POST /api/chat (ChatMessage model)": ChatMessage(user_id="u", message="hi", response=DAY.format(n=1) * 4),
+        "GET /api/auth/me (User model)": user,
+    }
+
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    default_response = JSONResponse.__new__(JSONResponse)
+    fast_response = FastJSONResponse.__new__(FastJSONResponse)
+    print(f"{'payload':<38} {'bytes':>7} {'before us':>10} {'after us':>9} {'speedup':>8}")
+    for name, payload in payloads().items():
+        size = len(fast_response.render(payload))
+        before = timed(lambda: default_response.render(jsonable_encoder(payload)), args.repeat)
+        after = timed(lambda: fast_response.render(payload), args.repeat)
+        print(f"{name:<38} {size:>7} {before:>10.1f} {after:>9.1f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
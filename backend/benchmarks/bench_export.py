@@ -0,0 +1,119 @@
+"""Peak memory of the streaming exports over a large collection.
+
+Usage:
+    python benchmarks/bench_export.py --docs 1000000
+    python benchmarks/bench_export.py --docs 1000000 --format csv --batch-size 1000
+
+Streams --docs synthetic trip documents through the same export path as
+/api/me/export and throws the output away, printing the process's peak
+RSS as it goes. The documents are generated batch by batch behind a
+stand-in for a Motor cursor, so the data itself never sits in memory;
+any growth in peak RSS after the first checkpoint comes from the export.
+"""
+import argparse
+import asyncio
+import resource
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from exports import ExportSource, csv_gzip_stream, export_batches, ndjson_stream  # noqa: E402
+from itinerary_codec import decode_itinerary, encode_itinerary  # noqa: E402
+
+ITINERARY = "\n".join(
+    f"## Day {day}\n- Morning: old town walk\n- Afternoon: beaches and local food\n- Evening: night market"
+    for day in range(1, 8)
+)
+COLUMNS = ["id", "destination", "duration", "budget", "interests", "created_at", "itinerary"]
+
+
+class SyntheticCursor:
+    def __init__(self, total: int):
+        self.total = total
+        self._batch_size = 100
+        self._itinerary = encode_itinerary(ITINERARY)
+        self._started = datetime.now(timezone.utc)
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def batch_size(self, size: int):
+        self._batch_size = size
+        return self
+
+    async def __aiter__(self):
+        for start in range(0, self.total, self._batch_size):
+            # One "round trip" per batch, like a getMore
+            await asyncio.sleep(0)
+            for n in range(start, min(start + self._batch_size, self.total)):
+                yield {
+                    "id": f"{n:036d}",
+                    "user_id": "bench",
+                    "destination": "Goa",
+                    "duration": "4-7 days",
+                    "budget": "Moderate (₹10,000-30,000)",
+                    "interests": ["Beach", "Food"],
+                    "travel_style": "couple",
+                    "itinerary": self._itinerary,
+                    "budget_breakdown": {"accommodation": 12000, "food": 6000, "total": 18000},
+                    "created_at": self._started - timedelta(seconds=n)
+                }
+
+
+class SyntheticCollection:
+    def __init__(self, total: int):
+        self.total = total
+
+    def find(self, query, projection=None):
+        return SyntheticCursor(self.total)
+
+
+def decode_trip_itinerary(doc):
+    doc["itinerary"] = decode_itinerary(doc.get("itinerary"))
+    return doc
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run(args):
+    source = ExportSource("trips", SyntheticCollection(args.docs), {"_id": 0}, COLUMNS, prepare=decode_trip_itinerary)
+    batches = export_batches([source], {"user_id": "bench"}, args.batch_size, csv_columns=args.format == "csv")
+    stream = csv_gzip_stream(batches, COLUMNS) if args.format == "csv" else ndjson_stream(batches)
+
+    checkpoint_every = max(args.docs // 10, args.batch_size)
+    next_checkpoint = checkpoint_every
+    exported = output_bytes = 0
+    baseline = None
+    started = time.perf_counter()
+    print(f"{'docs':>10}{'MB out':>10}{'peak RSS MB':>14}")
+    async for chunk in stream:
+        output_bytes += len(chunk)
+        exported = min(exported + args.batch_size, args.docs)
+        if exported >= next_checkpoint:
+            rss = peak_rss_mb()
+            baseline = baseline if baseline is not None else rss
+            print(f"{exported:>10}{output_bytes / 1e6:>10.1f}{rss:>14.1f}")
+            next_checkpoint += checkpoint_every
+    elapsed = time.perf_counter() - started
+    rss = peak_rss_mb()
+    print(f"\n{args.docs} docs, {output_bytes / 1e6:.1f} MB {args.format} in {elapsed:.1f}s ({args.docs / elapsed:,.0f} docs/s)")
+    print(f"peak RSS {rss:.1f} MB, {rss - baseline:+.1f} MB since the first checkpoint")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Concurrent login throughput and health-check latency while logins run.
+
+Usage:
+    python benchmarks/bench_login.py --base-url http://localhost:8001 --concurrency 32 --logins 256
+
+A throwaway account is registered first. While the logins are in flight a
+probe hits GET /api/ in a loop; if bcrypt ran on the event loop its latency
+would track the login queue instead of staying flat.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(base_url: str, concurrency: int, logins: int):
+    api = f"{base_url.rstrip('/')}/api"
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    password = "bench-password"
+
+    async with httpx.AsyncClient(timeout=60) as client:
+        response = await client.post(f"{api}/auth/register", json={"email": email, "password": password, "name": "Bench"})
+        response.raise_for_status()
+
+        login_latencies = []
+        statuses = {}
+        health_latencies = []
+        semaphore = asyncio.Semaphore(concurrency)
+        done = asyncio.Event()
+
+        async def login_once():
+            async with semaphore:
+                start = time.perf_counter()
+                r = await client.post(f"{api}/auth/login", json={"email": email, "password": password})
+                login_latencies.append(time.perf_counter() - start)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+        async def probe_health():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get(f"{api}/")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe = asyncio.create_task(probe_health())
+        started = time.perf_counter()
+        await asyncio.gather(*(login_once() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+
+    print(f"logins: {logins} at concurrency {concurrency} in {elapsed:.2f}s ({logins / elapsed:.1f}/s)")
+    print(f"  status codes: {statuses}")
+    print(f"  login latency p50={percentile(login_latencies, 50) * 1000:.0f}ms "
+          f"p95={percentile(login_latencies, 95) * 1000:.0f}ms")
+    print(f"health probes: {len(health_latencies)}")
+    print(f"  latency p50={percentile(health_latencies, 50) * 1000:.1f}ms "
+          f"p95={percentile(health_latencies, 95) * 1000:.1f}ms "
+          f"max={max(health_latencies, default=0) * 1000:.1f}ms "
+          f"mean={statistics.fmean(health_latencies) * 1000 if health_latencies else 0:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--logins", type=int, default=256)
+    args = parser.parse_args()
+    asyncio.run(run(args.base_url, args.concurrency, args.logins))
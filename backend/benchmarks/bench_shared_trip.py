@@ -0,0 +1,108 @@
+"""Throughput of the public shared-trip endpoint with a warm cache.
+
+Usage:
+    python benchmarks/bench_shared_trip.py --base-url http://localhost:8001 --share-token TOKEN
+    python benchmarks/bench_shared_trip.py --base-url http://localhost:8001 --requests 20000 --revalidate
+
+Without --share-token a throwaway account is registered and one trip is
+created and shared first (start the server with LLM_PROVIDER=fake to
+skip the real LLM). --revalidate sends If-None-Match with the ETag of
+the first response, the way a browser or CDN revalidates, so every hit
+should be a bodyless 304. Run one uvicorn worker to get per-worker
+numbers; the client is usually the bottleneck before the server, so
+raise --clients to run several client processes.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+import uuid
+
+import httpx
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def create_shared_trip(api: str) -> str:
+    async with httpx.AsyncClient(timeout=300) as client:
+        email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+        response = await client.post(f"{api}/auth/register", json={"email": email, "password": "bench-password", "name": "Bench"})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        response = await client.post(f"{api}/trips", headers=headers, json={
+            "destination": "Jaipur", "duration": "4-7 days", "budget": "Moderate (₹10,000-25,000)",
+            "interests": ["History", "Food"], "travel_style": "Family"
+        })
+        response.raise_for_status()
+        response = await client.post(f"{api}/trips/{response.json()['id']}/share", headers=headers)
+        response.raise_for_status()
+        return response.json()["share_url"].rsplit("/", 1)[-1]
+
+
+async def hammer(url: str, concurrency: int, requests: int, revalidate: bool):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        first = await client.get(url)
+        first.raise_for_status()
+        headers = {"If-None-Match": first.headers["etag"]} if revalidate else {}
+
+        latencies = []
+        statuses = {}
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                start = time.perf_counter()
+                r = await client.get(url, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started, latencies, statuses, len(first.content)
+
+
+def run_client(args):
+    return asyncio.run(hammer(*args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--share-token")
+    parser.add_argument("--concurrency", type=int, default=64, help="connections per client process")
+    parser.add_argument("--clients", type=int, default=1, help="client processes")
+    parser.add_argument("--requests", type=int, default=10000, help="requests per client process")
+    parser.add_argument("--revalidate", action="store_true")
+    args = parser.parse_args()
+
+    api = f"{args.base_url.rstrip('/')}/api"
+    token = args.share_token or asyncio.run(create_shared_trip(api))
+    url = f"{api}/shared/{token}"
+    job = (url, args.concurrency, args.requests, args.revalidate)
+
+    with multiprocessing.Pool(args.clients) as pool:
+        results = pool.map(run_client, [job] * args.clients)
+
+    elapsed = max(result[0] for result in results)
+    latencies = [latency for result in results for latency in result[1]]
+    statuses = {}
+    for result in results:
+        for code, count in result[2].items():
+            statuses[code] = statuses.get(code, 0) + count
+    total = len(latencies)
+    print(f"GET {url} ({results[0][3]} byte body{', revalidating' if args.revalidate else ''})")
+    print(f"requests: {total} over {args.clients} client(s) x {args.concurrency} connections in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    print(f"  status codes: {statuses}")
+    print(f"  latency p50={percentile(latencies, 50) * 1000:.1f}ms "
+          f"p95={percentile(latencies, 95) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""Offline load test for the API routes.
+
+Usage:
+    python benchmarks/load_test.py --duration 30 --concurrency 32 --output results.json
+    python benchmarks/load_test.py --duration 30 --compare baseline.json --tolerance 0.25
+
+The app runs in-process over httpx's ASGI transport, with its lifespan,
+against mongomock-motor (or a real server with --mongo-url) and the
+fake LLM provider (LLM_PROVIDER=fake) with --llm-delay seconds per call.
+Virtual users pick requests from a weighted mix of register, login,
+create-trip, chat, list and shared-trip traffic until --duration runs
+out. A sampler measures event-loop lag; each sample is attributed to the
+routes that had requests in flight when it was taken.
+
+--compare exits with status 1 if any route's p95 latency, or the overall
+throughput, is worse than the baseline by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DEFAULT_MIX = {
+    "register": 2,
+    "login": 8,
+    "create_trip": 5,
+    "chat": 15,
+    "list_trips": 25,
+    "chat_history": 10,
+    "get_trip": 10,
+    "shared_trip": 25,
+}
+
+DESTINATIONS = ["Goa", "Jaipur", "Kerala", "Ladakh", "Varanasi", "Udaipur", "Rishikesh", "Hampi"]
+DURATIONS = ["1-3 days", "4-7 days", "8-14 days"]
+BUDGETS = ["Budget-friendly (₹5,000-10,000)", "Moderate (₹10,000-25,000)", "Luxury (₹50,000+)"]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def configure_environment(args):
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_DELAY_SECONDS"] = str(args.llm_delay)
+    os.environ["FAKE_LLM_JITTER_SECONDS"] = str(args.llm_delay / 4)
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ["MONGO_URL"] = args.mongo_url or "mongodb://mongomock"
+    os.environ["DB_NAME"] = f"load_test_{uuid.uuid4().hex[:8]}"
+    os.environ.pop("MONGO_VERIFY_QUERY_PLANS", None)
+    if not args.mongo_url:
+        import mongomock_motor
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+
+def trip_request(rng: random.Random) -> dict:
+    return {
+        "destination": rng.choice(DESTINATIONS),
+        "duration": rng.choice(DURATIONS),
+        "budget": rng.choice(BUDGETS),
+        "interests": rng.sample(["Beach", "Food", "History", "Adventure", "Shopping", "Nature"], 2),
+        "travel_style": rng.choice(["Solo", "Couple", "Family", "Friends"]),
+    }
+
+
+class LoadTest:
+    def __init__(self, client, services, args):
+        self.client = client
+        self.services = services
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.users = []
+        self.trip_ids = []
+        self.share_tokens = []
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.in_flight = defaultdict(int)
+        self.route_lag = defaultdict(list)
+        self.loop_lag = []
+
+    async def request(self, route: str, method: str, url: str, **kwargs):
+        self.in_flight[route] += 1
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as e:
+            self.errors[route][type(e).__name__] += 1
+            return None
+        finally:
+            self.in_flight[route] -= 1
+        self.latencies[route].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[route][str(response.status_code)] += 1
+        return response
+
+    async def register(self, route: str = "register"):
+        email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        response = await self.request(route, "POST", "/api/auth/register", json={"email": email, "password": "load-test-pw", "name": "Load Test"})
+        if response is None or response.status_code != 200:
+            return None
+        user = {"email": email, "id": response.json()["user"]["id"], "headers": {"Authorization": f"Bearer {response.json()['token']}"}}
+        # Paid plan, so quotas do not turn the mix into a stream of 403s
+        await self.services.db.users.update_one({"id": user["id"]}, {"$set": {"subscription_plan": "pro"}})
+        self.services.invalidate_cached_user(user["id"])
+        self.users.append(user)
+        return user
+
+    async def create_trip(self, user):
+        response = await self.request("create_trip", "POST", "/api/trips", json=trip_request(self.rng), headers=user["headers"])
+        if response is not None and response.status_code == 200:
+            self.trip_ids.append((user, response.json()["id"]))
+
+    async def setup(self):
+        for _ in range(self.args.users):
+            await self.register("setup")
+        for user in self.users[: max(1, len(self.users) // 2)]:
+            await self.create_trip(user)
+        for user, trip_id in self.trip_ids:
+            response = await self.client.post(f"/api/trips/{trip_id}/share", headers=user["headers"])
+            self.share_tokens.append(response.json()["share_url"].rsplit("/", 1)[-1])
+        self.latencies.clear()
+        self.errors.clear()
+
+    async def step(self, route: str):
+        user = self.rng.choice(self.users)
+        headers = user["headers"]
+        if route == "register":
+            await self.register()
+        elif route == "login":
+            await self.request(route, "POST", "/api/auth/login", json={"email": user["email"], "password": "load-test-pw"})
+        elif route == "create_trip":
+            await self.create_trip(user)
+        elif route == "chat":
+            await self.request(route, "POST", "/api/chat", json={"message": f"Best time to visit {self.rng.choice(DESTINATIONS)}?"}, headers=headers)
+        elif route == "list_trips":
+            await self.request(route, "GET", "/api/trips", headers=headers)
+        elif route == "chat_history":
+            await self.request(route, "GET", "/api/chat/history", headers=headers)
+        elif route == "get_trip":
+            owner, trip_id = self.rng.choice(self.trip_ids)
+            await self.request(route, "GET", f"/api/trips/{trip_id}", headers=owner["headers"])
+        elif route == "shared_trip":
+            await self.request(route, "GET", f"/api/shared/{self.rng.choice(self.share_tokens)}")
+
+    async def sample_loop_lag(self, stop: asyncio.Event, interval: float = 0.01):
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - started - interval)
+            self.loop_lag.append(lag)
+            for route, count in self.in_flight.items():
+                if count:
+                    self.route_lag[route].append(lag)
+
+    async def run(self):
+        routes = list(self.args.mix)
+        weights = [self.args.mix[route] for route in routes]
+        deadline = time.perf_counter() + self.args.duration
+        stop = asyncio.Event()
+
+        async def virtual_user():
+            while time.perf_counter() < deadline:
+                await self.step(self.rng.choices(routes, weights)[0])
+
+        sampler = asyncio.create_task(self.sample_loop_lag(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user() for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+        return elapsed
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            lag = self.route_lag.get(route, [])
+            routes[route] = {
+                "count": len(samples),
+                "errors": dict(self.errors.get(route, {})),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+                "max_ms": round(max(samples) * 1000, 2),
+                "loop_lag_p95_ms": round(percentile(lag, 95) * 1000, 2),
+                "loop_lag_max_ms": round(max(lag, default=0) * 1000, 2),
+            }
+        total = sum(route["count"] for route in routes.values())
+        return {
+            "config": {
+                "duration": self.args.duration,
+                "concurrency": self.args.concurrency,
+                "users": self.args.users,
+                "llm_delay": self.args.llm_delay,
+                "bcrypt_rounds": self.args.bcrypt_rounds,
+                "mongo": "real" if self.args.mongo_url else "mongomock",
+                "mix": self.args.mix,
+                "seed": self.args.seed,
+            },
+            "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "elapsed_seconds": round(elapsed, 2),
+            "total": {"count": total, "throughput_rps": round(total / elapsed, 2)},
+            "loop_lag": {
+                "samples": len(self.loop_lag),
+                "p50_ms": round(percentile(self.loop_lag, 50) * 1000, 2),
+                "p95_ms": round(percentile(self.loop_lag, 95) * 1000, 2),
+                "p99_ms": round(percentile(self.loop_lag, 99) * 1000, 2),
+                "max_ms": round(max(self.loop_lag, default=0) * 1000, 2),
+            },
+            "routes": routes,
+        }
+
+
+def print_report(report: dict):
+    print(f"{'route':<14} {'count':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'lag p95':>8} errors")
+    for route, stats in report["routes"].items():
+        print(f"{route:<14} {stats['count']:>7} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['loop_lag_p95_ms']:>8.1f} {stats['errors'] or ''}")
+    lag = report["loop_lag"]
+    print(f"total: {report['total']['count']} requests in {report['elapsed_seconds']}s ({report['total']['throughput_rps']} req/s)")
+    print(f"event loop lag: p50={lag['p50_ms']}ms p95={lag['p95_ms']}ms p99={lag['p99_ms']}ms max={lag['max_ms']}ms")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    print(f"\n{'route':<14} {'base p95':>9} {'p95':>9} {'change':>8}")
+    for route, stats in report["routes"].items():
+        base = baseline.get("routes", {}).get(route)
+        if not base:
+            print(f"{route:<14} {'-':>9} {stats['p95_ms']:>9.1f} {'new':>8}")
+            continue
+        change = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        flag = " REGRESSION" if change > tolerance else ""
+        print(f"{route:<14} {base['p95_ms']:>9.1f} {stats['p95_ms']:>9.1f} {change:>+8.0%}{flag}")
+        if flag:
+            regressions.append(f"{route} p95 {base['p95_ms']}ms -> {stats['p95_ms']}ms")
+    base_rps = baseline.get("total", {}).get("throughput_rps", 0)
+    if base_rps and report["total"]["throughput_rps"] < base_rps * (1 - tolerance):
+        regressions.append(f"throughput {base_rps} -> {report['total']['throughput_rps']} req/s")
+    if baseline.get("config") != report["config"]:
+        print("warning: baseline was recorded with a different configuration")
+    return regressions
+
+
+async def main(args) -> int:
+    configure_environment(args)
+    import httpx
+    import server
+
+    app = server.create_app()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=120) as client:
+            load_test = LoadTest(client, app.state.services, args)
+            await load_test.setup()
+            elapsed = await load_test.run()
+    report = load_test.report(elapsed)
+
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"wrote {args.output}")
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        route, _, weight = part.partition("=")
+        if route not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown route {route!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[route] = float(weight or 1)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=20, help="accounts created before the run")
+    parser.add_argument("--llm-delay", type=float, default=0.2)
+    parser.add_argument("--bcrypt-rounds", type=int, default=int(os.environ.get("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--mongo-url", default="", help="use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="comma-separated route=weight, e.g. list_trips=5,shared_trip=5")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95/throughput regression")
+    sys.exit(asyncio.run(main(parser.parse_args())))
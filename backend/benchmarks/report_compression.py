@@ -0,0 +1,101 @@
+"""Storage and bandwidth savings from itinerary and response compression.
+
+Usage:
+    python benchmarks/report_compression.py --trips 500
+
+Builds a synthetic corpus of Markdown itineraries shaped like the LLM's
+output, then reports the stored size with each at-rest codec and the
+GET /api/trips/{id} response size with each transport encoding.
+"""
+import argparse
+import random
+import sys
+import uuid
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import itinerary_codec  # noqa: E402
+from compression import _Compressor, brotli  # noqa: E402
+from fast_json import dumps  # noqa: E402
+
+DESTINATIONS = ["Goa", "Jaipur", "Kerala backwaters", "Ladakh", "Varanasi", "Rishikesh", "Andaman Islands", "Udaipur", "Darjeeling", "Hampi", "Bali", "Dubai"]
+SIGHTS = ["the old fort", "a spice market", "the sunset point", "a heritage walk", "the local museum", "a temple complex",
+          "a boat ride", "the night bazaar", "a cooking class", "a tea estate", "the lake promenade", "a wildlife safari"]
+FOODS = ["thali", "street chaat", "seafood curry", "momos", "dosa breakfast", "biryani", "kulfi", "filter coffee"]
+
+
+def synthetic_itinerary(rng: random.Random) -> str:
+    destination = rng.choice(DESTINATIONS)
+    days = rng.randint(3, 14)
+    parts = [f"# {days}-day itinerary for {destination}\n\n## Overview\n"
+             f"A {rng.choice(['relaxed', 'packed', 'balanced'])} trip covering the highlights of {destination}.\n"]
+    for day in range(1, days + 1):
+        parts.append(
+            f"\n## Day {day}\n"
+            f"- **Morning:** Visit {rng.choice(SIGHTS)} (entry ₹{rng.randint(1, 20) * 50}). Arrive early to avoid crowds.\n"
+            f"- **Lunch:** Try {rng.choice(FOODS)} at a local favourite (₹{rng.randint(2, 12) * 100} for two).\n"
+            f"- **Afternoon:** Explore {rng.choice(SIGHTS)}; hire a guide for about ₹{rng.randint(5, 15) * 100}.\n"
+            f"- **Evening:** {rng.choice(['Sunset at', 'Shopping near', 'Live music by'])} {rng.choice(SIGHTS)}, "
+            f"dinner with {rng.choice(FOODS)}.\n"
+            f"- **Stay:** {rng.choice(['Boutique homestay', 'Heritage hotel', 'Beach resort', 'Budget hostel'])} "
+            f"(₹{rng.randint(15, 120) * 100}/night).\n"
+        )
+    parts.append("\n## Tips\n- Carry cash for autos and small shops.\n- Book trains early in peak season.\n- Keep copies of your ID.\n")
+    return "".join(parts)
+
+
+def trip_doc(itinerary: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()), "user_id": str(uuid.uuid4()), "destination": "Goa", "duration": "4-7 days",
+        "budget": "Moderate (₹10,000-25,000)", "interests": ["Beach", "Food"], "travel_style": "Friends",
+        "itinerary": itinerary,
+        "budget_breakdown": {"accommodation": "₹9000", "food": "₹4500", "activities": "₹3000", "transport": "₹2500"},
+        "language": "en", "shared_with": [], "is_public": False, "share_token": str(uuid.uuid4()),
+        "created_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc)
+    }
+
+
+def percent(before: int, after: int) -> str:
+    return f"{100 * (1 - after / before):.0f}%" if before else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trips", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [synthetic_itinerary(rng) for _ in range(args.trips)]
+    raw = sum(len(text.encode("utf-8")) for text in corpus)
+
+    print(f"corpus: {args.trips} itineraries, {raw} bytes, mean {raw // args.trips} bytes\n")
+    print("at rest (itinerary field)")
+    print(f"  {'plain text':<28} {raw:>10}")
+    zlib_total = sum(len(zlib.compress(text.encode("utf-8"), itinerary_codec.ZLIB_LEVEL)) for text in corpus)
+    print(f"  {'zlib level %d' % itinerary_codec.ZLIB_LEVEL:<28} {zlib_total:>10}  {percent(raw, zlib_total)} smaller")
+    if itinerary_codec.zstandard is not None:
+        compressor = itinerary_codec.zstandard.ZstdCompressor(level=itinerary_codec.ZSTD_LEVEL)
+        zstd_total = sum(len(compressor.compress(text.encode("utf-8"))) for text in corpus)
+        print(f"  {'zstd level %d' % itinerary_codec.ZSTD_LEVEL:<28} {zstd_total:>10}  {percent(raw, zstd_total)} smaller")
+    stored = 0
+    for text in corpus:
+        encoded = itinerary_codec.encode_itinerary(text)
+        stored += len(encoded["data"]) if itinerary_codec.is_compressed(encoded) else len(text.encode("utf-8"))
+    print(f"  {'as stored (threshold %d B)' % itinerary_codec.COMPRESS_MIN_BYTES:<28} {stored:>10}  {percent(raw, stored)} smaller")
+
+    bodies = [dumps(trip_doc(text)) for text in corpus]
+    plain = sum(len(body) for body in bodies)
+    print("\non the wire (GET /api/trips/{id} body)")
+    print(f"  {'identity':<28} {plain:>10}")
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        total = sum(len(_Compressor(encoding, 6, 4).compress(body, final=True)) for body in bodies)
+        print(f"  {encoding:<28} {total:>10}  {percent(plain, total)} smaller")
+
+
+if __name__ == "__main__":
+    main()
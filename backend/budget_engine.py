@@ -0,0 +1,176 @@
+import json
+import math
+import re
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from trip_cache import bucket_budget, budget_range, duration_days
+
+COST_TABLES_PATH = Path(__file__).parent / "data" / "cost_tables.json"
+
+DEFAULT_DAYS = 3
+DEFAULT_TIER = "mid"
+ROUND_TO = 100
+# Below this share of the estimate a budget is reported as too small
+# rather than spread so thin that no category is realistic
+MIN_BUDGET_SCALE = 0.5
+
+
+def _normalize(value: str) -> str:
+    return " ".join(re.sub(r"[^\w\s,]", " ", value.lower()).split())
+
+
+def _round(amount: float) -> int:
+    return int(round(amount / ROUND_TO) * ROUND_TO)
+
+
+def _round_down(amount: float) -> int:
+    # Keeps the rounded categories from adding up to more than the budget
+    return int(math.floor(amount / ROUND_TO) * ROUND_TO)
+
+
+class BudgetEngine:
+    """Budget breakdowns from per-destination cost tables, no LLM involved.
+
+    The tables are read once into a name -> row index and one flat
+    ``array`` of daily costs per destination (tier-major, then category).
+    Accommodation is priced per room per night; food, activities and
+    local transport per traveller per day; shopping and miscellaneous as
+    a share of that subtotal. A total above the top of the requested
+    budget range first drops to a cheaper tier, then is scaled down to
+    fit, unless the budget is under MIN_BUDGET_SCALE of even the cheapest
+    estimate: then that estimate is returned as is and flagged
+    ``over_budget``.
+    """
+
+    def __init__(self, tables: Dict[str, Any]):
+        self.currency = tables["currency"]
+        self.tiers: List[str] = tables["tiers"]
+        self.categories: List[str] = tables["categories"]
+        self.extras: Dict[str, float] = tables["extras"]
+        self.travel_styles: Dict[str, Dict[str, int]] = tables["travel_styles"]
+        self._names: List[str] = []
+        self._costs: List[array] = []
+        self._index: Dict[str, int] = {}
+        for name, entry in tables["destinations"].items():
+            row = len(self._names)
+            self._names.append(name)
+            self._costs.append(array("i", [cost for tier in entry["costs"] for cost in tier]))
+            for alias in [name] + entry.get("aliases", []):
+                self._index[_normalize(alias)] = row
+        self._default = self._index[tables["default"]]
+        self._max_words = max(len(alias.split()) for alias in self._index)
+
+    @classmethod
+    def load(cls, path: Path = COST_TABLES_PATH) -> "BudgetEngine":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _lookup(self, destination: str) -> Tuple[int, bool]:
+        text = _normalize(destination)
+        if text in self._index:
+            return self._index[text], True
+        # "Old Goa, India" or "Leh to Pangong": try comma parts, then the
+        # longest known phrase anywhere in the text
+        for part in text.split(","):
+            part = part.strip()
+            if part in self._index:
+                return self._index[part], True
+        words = text.replace(",", " ").split()
+        for size in range(min(self._max_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                row = self._index.get(" ".join(words[start:start + size]))
+                if row is not None:
+                    return row, True
+        return self._default, False
+
+    def _amounts(self, row: int, tier_index: int, days: int, nights: int, travellers: int, rooms: int) -> Dict[str, float]:
+        costs = self._costs[row]
+        offset = tier_index * len(self.categories)
+        amounts: Dict[str, float] = {}
+        for i, category in enumerate(self.categories):
+            daily = costs[offset + i]
+            amounts[category] = daily * rooms * nights if category == "accommodation" else daily * travellers * days
+        subtotal = sum(amounts.values())
+        for category, share in self.extras.items():
+            amounts[category] = subtotal * share
+        return amounts
+
+    def estimate(self, destination: str, duration: str, budget: str, travel_style: str) -> Dict[str, Any]:
+        row, matched = self._lookup(destination)
+        tier = bucket_budget(budget)
+        if tier not in self.tiers:
+            tier = DEFAULT_TIER
+        days = duration_days(duration) or DEFAULT_DAYS
+        nights = max(days - 1, 1)
+        party = self.travel_styles.get(_normalize(travel_style), self.travel_styles["solo"])
+        travellers, rooms = party["travellers"], party["rooms"]
+
+        _, ceiling = budget_range(budget)
+        # A stated budget too small for the requested tier gets the best
+        # tier it can pay for
+        index = self.tiers.index(tier)
+        amounts = self._amounts(row, index, days, nights, travellers, rooms)
+        while ceiling and index > 0 and sum(amounts.values()) > ceiling:
+            index -= 1
+            amounts = self._amounts(row, index, days, nights, travellers, rooms)
+        tier = self.tiers[index]
+
+        estimated = sum(amounts.values())
+        over_budget = bool(ceiling) and ceiling < estimated * MIN_BUDGET_SCALE
+        fits = bool(ceiling) and not over_budget
+        scale = ceiling / estimated if fits and estimated > ceiling else 1.0
+        round_amount = _round_down if fits else _round
+        breakdown: Dict[str, Any] = {category: round_amount(amount * scale) for category, amount in amounts.items()}
+        breakdown["total"] = sum(breakdown.values())
+        breakdown["currency"] = self.currency
+        breakdown["basis"] = {
+            "destination": self._names[row],
+            "matched": matched,
+            "tier": tier,
+            "days": days,
+            "nights": nights,
+            "travellers": travellers,
+            "rooms": rooms,
+            "scaled_to_budget": scale < 1.0,
+            "over_budget": over_budget,
+            "budget_ceiling": ceiling,
+            "estimated_total": _round(estimated)
+        }
+        return breakdown
+
+
+def parse_refined_budget(reply: str, base: Dict[str, Any]) -> Dict[str, Any]:
+    # Takes the first JSON object in the reply, keeps only known categories
+    # with numeric values within 0.5x-2x of the table estimate, and falls
+    # back to the estimate for anything else
+    match = re.search(r"\{.*\}", reply, re.DOTALL)
+    try:
+        refined = json.loads(match.group(0)) if match else {}
+    except ValueError:
+        refined = {}
+    if not isinstance(refined, dict):
+        refined = {}
+    result = dict(base)
+    changed = False
+    for category, amount in base.items():
+        if category in ("total", "currency", "basis"):
+            continue
+        value = refined.get(category)
+        if isinstance(value, str):
+            try:
+                value = float(re.sub(r"[^\d.]", "", value))
+            except ValueError:
+                value = None
+        if isinstance(value, (int, float)) and not math.isnan(value) and amount * 0.5 <= value <= max(amount * 2, ROUND_TO):
+            result[category] = _round(value)
+            changed = changed or result[category] != amount
+    if changed:
+        result["total"] = sum(v for k, v in result.items() if k not in ("total", "currency", "basis"))
+        result["basis"] = {**base["basis"], "refined": True}
+        ceiling = base["basis"].get("budget_ceiling")
+        if ceiling and not base["basis"].get("over_budget") and result["total"] > ceiling:
+            # A refinement may move money between categories, not exceed the budget
+            return base
+    return result
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pagination import PAGE_SORT, after_cursor, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Loaded on first use (or by load_tokenizer at startup); get_encoding may
+# have to download the encoding files. False once tiktoken proved unusable.
+_encoding = None
+
+
+def load_tokenizer():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:  # tiktoken missing, or its encoding files cannot be fetched
+            logger.info(f"tiktoken unavailable, estimating tokens from length: {e!r}")
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = load_tokenizer()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1
+
+TURN_PROJECTION = {"_id": 0, "id": 1, "message": 1, "response": 1, "created_at": 1}
+
+SUMMARY_PROMPT = """Update the running summary of a travel-planning conversation.
+Keep destinations, dates, budgets, preferences and decisions; drop small talk.
+Reply with the new summary only, in at most {max_words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{turns}"""
+
+
+def format_turn(turn: Dict[str, Any]) -> str:
+    return f"User: {turn['message']}\nAssistant: {turn['response']}"
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    # Keep the tail, which holds the most recent facts
+    tokens = count_tokens(text)
+    while tokens > max_tokens and text:
+        text = text[-int(len(text) * max_tokens / tokens * 0.95):]
+        tokens = count_tokens(text)
+    return text
+
+
+def _newer_than(cursor: str) -> Dict[str, Any]:
+    created_at, doc_id = decode_cursor(cursor)
+    return {"$or": [
+        {"created_at": {"$gt": created_at}},
+        {"created_at": created_at, "id": {"$gt": doc_id}}
+    ]}
+
+
+class ChatMemory:
+    """Token-budgeted context for /api/chat.
+
+    Each prompt carries the rolling summary (at most ``summary_tokens``)
+    plus the newest turns that fit in ``window_tokens``. Turns that fall
+    out of the window are folded into the summary in the background, a
+    batch at a time, once ``refresh_tokens`` worth of them have piled up.
+    The summary and how far it reaches are stored in the chat_memory
+    collection.
+    """
+
+    def __init__(
+        self,
+        chats,
+        memory,
+        summarize: Callable[[str, str], Awaitable[str]],
+        window_tokens: int = 1500,
+        summary_tokens: int = 400,
+        refresh_tokens: int = 1000,
+        max_window_turns: int = 20,
+        batch_turns: int = 50
+    ):
+        self.chats = chats
+        self.memory = memory
+        self.summarize = summarize
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.refresh_tokens = refresh_tokens
+        self.max_window_turns = max_window_turns
+        self.batch_turns = batch_turns
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.stats = {"refreshes": 0, "summarized_turns": 0, "refresh_errors": 0}
+
+    async def _window(self, user_id: str) -> Tuple[List[Dict[str, Any]], int]:
+        recent = await self.chats.find({"user_id": user_id}, TURN_PROJECTION).sort(PAGE_SORT).limit(self.max_window_turns).to_list(self.max_window_turns)
+        window, used = [], 0
+        for turn in recent:
+            tokens = count_tokens(format_turn(turn))
+            if window and used + tokens > self.window_tokens:
+                break
+            if not window and tokens > self.window_tokens:
+                # A single oversized turn still goes in, trimmed to the budget
+                turn = {**turn, "response": truncate_to_tokens(turn["response"], self.window_tokens // 2)}
+                tokens = count_tokens(format_turn(turn))
+            window.append(turn)
+            used += tokens
+        window.reverse()
+        return window, used
+
+    async def build_prompt(self, user_id: str, message: str) -> Tuple[str, Dict[str, int]]:
+        (window, window_used), state = await asyncio.gather(
+            self._window(user_id),
+            self.memory.find_one({"user_id": user_id}, {"_id": 0, "summary": 1})
+        )
+        summary = truncate_to_tokens((state or {}).get("summary", ""), self.summary_tokens)
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of the earlier conversation:\n{summary}")
+        if window:
+            parts.append("Recent conversation:\n" + "\n\n".join(format_turn(turn) for turn in window))
+        parts.append(f"User: {message}")
+        prompt = "\n\n".join(parts)
+        usage = {
+            "summary_tokens": count_tokens(summary) if summary else 0,
+            "window_tokens": window_used,
+            "window_turns": len(window),
+            "prompt_tokens": count_tokens(prompt)
+        }
+        return prompt, usage
+
+    def schedule_refresh(self, user_id: str) -> Optional[asyncio.Task]:
+        # One refresh per user at a time in this process
+        if user_id in self._refreshing:
+            return None
+        task = asyncio.create_task(self.refresh(user_id))
+        self._refreshing[user_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(user_id, None))
+        return task
+
+    async def refresh(self, user_id: str) -> int:
+        try:
+            return await self._refresh(user_id)
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            logger.error(f"Chat memory refresh failed for {user_id}: {e!r}")
+            return 0
+
+    async def _refresh(self, user_id: str) -> int:
+        window, _ = await self._window(user_id)
+        if not window:
+            return 0
+        state = await self.memory.find_one({"user_id": user_id}, {"_id": 0}) or {}
+        summarized_until = state.get("summarized_until")
+
+        query = after_cursor({"user_id": user_id}, encode_cursor(window[0]))
+        if summarized_until:
+            query = {"$and": [query, _newer_than(summarized_until)]}
+        turns = await self.chats.find(query, TURN_PROJECTION).sort([(field, 1) for field, _ in PAGE_SORT]).limit(self.batch_turns).to_list(self.batch_turns)
+        text = "\n\n".join(format_turn(turn) for turn in turns)
+        if not turns or count_tokens(text) < self.refresh_tokens:
+            return 0
+
+        summary = await self.summarize(
+            SUMMARY_PROMPT.format(
+                max_words=int(self.summary_tokens * 0.75),
+                summary=state.get("summary") or "(none yet)",
+                turns=truncate_to_tokens(text, self.refresh_tokens * 4)
+            ),
+            user_id
+        )
+        # Compare-and-set on summarized_until so a concurrent refresh in
+        # another process cannot be overwritten with an older summary
+        result = await self.memory.update_one(
+            {"user_id": user_id, "summarized_until": summarized_until},
+            {"$set": {
+                "summary": truncate_to_tokens(summary.strip(), self.summary_tokens),
+                "summarized_until": encode_cursor(turns[-1]),
+                "updated_at": datetime.now(timezone.utc)
+            }, "$inc": {"summarized_turns": len(turns)}},
+            upsert=not state
+        )
+        if not (result.matched_count or result.upserted_id):
+            return 0
+        self.stats["refreshes"] += 1
+        self.stats["summarized_turns"] += len(turns)
+        return len(turns)
@@ -0,0 +1,202 @@
+"""Index declarations for every query shape used by server.py.
+
+Run ``python db_indexes.py`` to create the indexes, or
+``python db_indexes.py --check`` to also explain() each query shape and
+exit non-zero if any of them would fall back to a collection scan.
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+from admin_stats import DAILY_SERIES, daily_counts_pipeline
+from pagination import PAGE_SORT
+from text_search import LANGUAGE_OVERRIDE
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_id"),
+        IndexModel([("quota_period", ASCENDING)], name="quota_period"),
+        IndexModel([("subscription_plan", ASCENDING)], name="subscription_plan"),
+    ],
+    "trips": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_id"),
+        IndexModel([("share_token", ASCENDING), ("is_public", ASCENDING)], name="share_token_public"),
+        IndexModel([("created_at", DESCENDING)], name="created"),
+        # Search is always per user, so user_id prefixes the text index
+        IndexModel(
+            [("user_id", ASCENDING), ("destination", TEXT), ("interests", TEXT), ("search_text", TEXT)],
+            name="user_text", weights={"destination": 10, "interests": 5, "search_text": 1},
+            default_language="english", language_override=LANGUAGE_OVERRIDE
+        ),
+    ],
+    "chats": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_id"),
+        IndexModel([("created_at", DESCENDING)], name="created"),
+        IndexModel(
+            [("user_id", ASCENDING), ("message", TEXT), ("response", TEXT)],
+            name="user_text", weights={"message": 3, "response": 1},
+            default_language="english", language_override=LANGUAGE_OVERRIDE
+        ),
+    ],
+    "chat_memory": [
+        IndexModel([("user_id", ASCENDING)], unique=True, name="user_unique"),
+    ],
+    "payments": [
+        IndexModel([("created_at", DESCENDING)], name="created"),
+    ],
+    # key is only set while an order is open, one per user and plan
+    "payment_orders": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True, sparse=True),
+        IndexModel([("order_id", ASCENDING)], name="order_id", sparse=True),
+    ],
+    "notifications": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_id"),
+    ],
+    "trip_jobs": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease"),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_ttl"),
+    ],
+    "notification_counters": [
+        IndexModel([("user_id", ASCENDING)], unique=True, name="user_unique"),
+    ],
+    "itinerary_cache": [
+        IndexModel([("key", ASCENDING)], unique=True, name="key_unique"),
+        # Let Mongo drop expired entries on its own
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_ttl"),
+    ],
+}
+
+# Superseded by the indexes above; dropped if still present
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    "trips": ["user_created"],
+    "chats": ["user_created"],
+    "notifications": ["user_created"],
+}
+
+# (collection, description, filter, sort) for each query the routes issue
+QUERY_SHAPES: List[tuple] = [
+    ("users", "login / register by email", {"email": "someone@example.com"}, None),
+    ("users", "current user by id", {"id": "user-id"}, None),
+    ("users", "admin user list and export, newest first", {}, PAGE_SORT),
+    ("users", "monthly quota reset", {"quota_period": {"$ne": "2000-01"}}, None),
+    ("trips", "trip by id", {"id": "trip-id"}, None),
+    ("trips", "trips and trip export by user, newest first", {"user_id": "user-id"}, PAGE_SORT),
+    ("trips", "public trip by share token", {"share_token": "token", "is_public": True}, None),
+    ("chats", "chat history and export by user, newest first", {"user_id": "user-id"}, PAGE_SORT),
+    ("chat_memory", "chat summary by user", {"user_id": "user-id"}, None),
+    ("notifications", "notifications by user, newest first", {"user_id": "user-id"}, PAGE_SORT),
+    ("notifications", "mark notification read", {"id": "notif-id", "user_id": "user-id"}, None),
+    ("trip_jobs", "trip job status", {"id": "job-id", "user_id": "user-id"}, None),
+    ("trip_jobs", "claim queued trip job", {"status": "queued", "available_at": {"$lte": datetime(2000, 1, 1)}}, [("available_at", 1)]),
+    ("trip_jobs", "reclaim expired trip job lease", {"status": "running", "lease_until": {"$lt": datetime(2000, 1, 1)}}, None),
+    ("notifications", "mark all notifications read", {"user_id": "user-id", "read": False}, None),
+    ("notification_counters", "unread count by user", {"user_id": "user-id"}, None),
+    ("itinerary_cache", "cached itinerary by key", {"key": "cache-key"}, None),
+    ("users", "admin stats users by plan", {"subscription_plan": "free"}, None),
+    ("trips", "text search by user", {"user_id": "user-id", "$text": {"$search": "goa beach"}}, None),
+    ("chats", "text search by user", {"user_id": "user-id", "$text": {"$search": "visa"}}, None),
+    ("payment_orders", "open order by user and plan", {"key": "user-id:pro"}, None),
+    ("payment_orders", "order by provider order id", {"order_id": "order-id", "status": "created"}, None),
+]
+
+# (collection, description, pipeline) for each aggregation, built by the code that runs it
+PIPELINE_SHAPES: List[tuple] = [
+    (collection, f"admin stats daily {name}", daily_counts_pipeline(datetime(2000, 1, 1), value))
+    for name, (collection, value) in DAILY_SERIES.items()
+]
+
+
+async def ensure_indexes(db) -> List[str]:
+    # create_indexes is a no-op for indexes that already exist with the same spec
+    errors = []
+    for collection, models in INDEXES.items():
+        try:
+            existing = await db[collection].index_information()
+            for name in RETIRED_INDEXES.get(collection, []):
+                if name in existing:
+                    await db[collection].drop_index(name)
+            await db[collection].create_indexes(models)
+        except Exception as e:
+            errors.append(f"{collection}: {e}")
+            logger.error(f"Failed to create indexes on {collection}: {e}")
+    return errors
+
+
+def _plan_stages(plan: Any):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def _winning_plans(explanation: Any):
+    # Aggregations nest the query planner under their first stage
+    if isinstance(explanation, dict):
+        for key, value in explanation.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from _winning_plans(value)
+    elif isinstance(explanation, list):
+        for item in explanation:
+            yield from _winning_plans(item)
+
+
+def _uses_collscan(explanation: Dict[str, Any]) -> bool:
+    return any("COLLSCAN" in set(_plan_stages(plan)) for plan in _winning_plans(explanation))
+
+
+async def verify_query_plans(db) -> List[str]:
+    failures = []
+    for collection, description, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        if _uses_collscan(await cursor.explain()):
+            failures.append(f"{collection}: {description} uses COLLSCAN")
+    for collection, description, pipeline in PIPELINE_SHAPES:
+        explanation = await db.command("aggregate", collection, pipeline=pipeline, explain=True)
+        if _uses_collscan(explanation):
+            failures.append(f"{collection}: {description} uses COLLSCAN")
+    return failures
+
+
+async def _main(check: bool) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        errors = await ensure_indexes(db)
+        if check:
+            errors += await verify_query_plans(db)
+    finally:
+        client.close()
+    for error in errors:
+        print(error)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main("--check" in sys.argv[1:])))
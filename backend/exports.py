@@ -0,0 +1,124 @@
+import json
+import re
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from fast_json import dumps
+from pagination import PAGE_SORT, InvalidCursor, after_cursor, decode_cursor, encode_cursor
+
+# Spreadsheet apps run cells starting with these as formulas
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+_NEEDS_QUOTES = re.compile(r'[",\r\n]')
+
+
+@dataclass
+class ExportSource:
+    kind: str
+    collection: Any
+    # Used for NDJSON, which carries every field
+    projection: Dict[str, int]
+    # CSV columns; the CSV export only asks Mongo for these
+    columns: List[str]
+    # Turns a stored document into what the user sees (e.g. decompresses)
+    prepare: Callable[[Dict[str, Any]], Dict[str, Any]] = lambda doc: doc
+
+
+def encode_export_cursor(kind: str, doc: Dict[str, Any]) -> str:
+    # "trips.<page cursor>": base64url never contains a dot
+    return f"{kind}.{encode_cursor(doc)}"
+
+
+def decode_export_cursor(cursor: str, sources: List[ExportSource]) -> Tuple[int, str]:
+    kind, _, page_cursor = cursor.partition(".")
+    for index, source in enumerate(sources):
+        if source.kind == kind:
+            decode_cursor(page_cursor)
+            return index, page_cursor
+    raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+
+async def export_batches(
+    sources: List[ExportSource],
+    query: Dict[str, Any],
+    batch_size: int,
+    cursor: Optional[str] = None,
+    csv_columns: bool = False
+) -> AsyncIterator[Tuple[ExportSource, List[Dict[str, Any]]]]:
+    """Every matching document of each source in turn, newest first, one
+    batch at a time.
+
+    The Mongo cursor fetches ``batch_size`` documents per round trip and
+    only the current batch is held in memory, so memory stays flat however
+    many documents are exported. ``cursor`` resumes after the document a
+    previous export's checkpoint pointed at.
+    """
+    start, page_cursor = decode_export_cursor(cursor, sources) if cursor else (0, None)
+    for index in range(start, len(sources)):
+        source = sources[index]
+        projection = {"_id": 0, **{name: 1 for name in source.columns}} if csv_columns else source.projection
+        query_after = after_cursor(query, page_cursor if index == start else None)
+        docs = source.collection.find(query_after, projection).sort(PAGE_SORT).batch_size(batch_size)
+        batch = []
+        async for doc in docs:
+            batch.append(source.prepare(doc))
+            if len(batch) >= batch_size:
+                yield source, batch
+                batch = []
+        if batch:
+            yield source, batch
+
+
+async def ndjson_stream(batches: AsyncIterator[Tuple[ExportSource, List[Dict[str, Any]]]]) -> AsyncIterator[bytes]:
+    # One chunk per batch, each ending in a checkpoint whose cursor resumes
+    # after it; a final checkpoint with a null cursor marks a complete export
+    async for source, batch in batches:
+        lines = [dumps({"type": source.kind, **doc}) for doc in batch]
+        lines.append(dumps({"type": "checkpoint", "cursor": encode_export_cursor(source.kind, batch[-1])}))
+        yield b"\n".join(lines) + b"\n"
+    yield dumps({"type": "checkpoint", "cursor": None}) + b"\n"
+
+
+def _cell(value: Any) -> str:
+    if type(value) is str:
+        return "'" + value if value.startswith(_FORMULA_PREFIXES) else value
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        value = "; ".join(str(item) for item in value)
+    elif isinstance(value, dict):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    value = str(value)
+    return "'" + value if value.startswith(_FORMULA_PREFIXES) else value
+
+
+def _csv_row(cells: List[str]) -> str:
+    # Same output as csv.writer's default dialect; its C writer scans long
+    # itineraries a character at a time and was ~6x slower per row
+    return ",".join(['"' + cell.replace('"', '""') + '"' if _NEEDS_QUOTES.search(cell) else cell for cell in cells]) + "\r\n"
+
+
+async def csv_gzip_stream(batches: AsyncIterator[Tuple[ExportSource, List[Dict[str, Any]]]], columns: List[str]) -> AsyncIterator[bytes]:
+    """Gzip-compressed CSV with a header row.
+
+    Every row ends in a resume_cursor column. The gzip stream is flushed
+    after each batch so rows reach the client as they are read, and its
+    trailer (checked by ``gzip -t``) shows that the export is complete.
+    """
+    # wbits=31 writes a gzip header and trailer
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    header = _csv_row(columns + ["resume_cursor"])
+    async for source, batch in batches:
+        rows = header + "".join(
+            _csv_row([_cell(doc.get(name)) for name in columns] + [encode_export_cursor(source.kind, doc)])
+            for doc in batch
+        )
+        header = ""
+        yield compressor.compress(rows.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.compress(header.encode("utf-8")) + compressor.flush(zlib.Z_FINISH)
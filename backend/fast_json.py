@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj: Any) -> Any:
+    # orjson handles dicts, lists, datetimes, enums and UUIDs natively; this
+    # only sees what it cannot encode, and anything unexpected is an error
+    # rather than a silently stringified value
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """orjson response that also takes Pydantic models and raw Mongo documents.
+
+    Returning it from a route skips FastAPI's jsonable_encoder pass, so
+    the payload is walked exactly once, by orjson.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,87 @@
+import time
+from typing import Any
+
+from metrics import MONGO_OP_SECONDS
+
+# Collection methods that are coroutines and get timed directly
+TIMED_OPS = {
+    "find_one", "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "bulk_write", "count_documents", "estimated_document_count",
+}
+# Cursor methods that return the cursor itself
+CHAINED_CURSOR_OPS = {"sort", "limit", "skip", "batch_size", "hint", "max_time_ms", "allow_disk_use"}
+
+
+async def _timed(collection: str, op: str, coro):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        result = await coro
+        outcome = "ok"
+        return result
+    finally:
+        MONGO_OP_SECONDS.observe(time.perf_counter() - started, collection=collection, op=op, outcome=outcome)
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, collection: str, op: str):
+        self._cursor = cursor
+        self._collection = collection
+        self._op = op
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._cursor, name)
+        if name in CHAINED_CURSOR_OPS:
+            def chained(*args, **kwargs):
+                attr(*args, **kwargs)
+                return self
+            return chained
+        return attr
+
+    def to_list(self, *args, **kwargs):
+        return _timed(self._collection, self._op, self._cursor.to_list(*args, **kwargs))
+
+    def __aiter__(self):
+        return self._cursor.__aiter__()
+
+
+class InstrumentedCollection:
+    """Times collection operations into mongo_operation_duration_seconds.
+
+    find() and aggregate() are timed when their cursor is materialized
+    with to_list; everything else passes through untouched.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+        self._name = collection.name
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._collection, name)
+        if name in TIMED_OPS:
+            return lambda *args, **kwargs: _timed(self._name, name, attr(*args, **kwargs))
+        if name in ("find", "aggregate"):
+            return lambda *args, **kwargs: InstrumentedCursor(attr(*args, **kwargs), self._name, name)
+        return attr
+
+
+class InstrumentedDatabase:
+    def __init__(self, database):
+        self._database = database
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> InstrumentedCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = InstrumentedCollection(self._database[name])
+        return collection
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._database, name)
+        # Attribute access on a Motor database returns a collection
+        if type(attr).__name__.endswith("Collection"):
+            return self[name]
+        return attr
@@ -0,0 +1,46 @@
+import zlib
+from typing import Any, Dict, Union
+
+from bson import Binary
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is used instead
+    zstandard = None
+
+# Shorter itineraries are stored as plain text; compression would barely pay off
+COMPRESS_MIN_BYTES = 1024
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+StoredItinerary = Union[str, Dict[str, Any]]
+
+
+def encode_itinerary(text: str, min_bytes: int = COMPRESS_MIN_BYTES) -> StoredItinerary:
+    raw = text.encode("utf-8")
+    if len(raw) < min_bytes:
+        return text
+    if zstandard is not None:
+        codec, data = "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        codec, data = "zlib", zlib.compress(raw, ZLIB_LEVEL)
+    if len(data) >= len(raw):
+        return text
+    return {"codec": codec, "data": Binary(data), "size": len(raw)}
+
+
+def decode_itinerary(value: StoredItinerary) -> str:
+    if value is None or isinstance(value, str):
+        return value
+    data = bytes(value["data"])
+    if value["codec"] == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed itineraries")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=value["size"]).decode("utf-8")
+    if value["codec"] == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown itinerary codec: {value['codec']!r}")
+
+
+def is_compressed(value: Any) -> bool:
+    return isinstance(value, dict) and "codec" in value
@@ -0,0 +1,344 @@
+import asyncio
+import importlib
+import json
+import logging
+import os
+import random
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Exception class names (from litellm/openai/httpx) worth retrying
+TRANSIENT_ERRORS = {
+    "RateLimitError",
+    "APIConnectionError",
+    "APITimeoutError",
+    "Timeout",
+    "ServiceUnavailableError",
+    "InternalServerError",
+    "ConnectError",
+    "ReadTimeout",
+    "TransientLlmError",
+}
+
+
+class LlmBusy(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientLlmError(Exception):
+    pass
+
+
+def is_transient(error: BaseException) -> bool:
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or type(error).__name__ in TRANSIENT_ERRORS
+
+
+class EmergentProvider:
+    """LlmChat-backed provider.
+
+    LlmChat instances carry per-session message history, so one is built
+    per call; the SDK's HTTP connection pool underneath is shared.
+    """
+
+    def __init__(self, api_key: Optional[str], provider: str = "openai", model: str = "gpt-4o-mini"):
+        self.api_key = api_key
+        self.provider = provider
+        self.model = model
+
+    async def warm(self):
+        # The SDK pulls in litellm; importing it in a thread keeps that off the first request
+        await asyncio.to_thread(importlib.import_module, "emergentintegrations.llm.chat")
+
+    def _chat(self, session_id: str, system_message: str):
+        from emergentintegrations.llm.chat import LlmChat
+        return LlmChat(api_key=self.api_key, session_id=session_id, system_message=system_message).with_model(self.provider, self.model)
+
+    async def complete(self, text: str, system_message: str, session_id: str) -> str:
+        from emergentintegrations.llm.chat import UserMessage
+        return await self._chat(session_id, system_message).send_message(UserMessage(text=text))
+
+    async def stream(self, text: str, system_message: str, session_id: str) -> AsyncIterator[str]:
+        # LlmChat has no streaming call, so the reply arrives as one chunk
+        # once the model has finished writing
+        yield await self.complete(text, system_message, session_id)
+
+
+class FakeProvider:
+    """Offline stand-in with configurable latency for load tests."""
+
+    def __init__(self, delay: float = 0.5, jitter: float = 0.0, failure_rate: float = 0.0, chunks: int = 8):
+        self.delay = delay
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.chunks = chunks
+
+    def _reply(self, text: str) -> str:
+        if "JSON" in text:
+            return json.dumps({
+                "accommodation": "₹6000", "food": "₹3000", "activities": "₹2500",
+                "transport": "₹2000", "shopping": "₹1000", "miscellaneous": "₹500"
+            })
+        days = "\n\n".join(f"## Day {day}\n- Morning: explore\n- Afternoon: local food\n- Evening: relax" for day in range(1, 4))
+        return f"# Fake itinerary\n\n{days}\n\n(reply to: {text[:60]})"
+
+    async def _wait(self, share: float = 1.0, may_fail: bool = True):
+        await asyncio.sleep(max(0.0, (self.delay + random.uniform(-self.jitter, self.jitter)) * share))
+        if may_fail and self.failure_rate and random.random() < self.failure_rate:
+            raise TransientLlmError("fake provider failure")
+
+    async def complete(self, text: str, system_message: str, session_id: str) -> str:
+        await self._wait()
+        return self._reply(text)
+
+    async def stream(self, text: str, system_message: str, session_id: str) -> AsyncIterator[str]:
+        reply = self._reply(text)
+        size = max(1, len(reply) // self.chunks + 1)
+        for start in range(0, len(reply), size):
+            await self._wait(1 / self.chunks, may_fail=start == 0)
+            yield reply[start:start + size]
+
+
+class LlmGateway:
+    """Shared entry point for every LLM call.
+
+    Calls wait for a slot under a global and a per-user semaphore. Once
+    the wait queues are full, or a slot does not free up within
+    ``queue_timeout``, LlmBusy is raised so the route can answer 429.
+    Transient provider errors are retried with jittered exponential
+    backoff.
+    """
+
+    def __init__(
+        self,
+        provider,
+        max_concurrency: int = 16,
+        max_queue: int = 64,
+        per_user_concurrency: int = 2,
+        per_user_queue: int = 4,
+        queue_timeout: float = 30,
+        retries: int = 2,
+        backoff_base: float = 0.5
+    ):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.per_user_concurrency = per_user_concurrency
+        self.per_user_queue = per_user_queue
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._user_slots: Dict[str, asyncio.Semaphore] = {}
+        self._user_waiting: Dict[str, int] = defaultdict(int)
+        # Callers holding or waiting for each user's semaphore
+        self._user_refs: Dict[Optional[str], int] = defaultdict(int)
+        self._waiting = 0
+        self._in_flight = 0
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=1000))
+        self.stats = {"calls": 0, "errors": 0, "retries": 0, "rejected": 0}
+        # Called as observer(purpose, outcome, seconds, prompt, reply) after every call
+        self.observer: Optional[Callable[[str, str, float, str, str], None]] = None
+
+    async def warm(self):
+        # A failure here is logged and left for the first real call to surface
+        warm = getattr(self.provider, "warm", None)
+        if warm is None:
+            return
+        try:
+            await warm()
+        except Exception as e:
+            logger.warning(f"LLM provider warm-up failed: {e!r}")
+
+    def _observe(self, purpose: str, outcome: str, started: float, prompt: str, reply: str):
+        if self.observer is not None:
+            try:
+                self.observer(purpose, outcome, time.perf_counter() - started, prompt, reply)
+            except Exception as e:
+                logger.warning(f"LLM observer failed: {e!r}")
+
+    def _retry_after(self) -> float:
+        # Rough time for the queue ahead to drain
+        recent = [latency for samples in self._latencies.values() for latency in samples]
+        average = sum(recent) / len(recent) if recent else 5.0
+        return max(1.0, round(average * (self._waiting + 1) / self.max_concurrency))
+
+    def _reject(self, reason: str):
+        self.stats["rejected"] += 1
+        raise LlmBusy(reason, self._retry_after())
+
+    async def _acquire(self, user_id: Optional[str]) -> Optional[asyncio.Semaphore]:
+        user_slot = self._user_slots.get(user_id) if user_id is not None else None
+        if user_id is not None and self._user_refs.get(user_id, 0) >= self.per_user_concurrency + self.per_user_queue:
+            self._reject("Too many AI requests in progress for this account")
+        if self._in_flight + self._waiting >= self.max_concurrency + self.max_queue:
+            self._reject("AI service is at capacity")
+        if user_id is not None and user_slot is None:
+            user_slot = self._user_slots[user_id] = asyncio.Semaphore(self.per_user_concurrency)
+
+        acquired = []
+
+        async def acquire_slots():
+            if user_slot is not None:
+                await user_slot.acquire()
+                acquired.append(user_slot)
+            await self._slots.acquire()
+            acquired.append(self._slots)
+
+        self._waiting += 1
+        self._user_refs[user_id] += 1
+        if user_id is not None:
+            self._user_waiting[user_id] += 1
+        try:
+            await asyncio.wait_for(acquire_slots(), timeout=self.queue_timeout)
+        except BaseException as e:
+            for slot in acquired:
+                slot.release()
+            self._forget_user(user_id)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("Timed out waiting for an AI slot")
+            raise
+        finally:
+            self._waiting -= 1
+            if user_id is not None:
+                self._user_waiting[user_id] -= 1
+                if not self._user_waiting[user_id]:
+                    del self._user_waiting[user_id]
+        self._in_flight += 1
+        return user_slot
+
+    def _forget_user(self, user_id: Optional[str]):
+        self._user_refs[user_id] -= 1
+        if not self._user_refs[user_id]:
+            # Drop idle per-user semaphores so the map does not grow forever
+            del self._user_refs[user_id]
+            self._user_slots.pop(user_id, None)
+
+    def _release(self, user_id: Optional[str], user_slot: Optional[asyncio.Semaphore]):
+        self._in_flight -= 1
+        self._slots.release()
+        if user_slot is not None:
+            user_slot.release()
+        self._forget_user(user_id)
+
+    async def _backoff(self, attempt: int, error: BaseException, purpose: str):
+        self.stats["retries"] += 1
+        delay = random.uniform(0, self.backoff_base * 2 ** attempt)
+        logger.warning(f"LLM call '{purpose}' failed with {error!r}, retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    async def complete(
+        self,
+        text: str,
+        *,
+        system_message: str,
+        session_id: str,
+        user_id: Optional[str] = None,
+        purpose: str = "default"
+    ) -> str:
+        called, outcome, reply = time.perf_counter(), "error", ""
+        try:
+            user_slot = await self._acquire(user_id)
+        except LlmBusy:
+            self._observe(purpose, "rejected", called, text, reply)
+            raise
+        try:
+            for attempt in range(self.retries + 1):
+                started = time.perf_counter()
+                self.stats["calls"] += 1
+                try:
+                    reply = await self.provider.complete(text, system_message, session_id)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    if attempt < self.retries and is_transient(e):
+                        await self._backoff(attempt, e, purpose)
+                        continue
+                    raise
+                self._latencies[purpose].append(time.perf_counter() - started)
+                outcome = "ok"
+                return reply
+        finally:
+            self._release(user_id, user_slot)
+            self._observe(purpose, outcome, called, text, reply)
+
+    async def stream(
+        self,
+        text: str,
+        *,
+        system_message: str,
+        session_id: str,
+        user_id: Optional[str] = None,
+        purpose: str = "default"
+    ) -> AsyncIterator[str]:
+        called, outcome, chunks = time.perf_counter(), "error", []
+        try:
+            user_slot = await self._acquire(user_id)
+        except LlmBusy:
+            self._observe(purpose, "rejected", called, text, "")
+            raise
+        try:
+            for attempt in range(self.retries + 1):
+                started = time.perf_counter()
+                self.stats["calls"] += 1
+                emitted = False
+                try:
+                    async for chunk in self.provider.stream(text, system_message, session_id):
+                        emitted = True
+                        chunks.append(chunk)
+                        yield chunk
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    # Once text has reached the client a retry would duplicate it
+                    if not emitted and attempt < self.retries and is_transient(e):
+                        await self._backoff(attempt, e, purpose)
+                        continue
+                    raise
+                self._latencies[purpose].append(time.perf_counter() - started)
+                outcome = "ok"
+                return
+        finally:
+            self._release(user_id, user_slot)
+            self._observe(purpose, outcome, called, text, "".join(chunks))
+
+    def snapshot(self) -> Dict[str, Any]:
+        latency = {}
+        for purpose, samples in self._latencies.items():
+            ordered = sorted(samples)
+            latency[purpose] = {
+                "count": len(ordered),
+                "p50": ordered[len(ordered) // 2] if ordered else 0.0,
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+            }
+        return {
+            **self.stats,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "latency_seconds": latency
+        }
+
+
+def llm_gateway_from_env() -> LlmGateway:
+    if os.environ.get('LLM_PROVIDER', 'emergent') == 'fake':
+        provider = FakeProvider(
+            delay=float(os.environ.get('FAKE_LLM_DELAY_SECONDS', '0.5')),
+            jitter=float(os.environ.get('FAKE_LLM_JITTER_SECONDS', '0')),
+            failure_rate=float(os.environ.get('FAKE_LLM_FAILURE_RATE', '0'))
+        )
+    else:
+        provider = EmergentProvider(
+            os.environ.get('EMERGENT_LLM_KEY'),
+            model=os.environ.get('LLM_MODEL', 'gpt-4o-mini')
+        )
+    return LlmGateway(
+        provider,
+        max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', '16')),
+        max_queue=int(os.environ.get('LLM_MAX_QUEUE', '64')),
+        per_user_concurrency=int(os.environ.get('LLM_PER_USER_CONCURRENCY', '2')),
+        per_user_queue=int(os.environ.get('LLM_PER_USER_QUEUE', '4')),
+        queue_timeout=float(os.environ.get('LLM_QUEUE_TIMEOUT_SECONDS', '30')),
+        retries=int(os.environ.get('LLM_RETRIES', '2'))
+    )
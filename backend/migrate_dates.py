@@ -0,0 +1,61 @@
+"""Convert ISO-8601 timestamp strings to native BSON dates.
+
+Each update only applies if the field still holds the string that was
+read; values that do not parse are reported and left alone.
+
+Usage:
+    python migrate_dates.py [--batch-size 500] [--dry-run]
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from pymongo import UpdateOne
+
+from batch_migration import migrate_in_batches, migration_database, parse_args
+
+DATETIME_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "users": ("created_at", "subscription_expires"),
+    "trips": ("created_at", "updated_at"),
+    "chats": ("created_at",),
+    "notifications": ("created_at",),
+}
+
+
+def parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+async def migrate_collection(collection, fields: Tuple[str, ...], batch_size: int, dry_run: bool) -> int:
+    def build_updates(docs) -> List[UpdateOne]:
+        operations = []
+        for doc in docs:
+            for field in fields:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                try:
+                    parsed = parse_timestamp(value)
+                except ValueError:
+                    print(f"  skipping {collection.name} {doc['_id']}: unparseable {field}={value!r}")
+                    continue
+                operations.append(UpdateOne({"_id": doc["_id"], field: value}, {"$set": {field: parsed}}))
+        return operations
+
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    return await migrate_in_batches(collection, query, {field: 1 for field in fields}, build_updates, batch_size, dry_run)
+
+
+async def main(batch_size: int, dry_run: bool):
+    async with migration_database() as db:
+        for name, fields in DATETIME_FIELDS.items():
+            converted = await migrate_collection(db[name], fields, batch_size, dry_run)
+            print(f"{name}: {'would convert' if dry_run else 'converted'} {converted} field(s)")
+
+
+if __name__ == "__main__":
+    args = parse_args("Convert string timestamps to BSON dates", batch_size=500)
+    asyncio.run(main(args.batch_size, args.dry_run))
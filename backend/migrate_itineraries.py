@@ -0,0 +1,47 @@
+"""Compress existing trip itineraries in place.
+
+Each update only applies if the itinerary still holds the text that was
+read. Itineraries below the compression threshold are left as plain
+text, exactly as new trips store them.
+
+Usage:
+    python migrate_itineraries.py [--batch-size 200] [--dry-run]
+"""
+import asyncio
+from typing import List
+
+from pymongo import UpdateOne
+
+from batch_migration import migrate_in_batches, migration_database, parse_args
+from itinerary_codec import encode_itinerary, is_compressed
+
+
+async def migrate_trips(collection, batch_size: int, dry_run: bool):
+    sizes = {"raw": 0, "stored": 0}
+
+    def build_updates(docs) -> List[UpdateOne]:
+        operations = []
+        for doc in docs:
+            encoded = encode_itinerary(doc["itinerary"])
+            if not is_compressed(encoded):
+                continue
+            sizes["raw"] += encoded["size"]
+            sizes["stored"] += len(encoded["data"])
+            operations.append(UpdateOne({"_id": doc["_id"], "itinerary": doc["itinerary"]}, {"$set": {"itinerary": encoded}}))
+        return operations
+
+    compressed = await migrate_in_batches(collection, {"itinerary": {"$type": "string"}}, {"itinerary": 1}, build_updates, batch_size, dry_run)
+    return compressed, sizes["raw"], sizes["stored"]
+
+
+async def main(batch_size: int, dry_run: bool):
+    async with migration_database() as db:
+        compressed, raw_bytes, stored_bytes = await migrate_trips(db.trips, batch_size, dry_run)
+        print(f"trips: {'would compress' if dry_run else 'compressed'} {compressed} itinerary(ies)")
+        if raw_bytes:
+            print(f"  {raw_bytes} -> {stored_bytes} bytes ({100 * (1 - stored_bytes / raw_bytes):.0f}% smaller)")
+
+
+if __name__ == "__main__":
+    args = parse_args("Compress stored trip itineraries", batch_size=200)
+    asyncio.run(main(args.batch_size, args.dry_run))
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Dict, List
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class NotificationWriter:
+    """Buffers notifications and writes them in batches.
+
+    ``add`` only appends to an in-memory buffer. A background loop flushes
+    it with one insert_many once ``max_batch`` documents are waiting or
+    ``flush_seconds`` have passed, and bumps the per-user unread counters
+    in notification_counters with one bulk_write. Cancelling ``run``
+    drains whatever is still buffered.
+
+    A document the server rejects is retried ``max_attempts`` times and
+    then dropped with an error log.
+    """
+
+    def __init__(self, notifications, counters, max_batch: int = 100, flush_seconds: float = 0.5, max_attempts: int = 5):
+        self.notifications = notifications
+        self.counters = counters
+        self.max_batch = max_batch
+        self.flush_seconds = flush_seconds
+        self.max_attempts = max_attempts
+        self._buffer: List[Dict[str, Any]] = []
+        # Notification id -> failed write attempts, for documents the server rejected
+        self._attempts: Dict[str, int] = {}
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self.stats = {"queued": 0, "written": 0, "flushes": 0, "errors": 0, "dropped": 0}
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def add(self, doc: Dict[str, Any]):
+        self._buffer.append(doc)
+        self.stats["queued"] += 1
+        if len(self._buffer) >= self.max_batch:
+            self._full.set()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            # Failed documents are requeued into the fresh buffer for the next tick
+            pending, self._buffer = self._buffer, []
+            written = 0
+            for start in range(0, len(pending), self.max_batch):
+                written += await self._write(pending[start:start + self.max_batch])
+            return written
+
+    async def _seed_counters(self, batch: List[Dict[str, Any]]):
+        # Users with unread notifications from before the counters existed
+        # start from their current count; this runs before the batch is
+        # inserted so the $inc that follows adds only the new ones
+        user_ids = list({doc["user_id"] for doc in batch if not doc.get("read")})
+        if not user_ids:
+            return
+        existing = await self.counters.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1}).to_list(None)
+        seen = {counter["user_id"] for counter in existing}
+        for user_id in user_ids:
+            if user_id not in seen:
+                unread = await self.notifications.count_documents({"user_id": user_id, "read": False})
+                await self.counters.update_one({"user_id": user_id}, {"$setOnInsert": {"unread": unread}}, upsert=True)
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> int:
+        self.stats["flushes"] += 1
+        failed = set()
+        try:
+            await self._seed_counters(batch)
+            await self.notifications.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            self.stats["errors"] += 1
+            retry = []
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                doc = batch[error["index"]]
+                # Duplicate ids were written (and counted) by an earlier attempt
+                if error.get("code") == DUPLICATE_KEY:
+                    self._attempts.pop(doc.get("id"), None)
+                    continue
+                attempts = self._attempts[doc.get("id")] = self._attempts.get(doc.get("id"), 0) + 1
+                if attempts < self.max_attempts:
+                    retry.append(doc)
+                else:
+                    self._attempts.pop(doc.get("id"), None)
+                    self.stats["dropped"] += 1
+                    logger.error(f"Dropping notification {doc.get('id')} for {doc.get('user_id')} after {attempts} attempts: {error.get('errmsg')}")
+            self._requeue(retry, e)
+        except Exception as e:
+            self.stats["errors"] += 1
+            self._requeue(batch, e)
+            return 0
+
+        written = [doc for index, doc in enumerate(batch) if index not in failed]
+        for doc in written:
+            self._attempts.pop(doc.get("id"), None)
+        self.stats["written"] += len(written)
+        unread = Counter(doc["user_id"] for doc in written if not doc.get("read"))
+        if unread:
+            try:
+                await self.counters.bulk_write(
+                    [UpdateOne({"user_id": user_id}, {"$inc": {"unread": n}}, upsert=True) for user_id, n in unread.items()],
+                    ordered=False
+                )
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Failed to update unread counters: {e!r}")
+        return len(written)
+
+    def _requeue(self, docs: List[Dict[str, Any]], error: Exception):
+        if docs:
+            logger.error(f"Failed to write {len(docs)} notification(s), will retry: {error!r}")
+            # The _id insert_many assigned is kept, so a document that did
+            # land is rejected as a duplicate on retry rather than written twice
+            self._buffer[:0] = docs
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._full.clear()
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"Notification flush failed: {e!r}")
+        finally:
+            if self._buffer:
+                await asyncio.shield(self.flush())
+
+    async def unread_count(self, user_id: str) -> int:
+        counter = await self.counters.find_one({"user_id": user_id}, {"_id": 0, "unread": 1})
+        if counter is None:
+            # Users from before the counters existed get theirs seeded once
+            unread = await self.notifications.count_documents({"user_id": user_id, "read": False})
+            await self.counters.update_one({"user_id": user_id}, {"$setOnInsert": {"unread": unread}}, upsert=True)
+            return unread
+        return max(0, counter.get("unread", 0))
+
+    async def mark_read(self, user_id: str, notif_id: str) -> bool:
+        result = await self.notifications.update_one(
+            {"id": notif_id, "user_id": user_id, "read": False},
+            {"$set": {"read": True}}
+        )
+        if result.modified_count:
+            await self.counters.update_one({"user_id": user_id, "unread": {"$gt": 0}}, {"$inc": {"unread": -1}})
+        return bool(result.modified_count)
+
+    async def mark_all_read(self, user_id: str) -> int:
+        result = await self.notifications.update_many({"user_id": user_id, "read": False}, {"$set": {"read": True}})
+        await self.counters.update_one({"user_id": user_id}, {"$set": {"unread": 0}}, upsert=True)
+        return result.modified_count
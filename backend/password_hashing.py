@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated, size-limited thread pool.
+
+    bcrypt releases the GIL while hashing, so a few threads keep the event
+    loop free. Work beyond ``max_pending`` queued calls is rejected with
+    PasswordHasherBusy instead of piling up behind a login spike.
+    """
+
+    def __init__(self, rounds: int = 12, max_workers: int = 4, max_pending: int = 64):
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise PasswordHasherBusy(f"{self._pending} password operations already queued")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    @staticmethod
+    def _load():
+        import bcrypt
+        return bcrypt
+
+    def _hash(self, password: str) -> str:
+        bcrypt = self._load()
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds)).decode('utf-8')
+
+    @staticmethod
+    def _verify(password: str, hashed: str) -> bool:
+        bcrypt = PasswordHasher._load()
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+    async def warm(self):
+        # Imports bcrypt and starts a pool thread before the first login
+        await self._run(self._load)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self._verify, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        # Modular crypt format: $2b$<cost>$<salt+hash>
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def password_hasher_from_env() -> PasswordHasher:
+    return PasswordHasher(
+        rounds=int(os.environ.get('BCRYPT_ROUNDS', '12')),
+        max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1)))),
+        max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '64'))
+    )
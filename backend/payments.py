@@ -0,0 +1,250 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+CREATING = "creating"
+CREATED = "created"
+PAID = "paid"
+
+ORDER_PROJECTION = {"_id": 0, "key": 0}
+
+
+class PaymentTimeout(Exception):
+    pass
+
+
+class OrderPending(Exception):
+    """Another request for the same user and plan is still creating its order."""
+
+
+class SignatureVerificationError(Exception):
+    pass
+
+
+def _sign(secret: str, body: str) -> str:
+    return hmac.new(secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class FakeRazorpayClient:
+    """Local stand-in for razorpay.Client (PAYMENT_PROVIDER=fake).
+
+    Orders are made up locally after ``delay`` seconds, and signatures use
+    the same HMAC scheme as Razorpay, so sign_payment/sign_webhook produce
+    values the real verification path accepts.
+    """
+
+    def __init__(self, key_secret: str, delay: float = 0.2):
+        self.auth = ("rzp_test_fake", key_secret)
+        self.delay = delay
+        self.order = self
+        self.utility = self
+        self.orders_created = 0
+
+    def create(self, data: Dict[str, Any], **options) -> Dict[str, Any]:
+        time.sleep(self.delay)
+        self.orders_created += 1
+        return {
+            "id": f"order_fake_{uuid.uuid4().hex[:14]}",
+            "entity": "order",
+            "amount": data["amount"],
+            "currency": data.get("currency", "INR"),
+            "receipt": data.get("receipt"),
+            "notes": data.get("notes", {}),
+            "status": "created"
+        }
+
+    def sign_payment(self, order_id: str, payment_id: str) -> str:
+        return _sign(self.auth[1], f"{order_id}|{payment_id}")
+
+    def sign_webhook(self, body: str, secret: str) -> str:
+        return _sign(secret, body)
+
+    def verify_payment_signature(self, parameters: Dict[str, str]) -> bool:
+        expected = self.sign_payment(parameters["razorpay_order_id"], parameters["razorpay_payment_id"])
+        if not hmac.compare_digest(expected, str(parameters["razorpay_signature"])):
+            raise SignatureVerificationError("Razorpay Signature Verification Failed")
+        return True
+
+    def verify_webhook_signature(self, body: str, signature: str, secret: str) -> bool:
+        if not hmac.compare_digest(_sign(secret, body), signature):
+            raise SignatureVerificationError("Razorpay Signature Verification Failed")
+        return True
+
+
+class PaymentGateway:
+    """Runs the synchronous payment SDK off the event loop.
+
+    Every SDK call goes to a small dedicated thread pool and is bounded by
+    ``timeout``; HTTP calls also get the timeout passed down to requests,
+    so a hung connection does not keep a pool thread forever.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any], key_id: str, webhook_secret: str = "", timeout: float = 10, max_workers: int = 4):
+        self._client_factory = client_factory
+        self._client = None
+        self.key_id = key_id
+        self.webhook_secret = webhook_secret
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="payments")
+
+    @property
+    def client(self):
+        # Built on first use; the razorpay SDK pulls in requests
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs)), self.timeout)
+        except asyncio.TimeoutError:
+            raise PaymentTimeout(f"Payment provider did not answer within {self.timeout}s")
+
+    async def create_order(self, amount: int, currency: str, receipt: str, notes: Dict[str, str]) -> Dict[str, Any]:
+        data = {"amount": amount, "currency": currency, "receipt": receipt, "notes": notes, "payment_capture": 1}
+        return await self._call(self.client.order.create, data, timeout=self.timeout)
+
+    async def _verify(self, fn, *args) -> bool:
+        try:
+            return bool(await self._call(fn, *args))
+        except Exception as e:
+            # razorpay.errors.SignatureVerificationError, matched by name so
+            # the SDK does not have to be imported here
+            if type(e).__name__ == "SignatureVerificationError":
+                return False
+            raise
+
+    async def verify_payment(self, order_id: str, payment_id: str, signature: str) -> bool:
+        return await self._verify(self.client.utility.verify_payment_signature, {
+            "razorpay_order_id": order_id,
+            "razorpay_payment_id": payment_id,
+            "razorpay_signature": signature
+        })
+
+    async def verify_webhook(self, body: str, signature: str) -> bool:
+        return await self._verify(self.client.utility.verify_webhook_signature, body, signature, self.webhook_secret)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PaymentOrders:
+    """Idempotent orders in the payment_orders collection.
+
+    While an order for a user and plan is open it holds the unique
+    ``key`` ``<user_id>:<plan>``, so repeated clicks get the same order
+    back instead of creating new ones. The first request inserts a
+    ``creating`` placeholder that claims the key before calling the
+    provider; concurrent requests wait for it to turn into an order. Paid
+    orders release the key. Open orders are reused for ``reuse_seconds``.
+    """
+
+    def __init__(self, collection, gateway: PaymentGateway, reuse_seconds: float = 1800, claim_seconds: float = 30):
+        self.collection = collection
+        self.gateway = gateway
+        self.reuse_seconds = reuse_seconds
+        self.claim_seconds = claim_seconds
+        self.stats = {"created": 0, "reused": 0}
+
+    async def get_or_create(self, user_id: str, plan: str, amount: int, currency: str = "INR") -> Dict[str, Any]:
+        key = f"{user_id}:{plan}"
+        deadline = asyncio.get_running_loop().time() + self.claim_seconds
+        while True:
+            now = datetime.now(timezone.utc)
+            existing = await self.collection.find_one({"key": key}, ORDER_PROJECTION)
+            if existing is not None:
+                usable = existing["expires_at"] > now and existing["amount"] == amount
+                if usable and existing["status"] == CREATED:
+                    self.stats["reused"] += 1
+                    return existing
+                if usable:
+                    # Another request holds the claim and is talking to the provider
+                    if asyncio.get_running_loop().time() > deadline:
+                        raise OrderPending("An order for this plan is still being created")
+                    await asyncio.sleep(0.2)
+                    continue
+                # Expired, or the price changed since; release the key
+                await self.collection.update_one({"id": existing["id"], "key": key}, {"$unset": {"key": ""}})
+                continue
+            try:
+                return await self._create(key, user_id, plan, amount, currency, now)
+            except DuplicateKeyError:
+                continue
+
+    async def _create(self, key: str, user_id: str, plan: str, amount: int, currency: str, now: datetime) -> Dict[str, Any]:
+        doc = {
+            "id": str(uuid.uuid4()),
+            "key": key,
+            "user_id": user_id,
+            "plan": plan,
+            "amount": amount,
+            "currency": currency,
+            "status": CREATING,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=self.claim_seconds)
+        }
+        await self.collection.insert_one(doc)
+        try:
+            order = await self.gateway.create_order(amount, currency, receipt=doc["id"], notes={"user_id": user_id, "plan": plan})
+        except BaseException:
+            await asyncio.shield(self.collection.delete_one({"id": doc["id"], "status": CREATING}))
+            raise
+        updated = await self.collection.find_one_and_update(
+            {"id": doc["id"]},
+            {"$set": {
+                "status": CREATED,
+                "order_id": order["id"],
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.reuse_seconds)
+            }},
+            projection=ORDER_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        self.stats["created"] += 1
+        return updated
+
+    async def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"order_id": order_id}, ORDER_PROJECTION)
+
+    async def mark_paid(self, order_id: str, payment_id: str) -> Optional[Dict[str, Any]]:
+        # Only the first caller (client verify or webhook) gets the order back
+        paid = {"status": PAID, "payment_id": payment_id, "paid_at": datetime.now(timezone.utc)}
+        order = await self.collection.find_one_and_update(
+            {"order_id": order_id, "status": CREATED},
+            {"$set": paid, "$unset": {"key": ""}},
+            projection=ORDER_PROJECTION
+        )
+        return {**order, **paid} if order else None
+
+
+def payment_gateway_from_env() -> Optional[PaymentGateway]:
+    key_id = os.environ.get('RAZORPAY_KEY_ID', '')
+    key_secret = os.environ.get('RAZORPAY_KEY_SECRET', '')
+    if os.environ.get('PAYMENT_PROVIDER', 'razorpay') == 'fake':
+        delay = float(os.environ.get('FAKE_RAZORPAY_DELAY_SECONDS', '0.2'))
+        key_secret = key_secret or "fake_secret"
+        key_id = key_id or "rzp_test_fake"
+        client_factory = partial(FakeRazorpayClient, key_secret, delay=delay)
+    elif key_id:
+        def client_factory():
+            import razorpay
+            return razorpay.Client(auth=(key_id, key_secret))
+    else:
+        return None
+    return PaymentGateway(
+        client_factory,
+        key_id=key_id,
+        webhook_secret=os.environ.get('RAZORPAY_WEBHOOK_SECRET', ''),
+        timeout=float(os.environ.get('PAYMENT_TIMEOUT_SECONDS', '10')),
+        max_workers=int(os.environ.get('PAYMENT_MAX_WORKERS', '4'))
+    )
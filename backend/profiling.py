@@ -0,0 +1,89 @@
+import logging
+from typing import Awaitable, Callable
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+
+
+def _profiler_class():
+    # Imported on the first profiling request rather than at startup
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return None
+    return Profiler
+
+
+async def _send_text(send: Send, status: int, text: str):
+    body = text.encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class ProfilingMiddleware:
+    """Per-request sampling profiles on demand.
+
+    A request carrying ``X-Profile: text`` (or ``html``) from a caller
+    that ``is_allowed`` accepts is run under pyinstrument, and the profile
+    replaces the response body. Everyone else, and every request without
+    the header, goes straight through.
+    """
+
+    def __init__(self, app: ASGIApp, is_allowed: Callable[[Headers], Awaitable[bool]], interval: float = 0.001):
+        self.app = app
+        self.is_allowed = is_allowed
+        self.interval = interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        mode = headers.get(PROFILE_HEADER, "").lower()
+        if not mode or not await self.is_allowed(headers):
+            await self.app(scope, receive, send)
+            return
+        Profiler = _profiler_class()
+        if Profiler is None:
+            logger.error("Profiling requested but pyinstrument is not installed")
+            await _send_text(send, 501, "Profiling unavailable: pyinstrument is not installed\n")
+            return
+
+        status = 500
+
+        async def discard(message):
+            nonlocal status
+            # The profile is the response; the route's own output is dropped
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+
+        if mode == "html":
+            body, content_type = profiler.output_html().encode("utf-8"), b"text/html; charset=utf-8"
+        else:
+            body, content_type = profiler.output_text(unicode=True, color=False).encode("utf-8"), b"text/plain; charset=utf-8"
+        logger.info(f"Profiled {scope['method']} {scope['path']} (status {status})")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(status).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
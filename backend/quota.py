@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# action -> (usage counter on the user document, key in PLAN_LIMITS)
+QUOTA_FIELDS = {
+    "trip": ("trips_this_month", "trips_per_month"),
+    "chat": ("chats_this_month", "ai_chats"),
+}
+
+
+def current_period(now: Optional[datetime] = None) -> str:
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m")
+
+
+def seconds_until_next_period(now: Optional[datetime] = None) -> float:
+    now = now or datetime.now(timezone.utc)
+    if now.month == 12:
+        start = now.replace(year=now.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    else:
+        start = now.replace(month=now.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    return (start - now).total_seconds()
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+@dataclass
+class Reservation:
+    user_id: str
+    field: str
+    # False for unlimited plans, which never touch Mongo up front
+    counted: bool
+    settled: bool = False
+
+
+class QuotaManager:
+    """Atomic per-plan usage quotas.
+
+    A reservation increments the usage counter with a single conditional
+    update, so parallel requests cannot all slip under the limit. It is
+    refunded if the work fails, and counters are zeroed by a monthly
+    reset worker.
+
+    ``on_change(user_id)`` runs after every write to one user's document
+    and ``on_reset()`` after the monthly reset, which touches them all.
+    """
+
+    def __init__(
+        self,
+        users,
+        plan_limits: Dict[Any, Dict[str, int]],
+        on_change: Callable[[str], None],
+        on_reset: Callable[[], None] = lambda: None
+    ):
+        self.users = users
+        self.plan_limits = plan_limits
+        self.on_change = on_change
+        self.on_reset = on_reset
+
+    async def reserve(self, user, action: str) -> Reservation:
+        field, limit_key = QUOTA_FIELDS[action]
+        limit = self.plan_limits[user.subscription_plan][limit_key]
+        if limit == -1:
+            return Reservation(user.id, field, counted=False)
+
+        doc = await self.users.find_one_and_update(
+            {"id": user.id, field: {"$lt": limit}},
+            {"$inc": {field: 1}},
+            projection={"_id": 1}
+        )
+        if doc is None:
+            raise QuotaExceeded(action)
+        self.on_change(user.id)
+        return Reservation(user.id, field, counted=True)
+
+    async def commit(self, reservation: Reservation):
+        if reservation.settled:
+            return
+        reservation.settled = True
+        if not reservation.counted:
+            # Unlimited plans still track usage, but only once the work succeeded
+            await self.users.update_one({"id": reservation.user_id}, {"$inc": {reservation.field: 1}})
+        self.on_change(reservation.user_id)
+
+    async def refund(self, reservation: Reservation):
+        if reservation.settled:
+            return
+        reservation.settled = True
+        if reservation.counted:
+            await self.users.update_one(
+                {"id": reservation.user_id, reservation.field: {"$gt": 0}},
+                {"$inc": {reservation.field: -1}}
+            )
+            self.on_change(reservation.user_id)
+
+    async def reset_period(self, period: str) -> int:
+        # Users created before period tracking existed adopt the current
+        # period without losing this month's usage
+        await self.users.update_many({"quota_period": {"$exists": False}}, {"$set": {"quota_period": period}})
+        result = await self.users.update_many(
+            {"quota_period": {"$ne": period}},
+            {"$set": {"quota_period": period, **{field: 0 for field, _ in QUOTA_FIELDS.values()}}}
+        )
+        if result.modified_count:
+            self.on_reset()
+        return result.modified_count
+
+    async def run_reset_worker(self, max_interval: float = 3600):
+        last_period = None
+        while True:
+            try:
+                period = current_period()
+                reset = await self.reset_period(period)
+                if reset:
+                    logger.info(f"Reset monthly quotas for {reset} user(s) for period {period}")
+                elif period != last_period:
+                    # Another process did the reset; drop what this one cached
+                    self.on_reset()
+                last_period = period
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Monthly quota reset failed: {e!r}")
+            await asyncio.sleep(min(max_interval, seconds_until_next_period() + 1))
@@ -1,41 +1,75 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, BackgroundTasks, Query, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 import os
+import json
+import hmac
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
-from emergentintegrations.llm.chat import LlmChat, UserMessage
-import bcrypt
+import time
 import jwt
-import razorpay
 from enum import Enum
+from contextlib import asynccontextmanager
+from functools import partial
+from trip_pipeline import PipelineStep, run_pipeline, run_step, start_steps
+from trip_cache import TripCache, trip_cache_key
+from password_hashing import PasswordHasherBusy, password_hasher_from_env
+from ttl_lru import TTLLRU
+from db_indexes import ensure_indexes, verify_query_plans
+from pagination import MAX_PAGE_SIZE, InvalidCursor, fetch_page
+from admin_stats import AdminStats
+from llm_gateway import LlmBusy, llm_gateway_from_env
+from quota import QuotaExceeded, QuotaManager, Reservation, current_period
+from payments import OrderPending, PaymentOrders, PaymentTimeout, payment_gateway_from_env
+from trip_jobs import TripJobQueue
+from chat_memory import ChatMemory, count_tokens, load_tokenizer
+from notification_writer import NotificationWriter
+from http_cache import encoded_etag, etag_matches, strong_etag
+from fast_json import FastJSONResponse, dumps as json_dumps
+from itinerary_codec import decode_itinerary, encode_itinerary
+from budget_engine import BudgetEngine, parse_refined_budget
+from text_search import SearchSource, TextSearch, search_keywords
+from exports import ExportSource, csv_gzip_stream, decode_export_cursor, export_batches, ndjson_stream
+from compression import CompressionMiddleware, compress, negotiate_encoding
+from metrics import (
+    BCRYPT_SECONDS, CONTENT_TYPE as METRICS_CONTENT_TYPE, LLM_CALL_SECONDS, LLM_TOKENS, REGISTRY,
+    MetricsMiddleware, sample_loop_lag
+)
+from instrumented_db import InstrumentedDatabase
+from profiling import ProfilingMiddleware
+from dataclasses import asdict
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+MONGO_WARM_CONNECTIONS = int(os.environ.get('MONGO_WARM_CONNECTIONS', '4'))
+SHARED_TRIP_CACHE_CONTROL = os.environ.get('SHARED_TRIP_CACHE_CONTROL', 'public, max-age=60, s-maxage=300')
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
 
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24 * 7  # 7 days
 
-# Razorpay Configuration
-RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', '')
-RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '')
-razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET)) if RAZORPAY_KEY_ID else None
+def record_llm_call(purpose: str, outcome: str, seconds: float, prompt: str, reply: str):
+    LLM_CALL_SECONDS.observe(seconds, purpose=purpose, outcome=outcome)
+    LLM_TOKENS.inc(count_tokens(prompt), purpose=purpose, direction="prompt")
+    if reply:
+        LLM_TOKENS.inc(count_tokens(reply), purpose=purpose, direction="completion")
+
+LLM_IN_FLIGHT = REGISTRY.gauge("llm_calls_in_flight", "LLM calls holding a gateway slot")
+LLM_WAITING = REGISTRY.gauge("llm_calls_waiting", "LLM calls queued for a gateway slot")
+NOTIFICATIONS_BUFFERED = REGISTRY.gauge("notifications_buffered", "Notifications waiting for the next flush")
 
-# Create the main app
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
@@ -88,7 +122,7 @@ class TripRequest(BaseModel):
     travel_style: str
     language: str = "en"
 
-class Trip(BaseModel):
+class TripSummary(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -97,8 +131,6 @@ class Trip(BaseModel):
     budget: str
     interests: List[str]
     travel_style: str
-    itinerary: str
-    budget_breakdown: Dict[str, Any] = {}
     language: str = "en"
     shared_with: List[str] = []
     is_public: bool = False
@@ -106,6 +138,10 @@ class Trip(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class Trip(TripSummary):
+    itinerary: str
+    budget_breakdown: Dict[str, Any] = {}
+
 class ChatMessage(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -114,6 +150,10 @@ class ChatMessage(BaseModel):
     response: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class AuthResponse(BaseModel):
+    user: User
+    token: str
+
 class SubscriptionUpdate(BaseModel):
     plan: SubscriptionPlan
 
@@ -127,12 +167,225 @@ class Notification(BaseModel):
     read: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# Routes that return FastJSONResponse bypass response_model validation, so
+# the models below only describe those responses in the OpenAPI schema
+
+# List views leave out the multi-KB itinerary; GET /trips/{trip_id} returns it
+TRIP_SUMMARY_PROJECTION = {"_id": 0, "itinerary": 0, "budget_breakdown": 0, "search_text": 0}
+# search_text only feeds the text index
+TRIP_PROJECTION = {"_id": 0, "search_text": 0}
+
+# Shared app resources
+class Services:
+    """Everything one app instance holds: the Mongo client, caches, the LLM
+    and payment gateways and the background workers.
+
+    create_app() builds one per app and keeps it on ``app.state.services``,
+    so two apps in one process (tests, ``uvicorn --factory``) share nothing.
+    Building it opens no connections; the lifespan does that.
+    """
+
+    def __init__(self):
+        # Timestamps are stored as native BSON dates and decoded by the driver as aware UTC datetimes.
+        # No connection is made until the lifespan pings and warms the pool
+        self.client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True, connect=False)
+        # Every collection operation is timed into mongo_operation_duration_seconds
+        self.db = InstrumentedDatabase(self.client[os.environ['DB_NAME']])
+        db = self.db
+
+        # Itinerary cache (in-process LRU in front of the itinerary_cache collection)
+        self.trip_cache = TripCache(
+            db.itinerary_cache,
+            max_entries=int(os.environ.get('ITINERARY_CACHE_SIZE', '512')),
+            ttl_seconds=float(os.environ.get('ITINERARY_CACHE_TTL_SECONDS', str(24 * 3600)))
+        )
+
+        # Every LLM call goes through the shared gateway (concurrency limits, retries, latency stats)
+        self.llm = llm_gateway_from_env()
+        self.llm.observer = record_llm_call
+
+        # Password hashing runs in its own bounded thread pool
+        self.password_hasher = password_hasher_from_env()
+
+        # Authenticated users, keyed by id; every write to a user document must
+        # go through invalidate_cached_user. The cache is per process, so with
+        # several workers another worker can serve a copy up to
+        # USER_CACHE_TTL_SECONDS old; set it to 0 where that matters.
+        self.user_cache = TTLLRU(
+            max_entries=int(os.environ.get('USER_CACHE_SIZE', '10000')),
+            ttl_seconds=float(os.environ.get('USER_CACHE_TTL_SECONDS', '30'))
+        )
+
+        # Pre-encoded public shared trips: share_token -> {encoding: (body, etag)}
+        self.shared_trip_cache = TTLLRU(
+            max_entries=int(os.environ.get('SHARED_TRIP_CACHE_SIZE', '2000')),
+            ttl_seconds=float(os.environ.get('SHARED_TRIP_CACHE_TTL_SECONDS', '60'))
+        )
+
+        # Razorpay (or the local fake with PAYMENT_PROVIDER=fake); without keys
+        # subscriptions run in demo mode. SDK calls run in the gateway's own pool.
+        self.payment_gateway = payment_gateway_from_env()
+        self.payment_orders = PaymentOrders(
+            db.payment_orders,
+            self.payment_gateway,
+            reuse_seconds=float(os.environ.get('PAYMENT_ORDER_REUSE_SECONDS', '1800')),
+            claim_seconds=float(os.environ.get('PAYMENT_ORDER_CLAIM_SECONDS', '30'))
+        ) if self.payment_gateway else None
+
+        # Admin dashboard stats are served from a periodically refreshed snapshot
+        self.admin_stats = AdminStats(
+            db,
+            plans=[plan.value for plan in SubscriptionPlan],
+            plan_prices={plan.value: price for plan, price in PLAN_PRICES.items()},
+            refresh_seconds=float(os.environ.get('ADMIN_STATS_REFRESH_SECONDS', '300'))
+        )
+
+        # Plan quotas are reserved atomically before the LLM call and refunded if it fails
+        self.quota = QuotaManager(db.users, PLAN_LIMITS, on_change=self.invalidate_cached_user, on_reset=self.user_cache.clear)
+
+        # Notifications are buffered and written in batches off the request path
+        self.notification_writer = NotificationWriter(
+            db.notifications,
+            db.notification_counters,
+            max_batch=int(os.environ.get('NOTIFICATION_BATCH_SIZE', '100')),
+            flush_seconds=float(os.environ.get('NOTIFICATION_FLUSH_SECONDS', '0.5')),
+            max_attempts=int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', '5'))
+        )
+
+        self.budget_engine = BudgetEngine.load()
+
+        # Set TRIP_JOB_WORKERS=0 on processes that should only enqueue
+        self.trip_jobs = TripJobQueue(
+            db.trip_jobs,
+            partial(run_trip_job, self),
+            partial(fail_trip_job, self),
+            workers=int(os.environ.get('TRIP_JOB_WORKERS', '2')),
+            lease_seconds=float(os.environ.get('TRIP_JOB_LEASE_SECONDS', '60')),
+            max_attempts=int(os.environ.get('TRIP_JOB_MAX_ATTEMPTS', '3'))
+        )
+
+        # Each chat prompt carries an explicit, capped context instead of an ever-growing session
+        self.chat_memory = ChatMemory(
+            db.chats,
+            db.chat_memory,
+            partial(summarize_chat, self),
+            window_tokens=int(os.environ.get('CHAT_WINDOW_TOKENS', '1500')),
+            summary_tokens=int(os.environ.get('CHAT_SUMMARY_TOKENS', '400'))
+        )
+
+        self.text_search = TextSearch([
+            SearchSource(
+                "trips", db.trips,
+                {"destination": 1, "duration": 1, "budget": 1, "interests": 1, "travel_style": 1},
+                ["destination", "interests", "itinerary"],
+                prepare=decode_trip_itinerary,
+                hidden_fields=["itinerary"]
+            ),
+            SearchSource("chats", db.chats, {"message": 1, "response": 1}, ["message", "response"])
+        ])
+
+        self.user_export = ExportSource(
+            "users", db.users, {"_id": 0, "password": 0},
+            ["id", "email", "name", "subscription_plan", "subscription_active", "subscription_expires",
+             "trips_this_month", "chats_this_month", "is_admin", "created_at"]
+        )
+        self.trip_export = ExportSource(
+            "trips", db.trips, TRIP_PROJECTION,
+            ["id", "destination", "duration", "budget", "travel_style", "interests", "language",
+             "is_public", "created_at", "updated_at", "itinerary", "budget_breakdown"],
+            prepare=decode_trip_itinerary
+        )
+        self.chat_export = ExportSource("chats", db.chats, {"_id": 0}, ["id", "message", "response", "created_at"])
+
+        # Strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+        self.background_jobs = set()
+
+    def invalidate_cached_user(self, user_id: str):
+        self.user_cache.pop(user_id)
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.background_jobs.add(task)
+        task.add_done_callback(self.background_jobs.discard)
+        return task
+
+def get_services(request: Request) -> Services:
+    return request.app.state.services
+
+async def warm_mongo_pool(client, connections: int):
+    # Concurrent pings each check out their own pooled connection
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(connections)))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    services: Services = app.state.services
+    started = time.perf_counter()
+    # Fail fast on an unreachable server, then get connections, SDK imports
+    # and the bcrypt pool ready before the first request arrives
+    await services.client.admin.command("ping")
+    await asyncio.gather(
+        warm_mongo_pool(services.client, MONGO_WARM_CONNECTIONS),
+        services.llm.warm(),
+        services.password_hasher.warm(),
+        asyncio.to_thread(load_tokenizer)
+    )
+    index_errors = await ensure_indexes(services.db)
+    if index_errors:
+        # Serving on without them means slow queries and, without the unique
+        # email index, no guard against duplicate registrations
+        logger.error("Started without some indexes: " + "; ".join(index_errors))
+    if os.environ.get('MONGO_VERIFY_QUERY_PLANS', '').lower() in ('1', 'true', 'yes'):
+        failures = await verify_query_plans(services.db)
+        if failures:
+            raise RuntimeError("Query plan check failed: " + "; ".join(failures))
+    try:
+        # Admins get real numbers from the first request, not after the first refresh
+        await services.admin_stats.ensure_fresh()
+    except Exception as e:
+        logger.error(f"Admin stats refresh failed: {e!r}")
+    workers = [
+        asyncio.create_task(services.admin_stats.run()),
+        asyncio.create_task(services.quota.run_reset_worker()),
+        asyncio.create_task(services.notification_writer.run()),
+        asyncio.create_task(sample_loop_lag())
+    ]
+    if services.trip_jobs.workers:
+        workers.append(asyncio.create_task(services.trip_jobs.run()))
+    logger.info(f"Startup finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+    yield
+    for worker in workers:
+        worker.cancel()
+    # Let trip job workers hand their jobs back and buffered notifications
+    # drain before the client closes
+    await asyncio.gather(*workers, return_exceptions=True)
+    services.client.close()
+    services.password_hasher.shutdown()
+    if services.payment_gateway:
+        services.payment_gateway.shutdown()
+
 # Utility Functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(services: Services, password: str) -> str:
+    try:
+        with BCRYPT_SECONDS.time(op="hash"):
+            return await services.password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password(services: Services, password: str, hashed: str) -> bool:
+    try:
+        with BCRYPT_SECONDS.time(op="verify"):
+            return await services.password_hasher.verify(password, hashed)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+async def rehash_password(services: Services, user_id: str, password: str):
+    # Upgrades hashes made with an outdated BCRYPT_ROUNDS after a successful login
+    try:
+        hashed = await services.password_hasher.hash(password)
+    except PasswordHasherBusy:
+        return
+    await services.db.users.update_one({"id": user_id}, {"$set": {"password": hashed}})
+    services.invalidate_cached_user(user_id)
 
 def create_token(user_id: str) -> str:
     payload = {
@@ -150,287 +403,601 @@ def decode_token(token: str) -> Optional[str]:
     except jwt.InvalidTokenError:
         return None
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
-    token = credentials.credentials
+async def authenticate(services: Services, token: str) -> User:
     user_id = decode_token(token)
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
-    
-    user_doc = await db.users.find_one({"id": user_id}, {"_id": 0})
+
+    cached_user = services.user_cache.get(user_id)
+    if cached_user is not None:
+        return cached_user
+
+    user_doc = await services.db.users.find_one({"id": user_id}, {"_id": 0})
     if not user_doc:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    if isinstance(user_doc.get('subscription_expires'), str):
-        user_doc['subscription_expires'] = datetime.fromisoformat(user_doc['subscription_expires'])
-    
-    return User(**user_doc)
-
-async def check_plan_limits(user: User, action: str) -> bool:
-    limits = PLAN_LIMITS[user.subscription_plan]
-    
-    if action == "trip":
-        if limits["trips_per_month"] == -1:
-            return True
-        return user.trips_this_month < limits["trips_per_month"]
-    elif action == "chat":
-        if limits["ai_chats"] == -1:
-            return True
-        return user.chats_this_month < limits["ai_chats"]
-    
-    return False
-
-async def create_notification(user_id: str, title: str, message: str, notif_type: str = "info"):
+
+    user = User(**user_doc)
+    services.user_cache.put(user_id, user)
+    return user
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    return await authenticate(get_services(request), credentials.credentials)
+
+QUOTA_EXCEEDED_DETAIL = {
+    "trip": "Trip limit reached for {plan} plan. Upgrade to create more trips.",
+    "chat": "Chat limit reached for {plan} plan. Upgrade for unlimited chats."
+}
+
+async def reserve_quota(services: Services, user: User, action: str) -> Reservation:
+    try:
+        return await services.quota.reserve(user, action)
+    except QuotaExceeded:
+        raise HTTPException(status_code=403, detail=QUOTA_EXCEEDED_DETAIL[action].format(plan=user.subscription_plan.value))
+
+async def list_page(collection, query: Dict[str, Any], projection: Dict[str, Any], limit: int, cursor: Optional[str]) -> FastJSONResponse:
+    try:
+        items, next_cursor = await fetch_page(collection, query, projection, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(items, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+async def record_payment(services: Services, user_id: str, plan: SubscriptionPlan, mock: bool = False, order: Optional[Dict[str, Any]] = None):
+    await services.db.payments.insert_one({
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "plan": plan,
+        "amount": order["amount"] if order else PLAN_PRICES[plan],
+        "mock": mock,
+        "order_id": order["order_id"] if order else None,
+        "payment_id": order.get("payment_id") if order else None,
+        "created_at": datetime.now(timezone.utc)
+    })
+
+async def activate_subscription(services: Services, user_id: str, plan: SubscriptionPlan, order: Optional[Dict[str, Any]] = None) -> datetime:
+    expires = datetime.now(timezone.utc) + timedelta(days=30)
+    await services.db.users.update_one(
+        {"id": user_id},
+        {"$set": {
+            "subscription_plan": plan,
+            "subscription_active": True,
+            "subscription_expires": expires,
+            "trips_this_month": 0,
+            "chats_this_month": 0
+        }}
+    )
+    services.invalidate_cached_user(user_id)
+    await record_payment(services, user_id, plan, mock=order is None, order=order)
+    return expires
+
+def create_notification(services: Services, user_id: str, title: str, message: str, notif_type: str = "info"):
     notif = Notification(user_id=user_id, title=title, message=message, type=notif_type)
-    doc = notif.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.notifications.insert_one(doc)
+    services.notification_writer.add(notif.model_dump())
 
 # Authentication Routes
-@api_router.post("/auth/register")
-async def register(user_data: UserCreate):
-    existing = await db.users.find_one({"email": user_data.email})
+@api_router.post("/auth/register", response_model=AuthResponse)
+async def register(user_data: UserCreate, services: Services = Depends(get_services)):
+    existing = await services.db.users.find_one({"email": user_data.email})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    hashed_pw = hash_password(user_data.password)
+
+    hashed_pw = await hash_password(services, user_data.password)
     user = User(email=user_data.email, name=user_data.name)
-    
+
     doc = user.model_dump()
     doc['password'] = hashed_pw
-    doc['created_at'] = doc['created_at'].isoformat()
-    
-    await db.users.insert_one(doc)
-    
+    doc['quota_period'] = current_period()
+
+    try:
+        await services.db.users.insert_one(doc)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration for the same email
+        raise HTTPException(status_code=400, detail="Email already registered")
+
     token = create_token(user.id)
-    
-    await create_notification(user.id, "Welcome!", f"Welcome to AI Trip Planner, {user.name}!", "success")
-    
-    return {"user": user.model_dump(), "token": token}
-
-@api_router.post("/auth/login")
-async def login(credentials: UserLogin):
-    user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
+
+    create_notification(services, user.id, "Welcome!", f"Welcome to AI Trip Planner, {user.name}!", "success")
+
+    return FastJSONResponse({"user": user, "token": token})
+
+@api_router.post("/auth/login", response_model=AuthResponse)
+async def login(credentials: UserLogin, background_tasks: BackgroundTasks, services: Services = Depends(get_services)):
+    user_doc = await services.db.users.find_one({"email": credentials.email}, {"_id": 0})
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid email or password")
-    
-    if not verify_password(credentials.password, user_doc['password']):
+
+    if not await verify_password(services, credentials.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid email or password")
-    
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    if isinstance(user_doc.get('subscription_expires'), str):
-        user_doc['subscription_expires'] = datetime.fromisoformat(user_doc['subscription_expires'])
-    
+
+    if services.password_hasher.needs_rehash(user_doc['password']):
+        background_tasks.add_task(rehash_password, services, user_doc['id'], credentials.password)
+
     user = User(**{k: v for k, v in user_doc.items() if k != 'password'})
     token = create_token(user.id)
-    
-    return {"user": user.model_dump(), "token": token}
 
-@api_router.get("/auth/me")
+    return FastJSONResponse({"user": user, "token": token})
+
+@api_router.get("/auth/me", response_model=User)
 async def get_me(current_user: User = Depends(get_current_user)):
-    return current_user
+    return FastJSONResponse(current_user)
 
-# Trip Routes
-@api_router.post("/trips")
-async def create_trip(trip_request: TripRequest, current_user: User = Depends(get_current_user)):
-    if not await check_plan_limits(current_user, "trip"):
-        raise HTTPException(status_code=403, detail=f"Trip limit reached for {current_user.subscription_plan} plan. Upgrade to create more trips.")
-    
-    try:
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        session_id = f"trip-{uuid.uuid4()}"
-        
-        system_message = f"""You are an expert travel planner AI specializing in India and global destinations. 
-        Create detailed, personalized trip itineraries. Always use Indian Rupees (₹) for pricing. 
-        Include day-by-day plans with specific activities, restaurants, attractions, and practical tips.
-        Respond in {trip_request.language} language."""
-        
-        chat = LlmChat(api_key=api_key, session_id=session_id, system_message=system_message).with_model("openai", "gpt-4o-mini")
-        
-        interests_str = ", ".join(trip_request.interests)
-        prompt = f"""Create a detailed trip itinerary for:
-        Destination: {trip_request.destination}
-        Duration: {trip_request.duration}
-        Budget: {trip_request.budget}
-        Interests: {interests_str}
-        Travel Style: {trip_request.travel_style}
-        
-        Provide comprehensive day-by-day itinerary with activities, dining, and tips. Use Indian place names and pricing in ₹."""
-        
-        user_message = UserMessage(text=prompt)
-        itinerary = await chat.send_message(user_message)
-        
-        # Generate budget breakdown
-        budget_prompt = f"""Based on this trip to {trip_request.destination} for {trip_request.duration} with budget {trip_request.budget}, 
-        provide a JSON budget breakdown with: accommodation, food, activities, transport, shopping, miscellaneous. 
-        Return ONLY valid JSON with amounts in ₹."""
-        
-        budget_msg = UserMessage(text=budget_prompt)
-        budget_response = await chat.send_message(budget_msg)
-        
-        try:
-            import json
-            budget_breakdown = json.loads(budget_response.strip().replace('```json', '').replace('```', ''))
-        except:
-            budget_breakdown = {
-                "accommodation": "₹5000",
-                "food": "₹3000",
-                "activities": "₹2000",
-                "transport": "₹2000",
-                "shopping": "₹1000",
-                "miscellaneous": "₹1000"
-            }
-        
-        trip = Trip(
-            user_id=current_user.id,
-            **trip_request.model_dump(),
-            itinerary=itinerary,
-            budget_breakdown=budget_breakdown,
-            share_token=str(uuid.uuid4())
-        )
-        
-        doc = trip.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        
-        await db.trips.insert_one(doc)
-        
-        # Update user trip count
-        await db.users.update_one(
-            {"id": current_user.id},
-            {"$inc": {"trips_this_month": 1}}
+# Trip generation helpers
+SSE_KEEPALIVE_SECONDS = 10
+ITINERARY_TIMEOUT_SECONDS = float(os.environ.get('ITINERARY_TIMEOUT_SECONDS', '120'))
+BUDGET_TIMEOUT_SECONDS = float(os.environ.get('BUDGET_TIMEOUT_SECONDS', '30'))
+# Budgets come from the local cost tables; set to have the LLM adjust them
+BUDGET_LLM_REFINEMENT = os.environ.get('BUDGET_LLM_REFINEMENT', '').lower() in ('1', 'true', 'yes')
+
+def build_trip_system_message(trip_request: TripRequest) -> str:
+    return f"""You are an expert travel planner AI specializing in India and global destinations.
+    Create detailed, personalized trip itineraries. Always use Indian Rupees (₹) for pricing.
+    Include day-by-day plans with specific activities, restaurants, attractions, and practical tips.
+    Respond in {trip_request.language} language."""
+
+def build_itinerary_prompt(trip_request: TripRequest) -> str:
+    interests_str = ", ".join(trip_request.interests)
+    return f"""Create a detailed trip itinerary for:
+    Destination: {trip_request.destination}
+    Duration: {trip_request.duration}
+    Budget: {trip_request.budget}
+    Interests: {interests_str}
+    Travel Style: {trip_request.travel_style}
+
+    Provide comprehensive day-by-day itinerary with activities, dining, and tips. Use Indian place names and pricing in ₹."""
+
+def estimate_budget(services: Services, trip_request: TripRequest) -> Dict[str, Any]:
+    return services.budget_engine.estimate(trip_request.destination, trip_request.duration, trip_request.budget, trip_request.travel_style)
+
+def build_budget_refinement_prompt(trip_request: TripRequest, estimate: Dict[str, Any]) -> str:
+    amounts = {k: v for k, v in estimate.items() if k not in ("total", "currency", "basis")}
+    return f"""Here is an estimated budget in Indian Rupees for a {trip_request.travel_style} trip to {trip_request.destination}
+    for {trip_request.duration} with budget {trip_request.budget}: {json.dumps(amounts)}.
+    Adjust the amounts for local prices if needed. Return ONLY a JSON object with the same keys and integer rupee amounts."""
+
+def itinerary_step(services: Services, trip_request: TripRequest, user_id: str) -> PipelineStep:
+    async def generate_itinerary():
+        return await services.llm.complete(
+            build_itinerary_prompt(trip_request),
+            system_message=build_trip_system_message(trip_request),
+            session_id=f"trip-{uuid.uuid4()}",
+            user_id=user_id,
+            purpose="itinerary"
         )
-        
-        await create_notification(
-            current_user.id,
-            "Trip Created!",
-            f"Your trip to {trip_request.destination} is ready!",
-            "success"
+
+    return PipelineStep("itinerary", generate_itinerary, ITINERARY_TIMEOUT_SECONDS)
+
+def budget_step(services: Services, trip_request: TripRequest, user_id: str) -> PipelineStep:
+    # The cost tables answer in microseconds; with refinement on, the LLM
+    # call runs alongside the itinerary and any failure keeps the table numbers
+    estimate = estimate_budget(services, trip_request)
+
+    async def generate_budget():
+        if not BUDGET_LLM_REFINEMENT:
+            return estimate
+        budget_response = await services.llm.complete(
+            build_budget_refinement_prompt(trip_request, estimate),
+            system_message=build_trip_system_message(trip_request),
+            session_id=f"trip-{uuid.uuid4()}",
+            user_id=user_id,
+            purpose="budget"
         )
-        
-        return trip
+        return parse_refined_budget(budget_response, estimate)
+
+    return PipelineStep("budget_breakdown", generate_budget, BUDGET_TIMEOUT_SECONDS, fallback=lambda: estimate)
+
+def llm_busy_error(error: LlmBusy) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(int(error.retry_after))})
+
+async def save_trip(
+    services: Services,
+    user_id: str,
+    trip_request: TripRequest,
+    itinerary: str,
+    budget_breakdown: Dict[str, Any],
+    trip_id: Optional[str] = None
+) -> Trip:
+    trip = Trip(
+        **({"id": trip_id} if trip_id else {}),
+        user_id=user_id,
+        **trip_request.model_dump(),
+        itinerary=itinerary,
+        budget_breakdown=budget_breakdown,
+        share_token=str(uuid.uuid4())
+    )
+
+    doc = trip.model_dump()
+    doc["itinerary"] = encode_itinerary(itinerary)
+    # The itinerary is stored compressed, so the text index reads its words from here
+    doc["search_text"] = search_keywords(itinerary)
+
+    await services.db.trips.insert_one(doc)
+
+    create_notification(
+        services,
+        user_id,
+        "Trip Created!",
+        f"Your trip to {trip_request.destination} is ready!",
+        "success"
+    )
+
+    return trip
+
+async def run_trip_job(services: Services, job: Dict[str, Any], set_stage) -> None:
+    trip_request = TripRequest(**job["payload"])
+    # The trip id is fixed at enqueue time, so a retried job never saves twice
+    if not await services.db.trips.find_one({"id": job["trip_id"]}, {"_id": 1}):
+        await set_stage("generating")
+        content = await generate_trip_content(services, trip_request, job["user_id"], bypass_cache=job.get("bypass_cache", False))
+        await set_stage("saving")
+        await save_trip(services, job["user_id"], trip_request, content["itinerary"], content["budget_breakdown"], trip_id=job["trip_id"])
+    await services.quota.commit(Reservation(**job["reservation"]))
+
+async def fail_trip_job(services: Services, job: Dict[str, Any], error: str) -> None:
+    await services.quota.refund(Reservation(**job["reservation"]))
+    create_notification(
+        services,
+        job["user_id"],
+        "Trip Generation Failed",
+        f"We couldn't create your trip to {job['payload']['destination']}. Please try again.",
+        "error"
+    )
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def generate_trip_content(services: Services, trip_request: TripRequest, user_id: str, bypass_cache: bool = False) -> Dict[str, Any]:
+    cache_key, cache_params = trip_cache_key(trip_request)
+
+    async def generate():
+        return {"itinerary": await run_step(itinerary_step(services, trip_request, user_id))}
+
+    async def cached_itinerary():
+        cached = await services.trip_cache.get_or_generate(cache_key, cache_params, generate, bypass=bypass_cache)
+        return cached["itinerary"]
+
+    # Only the itinerary is cached; every request, hit or miss, gets a budget
+    # from the current cost tables for its own duration, budget and style
+    return await run_pipeline([
+        PipelineStep("itinerary", cached_itinerary, ITINERARY_TIMEOUT_SECONDS),
+        budget_step(services, trip_request, user_id)
+    ])
+
+async def stream_trip_events(services: Services, trip_request: TripRequest, user_id: str, reservation: Reservation, bypass_cache: bool = False):
+    """SSE events for one trip: start, the itinerary as chunk events, budget,
+    then done with the saved trip (or error).
+
+    Progress is step-level: LlmChat cannot stream, so with the Emergent
+    provider the itinerary is a single chunk sent once the model finishes,
+    with keepalive comments until then. Only providers that stream, such
+    as the fake one, send it in pieces.
+    """
+    yield sse_event("start", {"destination": trip_request.destination})
+
+    cache_key, cache_params = trip_cache_key(trip_request)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def stream_itinerary():
+        chunks = []
+        async for chunk in services.llm.stream(
+            build_itinerary_prompt(trip_request),
+            system_message=build_trip_system_message(trip_request),
+            session_id=f"trip-{uuid.uuid4()}",
+            user_id=user_id,
+            purpose="itinerary"
+        ):
+            chunks.append(chunk)
+            await queue.put(chunk)
+        return "".join(chunks)
+
+    async def generate():
+        return {"itinerary": await run_step(PipelineStep("itinerary", stream_itinerary, ITINERARY_TIMEOUT_SECONDS))}
+
+    # Same cache entry and in-flight generation as generate_trip_content:
+    # only the request that starts the generation sees its chunks, the
+    # others get the itinerary in one piece when it is ready. The budget
+    # is never cached.
+    budget_task = start_steps([budget_step(services, trip_request, user_id)])["budget_breakdown"]
+    content_task = asyncio.ensure_future(
+        services.trip_cache.get_or_generate(cache_key, cache_params, generate, bypass=bypass_cache)
+    )
+    content_task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        streamed = False
+        while True:
+            try:
+                chunk = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment lines keep proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            if chunk is None:
+                break
+            streamed = True
+            yield sse_event("chunk", {"text": chunk})
+        itinerary = content_task.result()["itinerary"]
+        if not streamed:
+            yield sse_event("chunk", {"text": itinerary})
+        budget_breakdown = await budget_task
+        yield sse_event("budget", budget_breakdown)
+
+        trip = await save_trip(services, user_id, trip_request, itinerary, budget_breakdown)
+        await services.quota.commit(reservation)
+        yield sse_event("done", trip.model_dump())
+    except asyncio.CancelledError:
+        # Client went away; the finally below stops the generation unless
+        # other requests are still waiting on it
+        raise
+    except LlmBusy as e:
+        yield sse_event("error", {"detail": str(e), "status": 429, "retry_after": e.retry_after})
     except Exception as e:
+        logging.error(f"Error streaming trip: {str(e)}")
+        yield sse_event("error", {"detail": f"Failed to create trip: {str(e)}"})
+    finally:
+        content_task.cancel()
+        budget_task.cancel()
+        if not reservation.settled:
+            # Runs detached: awaiting inside a cancelled stream would be cancelled too
+            services.spawn(services.quota.refund(reservation))
+
+# Trip Routes
+@api_router.post("/trips", response_model=Trip)
+async def create_trip(
+    trip_request: TripRequest,
+    no_cache: bool = False,
+    run_async: bool = Query(False, alias="async"),
+    current_user: User = Depends(get_current_user),
+    services: Services = Depends(get_services)
+):
+    reservation = await reserve_quota(services, current_user, "trip")
+
+    if run_async:
+        try:
+            job = await services.trip_jobs.enqueue(
+                current_user.id,
+                trip_request.model_dump(),
+                trip_id=str(uuid.uuid4()),
+                reservation=asdict(reservation),
+                bypass_cache=no_cache
+            )
+        except Exception:
+            await services.quota.refund(reservation)
+            raise
+        return FastJSONResponse(job, status_code=status.HTTP_202_ACCEPTED, headers={"Location": f"/api/trips/jobs/{job['id']}"})
+
+    try:
+        content = await generate_trip_content(services, trip_request, current_user.id, bypass_cache=no_cache)
+
+        trip = await save_trip(services, current_user.id, trip_request, content["itinerary"], content["budget_breakdown"])
+        await services.quota.commit(reservation)
+        return FastJSONResponse(trip)
+    except LlmBusy as e:
+        await services.quota.refund(reservation)
+        raise llm_busy_error(e)
+    except Exception as e:
+        await services.quota.refund(reservation)
         logging.error(f"Error creating trip: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create trip: {str(e)}")
 
-@api_router.get("/trips")
-async def get_trips(current_user: User = Depends(get_current_user)):
-    trips = await db.trips.find({"user_id": current_user.id}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    
-    for trip in trips:
-        if isinstance(trip.get('created_at'), str):
-            trip['created_at'] = datetime.fromisoformat(trip['created_at'])
-        if isinstance(trip.get('updated_at'), str):
-            trip['updated_at'] = datetime.fromisoformat(trip['updated_at'])
-    
-    return trips
-
-@api_router.get("/trips/{trip_id}")
-async def get_trip(trip_id: str, current_user: User = Depends(get_current_user)):
-    trip = await db.trips.find_one({"id": trip_id}, {"_id": 0})
+@api_router.post("/trips/stream")
+async def create_trip_stream(
+    trip_request: TripRequest,
+    no_cache: bool = False,
+    current_user: User = Depends(get_current_user),
+    services: Services = Depends(get_services)
+):
+    reservation = await reserve_quota(services, current_user, "trip")
+
+    return StreamingResponse(
+        stream_trip_events(services, trip_request, current_user.id, reservation, bypass_cache=no_cache),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/trips", response_model=List[TripSummary])
+async def get_trips(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    services: Services = Depends(get_services)
+):
+    return await list_page(services.db.trips, {"user_id": current_user.id}, TRIP_SUMMARY_PROJECTION, limit, cursor)
+
+@api_router.get("/trips/count")
+async def get_trip_count(current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    # The list is paginated, so its length is not the total; counts the user_id index
+    return {"count": await services.db.trips.count_documents({"user_id": current_user.id})}
+
+@api_router.get("/trips/jobs/{job_id}")
+async def get_trip_job(job_id: str, current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    job = await services.trip_jobs.get(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return FastJSONResponse(job)
+
+@api_router.get("/trips/{trip_id}", response_model=Trip)
+async def get_trip(trip_id: str, current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    trip = await services.db.trips.find_one({"id": trip_id}, TRIP_PROJECTION)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
-    
+
     if trip['user_id'] != current_user.id and current_user.id not in trip.get('shared_with', []):
         raise HTTPException(status_code=403, detail="Access denied")
-    
-    if isinstance(trip.get('created_at'), str):
-        trip['created_at'] = datetime.fromisoformat(trip['created_at'])
-    if isinstance(trip.get('updated_at'), str):
-        trip['updated_at'] = datetime.fromisoformat(trip['updated_at'])
-    
-    return trip
+
+    trip["itinerary"] = decode_itinerary(trip.get("itinerary"))
+    return FastJSONResponse(trip)
 
 @api_router.delete("/trips/{trip_id}")
-async def delete_trip(trip_id: str, current_user: User = Depends(get_current_user)):
-    trip = await db.trips.find_one({"id": trip_id})
+async def delete_trip(trip_id: str, current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    trip = await services.db.trips.find_one({"id": trip_id})
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
-    
+
     if trip['user_id'] != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
-    
-    await db.trips.delete_one({"id": trip_id})
+
+    await services.db.trips.delete_one({"id": trip_id})
+    if trip.get('share_token'):
+        services.shared_trip_cache.pop(trip['share_token'])
     return {"message": "Trip deleted successfully"}
 
 @api_router.post("/trips/{trip_id}/share")
-async def share_trip(trip_id: str, current_user: User = Depends(get_current_user)):
-    trip = await db.trips.find_one({"id": trip_id})
+async def share_trip(trip_id: str, current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    trip = await services.db.trips.find_one({"id": trip_id})
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
-    
+
     if trip['user_id'] != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
-    
+
     share_token = trip.get('share_token', str(uuid.uuid4()))
-    await db.trips.update_one({"id": trip_id}, {"$set": {"is_public": True, "share_token": share_token}})
-    
+    await services.db.trips.update_one({"id": trip_id}, {"$set": {"is_public": True, "share_token": share_token}})
+    services.shared_trip_cache.pop(share_token)
+
     return {"share_url": f"/shared/{share_token}"}
 
 @api_router.get("/shared/{share_token}")
-async def get_shared_trip(share_token: str):
-    trip = await db.trips.find_one({"share_token": share_token, "is_public": True}, {"_id": 0})
-    if not trip:
-        raise HTTPException(status_code=404, detail="Shared trip not found")
-    
-    if isinstance(trip.get('created_at'), str):
-        trip['created_at'] = datetime.fromisoformat(trip['created_at'])
-    if isinstance(trip.get('updated_at'), str):
-        trip['updated_at'] = datetime.fromisoformat(trip['updated_at'])
-    
-    return trip
+async def get_shared_trip(share_token: str, request: Request, services: Services = Depends(get_services)):
+    # encoding (None for identity) -> (body, etag)
+    variants = services.shared_trip_cache.get(share_token)
+    if variants is None:
+        trip = await services.db.trips.find_one({"share_token": share_token, "is_public": True}, TRIP_PROJECTION)
+        if not trip:
+            raise HTTPException(status_code=404, detail="Shared trip not found")
+        trip["itinerary"] = decode_itinerary(trip.get("itinerary"))
+        body = json_dumps(trip)
+        variants = {None: (body, strong_etag(body))}
+        services.shared_trip_cache.put(share_token, variants)
+
+    plain_body, plain_etag = variants[None]
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", "")) if len(plain_body) >= COMPRESSION_MIN_BYTES else None
+    if encoding not in variants:
+        # Compressed once per encoding and cached next to the plain body,
+        # so the middleware leaves it alone and the ETag stays strong
+        variants[encoding] = (compress(plain_body, encoding), encoded_etag(plain_etag, encoding))
+
+    body, etag = variants[encoding]
+    headers = {"ETag": etag, "Cache-Control": SHARED_TRIP_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # Chat Routes
-@api_router.post("/chat")
-async def chat(message: dict, current_user: User = Depends(get_current_user)):
-    if not await check_plan_limits(current_user, "chat"):
-        raise HTTPException(status_code=403, detail=f"Chat limit reached for {current_user.subscription_plan} plan. Upgrade for unlimited chats.")
-    
+CHAT_SYSTEM_MESSAGE = """You are a helpful AI travel assistant. Answer questions about destinations, travel tips,
+visa requirements, best times to visit, local customs, and help plan trips. Use Indian context and ₹ for pricing."""
+
+async def summarize_chat(services: Services, prompt: str, user_id: str) -> str:
+    # Background work, so it stays out of the user's own LLM slots
+    return await services.llm.complete(
+        prompt,
+        system_message="You maintain short, factual summaries of travel-planning conversations.",
+        session_id=f"chat-summary-{uuid.uuid4()}",
+        purpose="chat_summary"
+    )
+
+@api_router.post("/chat", response_model=ChatMessage)
+async def chat(message: dict, current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    reservation = await reserve_quota(services, current_user, "chat")
+
     try:
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        session_id = f"chat-{current_user.id}"
-        
-        system_message = """You are a helpful AI travel assistant. Answer questions about destinations, travel tips, 
-        visa requirements, best times to visit, local customs, and help plan trips. Use Indian context and ₹ for pricing."""
-        
-        chat = LlmChat(api_key=api_key, session_id=session_id, system_message=system_message).with_model("openai", "gpt-4o-mini")
-        
-        user_message = UserMessage(text=message['message'])
-        response = await chat.send_message(user_message)
-        
+        prompt, context = await services.chat_memory.build_prompt(current_user.id, message['message'])
+        response = await services.llm.complete(
+            prompt,
+            system_message=CHAT_SYSTEM_MESSAGE,
+            session_id=f"chat-{current_user.id}-{uuid.uuid4()}",
+            user_id=current_user.id,
+            purpose="chat"
+        )
+        logging.debug(f"Chat context for {current_user.id}: {context}")
+
         chat_msg = ChatMessage(
             user_id=current_user.id,
             message=message['message'],
             response=response
         )
-        
+
         doc = chat_msg.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        await db.chats.insert_one(doc)
-        
-        await db.users.update_one({"id": current_user.id}, {"$inc": {"chats_this_month": 1}})
-        
-        return chat_msg
+        await services.db.chats.insert_one(doc)
+        await services.quota.commit(reservation)
+        services.chat_memory.schedule_refresh(current_user.id)
+
+        return FastJSONResponse(chat_msg)
+    except LlmBusy as e:
+        await services.quota.refund(reservation)
+        raise llm_busy_error(e)
     except Exception as e:
+        await services.quota.refund(reservation)
         logging.error(f"Error in chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/chat/history")
-async def get_chat_history(current_user: User = Depends(get_current_user)):
-    chats = await db.chats.find({"user_id": current_user.id}, {"_id": 0}).sort("created_at", -1).limit(50).to_list(50)
-    
-    for chat in chats:
-        if isinstance(chat.get('created_at'), str):
-            chat['created_at'] = datetime.fromisoformat(chat['created_at'])
-    
-    return chats
+@api_router.get("/chat/history", response_model=List[ChatMessage])
+async def get_chat_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    services: Services = Depends(get_services)
+):
+    return await list_page(services.db.chats, {"user_id": current_user.id}, {"_id": 0}, limit, cursor)
+
+# Search Routes
+def decode_trip_itinerary(doc: Dict[str, Any]) -> Dict[str, Any]:
+    doc["itinerary"] = decode_itinerary(doc.get("itinerary"))
+    return doc
+
+@api_router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: Optional[str] = Query(None, pattern="^(trips|chats)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    services: Services = Depends(get_services)
+):
+    try:
+        results, next_cursor = await services.text_search.search(current_user.id, q, limit, cursor, kinds=[type] if type else None)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(results, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+# Export Routes
+# Exports stream straight from Mongo cursors, this many documents per round trip
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))
+
+def export_response(sources: List[ExportSource], query: Dict[str, Any], format: str, cursor: Optional[str], filename: str) -> StreamingResponse:
+    if format == "csv" and len(sources) > 1:
+        raise HTTPException(status_code=400, detail="CSV exports one type at a time; pass type")
+    try:
+        if cursor:
+            decode_export_cursor(cursor, sources)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    batches = export_batches(sources, query, EXPORT_BATCH_SIZE, cursor, csv_columns=format == "csv")
+    if format == "csv":
+        body, media_type, filename = csv_gzip_stream(batches, sources[0].columns), "application/gzip", f"{filename}.csv.gz"
+    else:
+        body, media_type, filename = ndjson_stream(batches), "application/x-ndjson", f"{filename}.ndjson"
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "no-store"
+    })
+
+@api_router.get("/me/export")
+async def export_my_data(
+    type: Optional[str] = Query(None, pattern="^(trips|chats)$"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    services: Services = Depends(get_services)
+):
+    sources = [source for source in (services.trip_export, services.chat_export) if type in (None, source.kind)]
+    return export_response(sources, {"user_id": current_user.id}, format, cursor, type or "export")
 
 # Subscription Routes
 @api_router.post("/subscription/create-order")
-async def create_subscription_order(plan_data: SubscriptionUpdate, current_user: User = Depends(get_current_user)):
-    if not razorpay_client:
+async def create_subscription_order(plan_data: SubscriptionUpdate, current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    if not services.payment_gateway:
         # Mock payment for development
         return {
             "order_id": f"order_mock_{uuid.uuid4()}",
@@ -438,166 +1005,264 @@ async def create_subscription_order(plan_data: SubscriptionUpdate, current_user:
             "currency": "INR",
             "mock": True
         }
-    
+
     try:
-        order = razorpay_client.order.create({
-            "amount": PLAN_PRICES[plan_data.plan],
-            "currency": "INR",
-            "payment_capture": 1
-        })
-        return order
+        # Repeated clicks get the same open order back
+        order = await services.payment_orders.get_or_create(current_user.id, plan_data.plan.value, PLAN_PRICES[plan_data.plan])
+    except OrderPending as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "1"})
+    except PaymentTimeout:
+        raise HTTPException(status_code=504, detail="Payment provider timed out, please retry")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        logging.error(f"Razorpay order error: {str(e)}")
+        raise HTTPException(status_code=502, detail="Could not create payment order")
+
+    return {
+        "order_id": order["order_id"],
+        "amount": order["amount"],
+        "currency": order["currency"],
+        "key_id": services.payment_gateway.key_id
+    }
 
 @api_router.post("/subscription/verify")
-async def verify_subscription(payment_data: dict, current_user: User = Depends(get_current_user)):
+async def verify_subscription(payment_data: dict, current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    payment_gateway = services.payment_gateway
     # For mock/development (when Razorpay keys not configured)
-    if payment_data.get('mock'):
+    if payment_data.get('mock') and not payment_gateway:
         plan = SubscriptionPlan(payment_data['plan'])
-        expires = datetime.now(timezone.utc) + timedelta(days=30)
-        
-        await db.users.update_one(
-            {"id": current_user.id},
-            {"$set": {
-                "subscription_plan": plan,
-                "subscription_active": True,
-                "subscription_expires": expires.isoformat(),
-                "trips_this_month": 0,
-                "chats_this_month": 0
-            }}
-        )
-        
-        await create_notification(
+        expires = await activate_subscription(services, current_user.id, plan)
+
+        create_notification(
+            services,
             current_user.id,
             "Subscription Upgraded!",
             f"Welcome to {plan.upper()} plan! (Demo Mode)",
             "success"
         )
-        
+
         return {"success": True, "plan": plan, "expires": expires}
-    
+
     # Real Razorpay verification
-    if razorpay_client and payment_data.get('razorpay_payment_id'):
+    if payment_gateway and payment_data.get('razorpay_payment_id'):
+        order_id = str(payment_data.get('razorpay_order_id', ''))
+        payment_id = str(payment_data['razorpay_payment_id'])
         try:
-            # Verify payment signature
-            params = {
-                'razorpay_order_id': payment_data['razorpay_order_id'],
-                'razorpay_payment_id': payment_data['razorpay_payment_id'],
-                'razorpay_signature': payment_data['razorpay_signature']
-            }
-            
-            razorpay_client.utility.verify_payment_signature(params)
-            
-            # Update subscription
-            plan = SubscriptionPlan(payment_data['plan'])
-            expires = datetime.now(timezone.utc) + timedelta(days=30)
-            
-            await db.users.update_one(
-                {"id": current_user.id},
-                {"$set": {
-                    "subscription_plan": plan,
-                    "subscription_active": True,
-                    "subscription_expires": expires.isoformat(),
-                    "trips_this_month": 0,
-                    "chats_this_month": 0
-                }}
-            )
-            
-            await create_notification(
+            verified = await payment_gateway.verify_payment(order_id, payment_id, str(payment_data.get('razorpay_signature', '')))
+        except PaymentTimeout:
+            raise HTTPException(status_code=504, detail="Payment provider timed out, please retry")
+        except Exception as e:
+            logging.error(f"Razorpay verification error: {str(e)}")
+            verified = False
+
+        # The plan comes from our order, not from the request
+        order = await services.payment_orders.get(order_id) if verified else None
+        if order is None or order["user_id"] != current_user.id:
+            raise HTTPException(status_code=400, detail="Payment verification failed")
+
+        plan = SubscriptionPlan(order["plan"])
+        paid = await services.payment_orders.mark_paid(order_id, payment_id)
+        if paid:
+            expires = await activate_subscription(services, current_user.id, plan, paid)
+            create_notification(
+                services,
                 current_user.id,
                 "Payment Successful!",
                 f"Your {plan.upper()} subscription is now active!",
                 "success"
             )
-            
-            return {"success": True, "plan": plan, "expires": expires}
-        except Exception as e:
-            logging.error(f"Razorpay verification error: {str(e)}")
-            raise HTTPException(status_code=400, detail="Payment verification failed")
-    
+        else:
+            # Already activated, by the webhook or an earlier verify
+            user_doc = await services.db.users.find_one({"id": current_user.id}, {"_id": 0, "subscription_expires": 1})
+            expires = (user_doc or {}).get("subscription_expires")
+
+        return {"success": True, "plan": plan, "expires": expires}
+
     return {"success": False, "message": "Invalid payment data"}
 
+async def activate_paid_order(services: Services, order_id: str, payment_id: str):
+    try:
+        paid = await services.payment_orders.mark_paid(order_id, payment_id)
+        if not paid:
+            return
+        plan = SubscriptionPlan(paid["plan"])
+        await activate_subscription(services, paid["user_id"], plan, paid)
+        create_notification(
+            services,
+            paid["user_id"],
+            "Payment Successful!",
+            f"Your {plan.upper()} subscription is now active!",
+            "success"
+        )
+    except Exception as e:
+        logging.error(f"Failed to activate subscription for order {order_id}: {e!r}")
+
+@api_router.post("/subscription/webhook")
+async def subscription_webhook(request: Request, background_tasks: BackgroundTasks, services: Services = Depends(get_services)):
+    payment_gateway = services.payment_gateway
+    if not payment_gateway or not payment_gateway.webhook_secret:
+        raise HTTPException(status_code=503, detail="Payment webhook not configured")
+
+    # The signature covers the raw body, byte for byte
+    body = (await request.body()).decode("utf-8")
+    try:
+        verified = await payment_gateway.verify_webhook(body, request.headers.get("X-Razorpay-Signature", ""))
+    except PaymentTimeout:
+        raise HTTPException(status_code=503, detail="Signature check timed out")
+    if not verified:
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
+
+    event = json.loads(body)
+    if event.get("event") in ("payment.captured", "order.paid"):
+        payment = event.get("payload", {}).get("payment", {}).get("entity", {})
+        if payment.get("order_id") and payment.get("id"):
+            # Answer Razorpay right away; payment.captured and order.paid
+            # for the same payment activate it only once
+            background_tasks.add_task(activate_paid_order, services, payment["order_id"], payment["id"])
+
+    return {"status": "ok"}
+
 # Notification Routes
-@api_router.get("/notifications")
-async def get_notifications(current_user: User = Depends(get_current_user)):
-    notifications = await db.notifications.find(
-        {"user_id": current_user.id},
-        {"_id": 0}
-    ).sort("created_at", -1).limit(20).to_list(20)
-    
-    for notif in notifications:
-        if isinstance(notif.get('created_at'), str):
-            notif['created_at'] = datetime.fromisoformat(notif['created_at'])
-    
-    return notifications
+@api_router.get("/notifications", response_model=List[Notification])
+async def get_notifications(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    services: Services = Depends(get_services)
+):
+    return await list_page(services.db.notifications, {"user_id": current_user.id}, {"_id": 0}, limit, cursor)
+
+@api_router.get("/notifications/unread-count")
+async def get_unread_count(current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    return {"unread": await services.notification_writer.unread_count(current_user.id)}
+
+@api_router.put("/notifications/read-all")
+async def mark_all_notifications_read(current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    updated = await services.notification_writer.mark_all_read(current_user.id)
+    return {"success": True, "updated": updated}
 
 @api_router.put("/notifications/{notif_id}/read")
-async def mark_notification_read(notif_id: str, current_user: User = Depends(get_current_user)):
-    await db.notifications.update_one(
-        {"id": notif_id, "user_id": current_user.id},
-        {"$set": {"read": True}}
-    )
+async def mark_notification_read(notif_id: str, current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    await services.notification_writer.mark_read(current_user.id, notif_id)
     return {"success": True}
 
 # Admin Routes
 @api_router.get("/admin/stats")
-async def get_admin_stats(current_user: User = Depends(get_current_user)):
+async def get_admin_stats(refresh: bool = False, current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
-    
-    total_users = await db.users.count_documents({})
-    total_trips = await db.trips.count_documents({})
-    total_chats = await db.chats.count_documents({})
-    
-    plan_breakdown = {}
-    for plan in SubscriptionPlan:
-        count = await db.users.count_documents({"subscription_plan": plan})
-        plan_breakdown[plan] = count
-    
+
+    return FastJSONResponse(await services.admin_stats.get(force=refresh))
+
+@api_router.get("/admin/cache")
+async def get_cache_stats(current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
     return {
-        "total_users": total_users,
-        "total_trips": total_trips,
-        "total_chats": total_chats,
-        "plan_breakdown": plan_breakdown,
-        "revenue_estimate": (
-            plan_breakdown.get(SubscriptionPlan.PRO, 0) * 499 +
-            plan_breakdown.get(SubscriptionPlan.ENTERPRISE, 0) * 1999
-        )
+        "itinerary_cache": services.trip_cache.snapshot(),
+        "user_cache": services.user_cache.snapshot(),
+        "shared_trip_cache": services.shared_trip_cache.snapshot()
     }
 
-@api_router.get("/admin/users")
-async def get_all_users(current_user: User = Depends(get_current_user)):
+@api_router.get("/admin/llm")
+async def get_llm_stats(current_user: User = Depends(get_current_user), services: Services = Depends(get_services)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return services.llm.snapshot()
+
+@api_router.get("/admin/users", response_model=List[User])
+async def get_all_users(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    services: Services = Depends(get_services)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return await list_page(services.db.users, {}, {"_id": 0, "password": 0}, limit, cursor)
+
+@api_router.get("/admin/users/export")
+async def export_all_users(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    services: Services = Depends(get_services)
+):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
-    
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
-    
-    for user in users:
-        if isinstance(user.get('created_at'), str):
-            user['created_at'] = datetime.fromisoformat(user['created_at'])
-        if isinstance(user.get('subscription_expires'), str):
-            user['subscription_expires'] = datetime.fromisoformat(user['subscription_expires'])
-    
-    return users
+
+    return export_response([services.user_export], {}, format, cursor, "users")
 
 # Health check
 @api_router.get("/")
 async def root():
     return {"message": "AI Trip Planner SaaS API", "version": "2.0"}
 
-app.include_router(api_router)
+async def is_admin_request(services: Services, headers) -> bool:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        user = await authenticate(services, token)
+    except HTTPException:
+        return False
+    return user.is_admin
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def get_metrics(request: Request):
+    # Private unless METRICS_PUBLIC is set: scrapers send METRICS_TOKEN, people an admin token
+    services = get_services(request)
+    if os.environ.get('METRICS_PUBLIC', '').lower() not in ('1', 'true', 'yes'):
+        metrics_token = os.environ.get('METRICS_TOKEN')
+        authorization = request.headers.get("authorization", "")
+        token_ok = bool(metrics_token) and hmac.compare_digest(authorization, f"Bearer {metrics_token}")
+        if not token_ok and not await is_admin_request(services, request.headers):
+            raise HTTPException(status_code=401, detail="Metrics require METRICS_TOKEN or an admin token")
+
+    snapshot = services.llm.snapshot()
+    LLM_IN_FLIGHT.set(snapshot["in_flight"])
+    LLM_WAITING.set(snapshot["waiting"])
+    NOTIFICATIONS_BUFFERED.set(len(services.notification_writer))
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+def create_app() -> FastAPI:
+    """Builds a new app with its own Services.
+
+    Nothing connects until the lifespan runs. ``uvicorn server:app`` serves
+    the module-level app below; ``uvicorn server:create_app --factory``
+    builds a fresh one instead.
+    """
+    app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+    app.state.services = services = Services()
+    app.include_router(api_router)
+    app.add_api_route("/metrics", get_metrics, include_in_schema=False)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag"],
+    )
+
+    app.add_middleware(MetricsMiddleware, prefix="/api")
+    # Profiles expose internals, so only admins may request them
+    app.add_middleware(ProfilingMiddleware, is_allowed=partial(is_admin_request, services))
+
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=COMPRESSION_MIN_BYTES
+    )
+    return app
+
+# Cheap to build: connections and heavy imports wait for the lifespan
+app = create_app()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("server:app", host="0.0.0.0", port=int(os.environ.get('PORT', '8001')))
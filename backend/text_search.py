@@ -0,0 +1,185 @@
+import asyncio
+import base64
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pagination import InvalidCursor
+
+# Trips carry their own `language` field with codes ("hi", "ta", ...) that
+# Mongo text search does not know; pointing the override at a field that
+# is never set keeps every document on default_language
+LANGUAGE_OVERRIDE = "search_language"
+
+MAX_KEYWORDS = 1500
+SNIPPET_CONTEXT = 60
+MAX_SNIPPETS_PER_FIELD = 2
+
+_WORD = re.compile(r"\w{3,}")
+_SUFFIXES = ("ing", "es", "ed", "s")
+
+
+def search_keywords(text: str, max_words: int = MAX_KEYWORDS) -> str:
+    # Distinct words in first-seen order: what the text index needs from an
+    # itinerary that is itself stored compressed
+    seen: Dict[str, None] = {}
+    for word in _WORD.findall((text or "").lower()):
+        if word not in seen:
+            seen[word] = None
+            if len(seen) >= max_words:
+                break
+    return " ".join(seen)
+
+
+def query_terms(q: str) -> List[str]:
+    # Same split as $text: words and quoted phrases, minus -negated words
+    terms = []
+    for token in re.findall(r'"[^"]*"|\S+', q):
+        if token.startswith("-"):
+            continue
+        terms.extend(word.lower() for word in re.findall(r"\w+", token))
+    return terms
+
+
+def _stem(term: str) -> str:
+    # Close enough to the english stemmer for highlighting: "beaches" -> "beach"
+    for suffix in _SUFFIXES:
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[:-len(suffix)]
+    return term
+
+
+def highlight_pattern(terms: List[str]) -> Optional[re.Pattern]:
+    stems = sorted({_stem(term) for term in terms}, key=len, reverse=True)
+    if not stems:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(stem) for stem in stems) + r")\w*", re.IGNORECASE)
+
+
+def highlight(field_name: str, text: str, pattern: re.Pattern) -> List[Dict[str, Any]]:
+    """Snippets around the first matches in ``text``, with match offsets
+    relative to each snippet so clients can mark them up safely."""
+    snippets = []
+    end_of_last = 0
+    for match in pattern.finditer(text or ""):
+        if match.start() < end_of_last:
+            continue
+        start = max(0, match.start() - SNIPPET_CONTEXT)
+        end = min(len(text), match.end() + SNIPPET_CONTEXT)
+        snippet = text[start:end]
+        matches = [[m.start(), m.end()] for m in pattern.finditer(snippet)]
+        snippets.append({
+            "field": field_name,
+            "snippet": ("…" if start else "") + snippet + ("…" if end < len(text) else ""),
+            "matches": [[s + (1 if start else 0), e + (1 if start else 0)] for s, e in matches]
+        })
+        end_of_last = end
+        if len(snippets) >= MAX_SNIPPETS_PER_FIELD:
+            break
+    return snippets
+
+
+@dataclass
+class SearchSource:
+    kind: str
+    collection: Any
+    # Fields returned with each hit, besides id, created_at and score
+    projection: Dict[str, int]
+    # Fields that snippets are cut from, after ``prepare``
+    highlight_fields: List[str]
+    # Turns a stored document into the text the user sees (e.g. decompresses)
+    prepare: Callable[[Dict[str, Any]], Dict[str, Any]] = lambda doc: doc
+    # Fields needed for highlighting but left out of the result
+    hidden_fields: List[str] = field(default_factory=list)
+
+
+def encode_search_cursor(positions: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(positions, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_search_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(positions, dict):
+            raise TypeError(type(positions))
+        for position in positions.values():
+            if position is not None:
+                score, doc_id = position
+                float(score), str(doc_id)
+        return positions
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+class TextSearch:
+    """Ranked full-text search over a user's own documents.
+
+    Each source is queried through its Mongo text index (compound on
+    user_id, so only that user's index entries are walked), ranked by
+    textScore with id breaking ties. Results from several sources are
+    merged by score. The cursor records, per source, the (score, id) of
+    the last hit handed out, or null once a source is exhausted.
+    """
+
+    def __init__(self, sources: List[SearchSource]):
+        self.sources = {source.kind: source for source in sources}
+
+    async def _fetch(self, source: SearchSource, user_id: str, q: str, after: Optional[List[Any]], limit: int) -> List[Dict[str, Any]]:
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": {"user_id": user_id, "$text": {"$search": q}}},
+            {"$project": {
+                "_id": 0, "id": 1, "created_at": 1,
+                **source.projection,
+                **{name: 1 for name in source.hidden_fields},
+                "score": {"$meta": "textScore"}
+            }},
+        ]
+        if after is not None:
+            score, doc_id = after
+            pipeline.append({"$match": {"$or": [{"score": {"$lt": score}}, {"score": score, "id": {"$gt": doc_id}}]}})
+        pipeline += [{"$sort": {"score": -1, "id": 1}}, {"$limit": limit + 1}]
+        return await source.collection.aggregate(pipeline).to_list(limit + 1)
+
+    async def search(
+        self,
+        user_id: str,
+        q: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        kinds: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        positions = decode_search_cursor(cursor) if cursor else {}
+        kinds = kinds or list(self.sources)
+        # A kind missing from the cursor starts from the top; null means done
+        active = [self.sources[kind] for kind in kinds if kind in self.sources and (kind not in positions or positions[kind] is not None)]
+        fetched = await asyncio.gather(*(self._fetch(source, user_id, q, positions.get(source.kind), limit) for source in active))
+
+        candidates = [(doc["score"], source, doc) for source, docs in zip(active, fetched) for doc in docs]
+        candidates.sort(key=lambda item: (-item[0], item[1].kind, item[2]["id"]))
+        page = candidates[:limit]
+
+        next_positions = {kind: position for kind, position in positions.items() if kind in kinds and kind in self.sources}
+        for source, docs in zip(active, fetched):
+            taken = [doc for _, hit_source, doc in page if hit_source is source]
+            if taken:
+                next_positions[source.kind] = [taken[-1]["score"], taken[-1]["id"]]
+            if len(taken) == len(docs):
+                next_positions[source.kind] = None
+
+        pattern = highlight_pattern(query_terms(q))
+        results = []
+        for score, source, doc in page:
+            doc = source.prepare(doc)
+            highlights = []
+            if pattern is not None:
+                for name in source.highlight_fields:
+                    value = doc.get(name)
+                    text = ", ".join(value) if isinstance(value, list) else value
+                    highlights += highlight(name, text or "", pattern)
+            for name in source.hidden_fields:
+                doc.pop(name, None)
+            results.append({"type": source.kind, **doc, "highlights": highlights})
+
+        more = any(next_positions.get(source.kind, "start") is not None for source in active)
+        return results, encode_search_cursor(next_positions) if more else None
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ttl_lru import TTLLRU
+
+logger = logging.getLogger(__name__)
+
+# Requests whose budgets land in the same bucket share an itinerary
+BUDGET_BUCKETS = [(10000, "budget"), (30000, "mid")]
+BUDGET_KEYWORDS = {
+    "budget": "budget", "cheap": "budget", "backpack": "budget", "low": "budget",
+    "mid": "mid", "moderate": "mid", "standard": "mid",
+    "luxury": "luxury", "premium": "luxury", "high": "luxury"
+}
+AMOUNT_UNITS = {
+    "k": 1_000, "thousand": 1_000,
+    "l": 100_000, "lac": 100_000, "lacs": 100_000, "lakh": 100_000, "lakhs": 100_000,
+    "cr": 10_000_000, "crore": 10_000_000, "crores": 10_000_000,
+    "mn": 1_000_000, "million": 1_000_000
+}
+# "5,000", "1,50,000", "1.5 lakh", "50k"; the unit must end a word, so the
+# "l" of "5 luxury" is not a lakh
+_AMOUNT = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(" + "|".join(sorted(AMOUNT_UNITS, key=len, reverse=True)) + r")?\b")
+_RANGE_DASH = re.compile(r"\s*(?:-|–|to)\s*$")
+
+
+def _normalize_text(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def parse_amounts(text: str) -> List[int]:
+    """Every amount in a budget string, in order, in whole rupees.
+
+    "₹5,000-10,000" -> [5000, 10000], "50k" -> [50000],
+    "₹1-1.5 lakh" -> [100000, 150000]: a bare number before a dash takes
+    the unit of the number after it.
+    """
+    text = text.lower()
+    matches = list(_AMOUNT.finditer(text))
+    amounts = []
+    for i, match in enumerate(matches):
+        unit = match.group(2)
+        if unit is None and i + 1 < len(matches) and matches[i + 1].group(2):
+            between = text[match.end():matches[i + 1].start()]
+            if _RANGE_DASH.match(between):
+                unit = matches[i + 1].group(2)
+        value = float(match.group(1).replace(",", "")) * AMOUNT_UNITS.get(unit, 1)
+        amounts.append(int(round(value)))
+    return amounts
+
+
+def budget_range(budget: str) -> Tuple[Optional[int], Optional[int]]:
+    # "Budget-friendly (₹5,000-10,000)" -> (5000, 10000); "Luxury (₹30,000+)" -> (30000, None)
+    amounts = parse_amounts(budget)
+    if not amounts:
+        return None, None
+    if "+" in budget:
+        return max(amounts), None
+    return min(amounts), max(amounts)
+
+
+def duration_days(duration: str) -> Optional[int]:
+    # Upper end of the range: "1-3 days" -> 3, "1-2 weeks" -> 14, "2+ weeks" -> 15
+    text = _normalize_text(duration)
+    numbers = [int(n) for n in re.findall(r"\d+", text)]
+    if not numbers:
+        return None
+    days = max(numbers) * (7 if "week" in text else 1)
+    if "+" in text:
+        days += 1
+    return days
+
+
+def normalize_duration(duration: str) -> str:
+    # The exact day count: a 5-day request must never get a 4-day plan
+    days = duration_days(duration)
+    return f"{days}d" if days is not None else _normalize_text(duration)
+
+
+def bucket_budget(budget: str) -> str:
+    text = _normalize_text(budget)
+    for keyword, label in BUDGET_KEYWORDS.items():
+        if re.search(rf"\b{keyword}", text):
+            return label
+    floor, ceiling = budget_range(text)
+    if floor is None:
+        return text
+    for limit, label in BUDGET_BUCKETS:
+        # "₹30,000+" is above the 30,000 limit, "₹10,000-30,000" is not
+        if (ceiling <= limit) if ceiling is not None else (floor < limit):
+            return label
+    return "luxury"
+
+
+def trip_cache_key(trip_request) -> Tuple[str, Dict[str, Any]]:
+    # trip_request is a server.TripRequest; only its plain fields are read here
+    params = {
+        "destination": _normalize_text(trip_request.destination),
+        "duration": normalize_duration(trip_request.duration),
+        "budget": bucket_budget(trip_request.budget),
+        "interests": sorted({_normalize_text(i) for i in trip_request.interests}),
+        "travel_style": _normalize_text(trip_request.travel_style),
+        "language": _normalize_text(trip_request.language)
+    }
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+    return digest, params
+
+
+class TripCache:
+    """Bounded in-process LRU with TTL in front of a Mongo collection.
+
+    Concurrent misses for the same key share a single generation task,
+    which is cancelled if every caller waiting on it goes away.
+    """
+
+    def __init__(self, collection, max_entries: int = 512, ttl_seconds: float = 86400):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._local = TTLLRU(max_entries, ttl_seconds)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Callers still awaiting each in-flight generation
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.stats = {"mongo_hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "abandoned": 0}
+
+    def snapshot(self) -> Dict[str, Any]:
+        local = self._local.snapshot()
+        hits = local["hits"] + self.stats["mongo_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hits": local["hits"],
+            "evictions": local["evictions"],
+            "expired": local["expired"],
+            "entries": local["entries"],
+            "inflight": len(self._inflight),
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
+
+    async def _get_remote(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            doc = await self.collection.find_one(
+                {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                # Entries written before budgets moved out of the cache also
+                # carry a budget_breakdown, which is left behind here
+                {"_id": 0, "itinerary": 1}
+            )
+        except Exception as e:
+            logger.warning(f"Itinerary cache lookup failed: {e!r}")
+            return None
+        return doc
+
+    async def _put_remote(self, key: str, params: Dict[str, Any], value: Dict[str, Any]):
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one(
+                {"key": key},
+                {"$set": {
+                    **value,
+                    "key": key,
+                    "params": params,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds)
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Itinerary cache write failed: {e!r}")
+
+    async def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._local.get(key)
+        if value is not None:
+            return value
+        value = await self._get_remote(key)
+        if value is not None:
+            self.stats["mongo_hits"] += 1
+            self._local.put(key, value)
+            return value
+        self.stats["misses"] += 1
+        return None
+
+    async def store(self, key: str, params: Dict[str, Any], value: Dict[str, Any]):
+        self._local.put(key, value)
+        await self._put_remote(key, params, value)
+
+    async def _load(self, key: str, params: Dict[str, Any], generate: Callable[[], Awaitable[Dict[str, Any]]]):
+        value = await self.lookup(key)
+        if value is None:
+            value = await generate()
+            await self.store(key, params, value)
+        return value
+
+    async def get_or_generate(
+        self,
+        key: str,
+        params: Dict[str, Any],
+        generate: Callable[[], Awaitable[Dict[str, Any]]],
+        bypass: bool = False
+    ) -> Dict[str, Any]:
+        if bypass:
+            # Skip the lookup but refresh the entry for everyone else
+            self.stats["bypassed"] += 1
+            value = await generate()
+            await self.store(key, params, value)
+            return value
+
+        value = self._local.get(key)
+        if value is not None:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            # The generation outlives the caller that started it, so one
+            # disconnect does not fail the requests coalesced onto it
+            task = asyncio.create_task(self._load(key, params, generate))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.stats["coalesced"] += 1
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._leave(key, task)
+
+    def _leave(self, key: str, task: asyncio.Task):
+        # Once every caller has gone (disconnected or cancelled) nobody
+        # wants the result, so stop paying for the LLM call
+        self._waiters[task] -= 1
+        if self._waiters[task]:
+            return
+        del self._waiters[task]
+        if not task.done():
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+            self.stats["abandoned"] += 1
+            task.cancel()
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Itinerary generation failed: {task.exception()!r}")
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Fields returned by the status endpoint
+JOB_PROJECTION = {
+    "_id": 0, "id": 1, "status": 1, "stage": 1, "attempts": 1, "trip_id": 1,
+    "error": 1, "created_at": 1, "updated_at": 1, "finished_at": 1
+}
+
+Handler = Callable[[Dict[str, Any], Callable[[str], Awaitable[None]]], Awaitable[None]]
+
+
+class JobLeaseLost(Exception):
+    pass
+
+
+class TripJobQueue:
+    """Mongo-backed queue for trip generation jobs.
+
+    Workers claim a job with a single find_one_and_update that sets a
+    lease. The lease is renewed while the job runs, so a job whose worker
+    died becomes claimable again once its lease expires. Every write from
+    a worker is fenced on its lease token, so a worker that lost its lease
+    cannot overwrite the job. Failed attempts are retried with backoff
+    until ``max_attempts``, after which ``on_failure`` is called.
+    """
+
+    def __init__(
+        self,
+        collection,
+        handler: Handler,
+        on_failure: Callable[[Dict[str, Any], str], Awaitable[None]],
+        workers: int = 2,
+        lease_seconds: float = 60,
+        poll_seconds: float = 1,
+        max_attempts: int = 3,
+        retry_backoff_seconds: float = 5,
+        retention_days: int = 7
+    ):
+        self.collection = collection
+        self.handler = handler
+        self.on_failure = on_failure
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.retention_days = retention_days
+        self._wakeup = asyncio.Event()
+        self.stats = {"enqueued": 0, "succeeded": 0, "retried": 0, "failed": 0}
+
+    async def enqueue(self, user_id: str, payload: Dict[str, Any], **fields) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "status": QUEUED,
+            "stage": QUEUED,
+            "payload": payload,
+            "attempts": 0,
+            "available_at": now,
+            "lease_owner": None,
+            "lease_until": None,
+            "created_at": now,
+            "updated_at": now,
+            **fields
+        }
+        await self.collection.insert_one(job)
+        self.stats["enqueued"] += 1
+        # Local workers pick it up straight away; others see it on their next poll
+        self._wakeup.set()
+        return {key: job[key] for key, shown in JOB_PROJECTION.items() if shown and key in job}
+
+    async def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": job_id, "user_id": user_id}, JOB_PROJECTION)
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": QUEUED, "available_at": {"$lte": now}},
+                {"status": RUNNING, "lease_until": {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "lease_owner": str(uuid.uuid4()),
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _update(self, job: Dict[str, Any], changes: Dict[str, Any]):
+        changes["updated_at"] = datetime.now(timezone.utc)
+        result = await self.collection.update_one(
+            {"id": job["id"], "lease_owner": job["lease_owner"]},
+            {"$set": changes}
+        )
+        if not result.matched_count:
+            raise JobLeaseLost(job["id"])
+
+    async def _keep_lease(self, job: Dict[str, Any]):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self._update(job, {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)})
+
+    def _finished(self, status: str, **changes) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        return {
+            "status": status,
+            "finished_at": now,
+            # Finished jobs are removed by the TTL index after the retention period
+            "expires_at": now + timedelta(days=self.retention_days),
+            "lease_owner": None,
+            "lease_until": None,
+            **changes
+        }
+
+    async def process(self, job: Dict[str, Any]):
+        if job["attempts"] > self.max_attempts:
+            # The previous worker died on its final attempt
+            await self._fail(job, job.get("error") or "Worker stopped while processing the job")
+            return
+
+        async def set_stage(stage: str):
+            await self._update(job, {"stage": stage})
+
+        lease = asyncio.create_task(self._keep_lease(job))
+        work = asyncio.create_task(self.handler(job, set_stage))
+        try:
+            done, _ = await asyncio.wait({lease, work}, return_when=asyncio.FIRST_COMPLETED)
+            if lease in done:
+                # Losing the lease means another worker owns the job now
+                work.cancel()
+                lease.result()
+            work.result()
+        except JobLeaseLost:
+            logger.warning(f"Lost lease on trip job {job['id']}")
+            return
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back rather than leaving it until the lease expires
+            await asyncio.shield(self._release(job))
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if job["attempts"] < self.max_attempts:
+                self.stats["retried"] += 1
+                logger.warning(f"Trip job {job['id']} attempt {job['attempts']} failed: {error}")
+                delay = self.retry_backoff_seconds * 2 ** (job["attempts"] - 1)
+                await self._update(job, {
+                    "status": QUEUED,
+                    "stage": QUEUED,
+                    "error": error,
+                    "available_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+                    "lease_owner": None,
+                    "lease_until": None
+                })
+            else:
+                await self._fail(job, error)
+            return
+        finally:
+            lease.cancel()
+            work.cancel()
+
+        await self._update(job, self._finished(SUCCEEDED, stage="done", error=None))
+        self.stats["succeeded"] += 1
+
+    async def _release(self, job: Dict[str, Any]):
+        try:
+            await self._update(job, {
+                "status": QUEUED, "stage": QUEUED, "attempts": job["attempts"] - 1,
+                "lease_owner": None, "lease_until": None
+            })
+        except Exception as e:
+            logger.warning(f"Could not release trip job {job['id']}: {e!r}")
+
+    async def _fail(self, job: Dict[str, Any], error: str):
+        await self._update(job, self._finished(FAILED, stage="failed", error=error))
+        self.stats["failed"] += 1
+        logger.error(f"Trip job {job['id']} failed: {error}")
+        await self.on_failure(job, error)
+
+    async def run_worker(self):
+        while True:
+            try:
+                job = await self.claim()
+                if job is not None:
+                    await self.process(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Trip job worker error: {e!r}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        await asyncio.gather(*(self.run_worker() for _ in range(self.workers)))
@@ -0,0 +1,42 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PipelineStep:
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    timeout: float
+    # Called when the step fails or times out; without one the error propagates
+    fallback: Optional[Callable[[], Any]] = None
+
+
+async def run_step(step: PipelineStep) -> Any:
+    try:
+        return await asyncio.wait_for(step.run(), timeout=step.timeout)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        if step.fallback is None:
+            raise
+        logger.warning(f"Pipeline step '{step.name}' failed, using fallback: {e!r}")
+        return step.fallback()
+
+
+def start_steps(steps: List[PipelineStep]) -> Dict[str, asyncio.Task]:
+    return {step.name: asyncio.create_task(run_step(step)) for step in steps}
+
+
+async def run_pipeline(steps: List[PipelineStep]) -> Dict[str, Any]:
+    # Independent steps run concurrently; if one fails without a fallback the rest are cancelled
+    tasks = start_steps(steps)
+    try:
+        results = await asyncio.gather(*tasks.values())
+    finally:
+        for task in tasks.values():
+            task.cancel()
+    return dict(zip(tasks.keys(), results))
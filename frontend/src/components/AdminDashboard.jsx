@@ -15,6 +15,7 @@ export default function AdminDashboard({ user, token }) {
   const navigate = useNavigate();
   const [stats, setStats] = useState(null);
   const [users, setUsers] = useState([]);
+  const [usersCursor, setUsersCursor] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -34,6 +35,7 @@ export default function AdminDashboard({ user, token }) {
       ]);
       setStats(statsRes.data);
       setUsers(usersRes.data);
+      setUsersCursor(usersRes.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Failed to load admin data');
     } finally {
@@ -41,6 +43,19 @@ export default function AdminDashboard({ user, token }) {
     }
   };
 
+  const fetchMoreUsers = async () => {
+    try {
+      const response = await axios.get(`${API}/admin/users`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { cursor: usersCursor }
+      });
+      setUsers(prev => [...prev, ...response.data]);
+      setUsersCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      toast.error('Failed to load more users');
+    }
+  };
+
   if (loading) {
     return (
       <div className="min-h-screen flex items-center justify-center bg-gradient-to-br from-blue-50 via-cyan-50 to-teal-50">
@@ -189,6 +204,11 @@ export default function AdminDashboard({ user, token }) {
                     </div>
                   </div>
                 ))}
+                {usersCursor && (
+                  <Button variant="outline" className="w-full" onClick={fetchMoreUsers} data-testid="load-more-users-btn">
+                    Load more
+                  </Button>
+                )}
               </div>
             </ScrollArea>
           </CardContent>
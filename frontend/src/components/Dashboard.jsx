@@ -14,25 +14,50 @@ const API = `${BACKEND_URL}/api`;
 export default function Dashboard({ user, token, onLogout }) {
   const navigate = useNavigate();
   const [trips, setTrips] = useState([]);
+  const [tripsCursor, setTripsCursor] = useState(null);
+  const [tripCount, setTripCount] = useState(0);
   const [notifications, setNotifications] = useState([]);
+  const [unreadCount, setUnreadCount] = useState(0);
   const [stats, setStats] = useState(null);
 
   useEffect(() => {
     fetchTrips();
+    fetchTripCount();
     fetchNotifications();
+    fetchUnreadCount(false);
   }, []);
 
-  const fetchTrips = async () => {
+  useEffect(() => {
+    // Poll the cheap counter; the list is only re-fetched when it changes
+    const interval = setInterval(fetchUnreadCount, 30000);
+    return () => clearInterval(interval);
+  }, [unreadCount]);
+
+  const fetchTrips = async (cursor = null) => {
     try {
       const response = await axios.get(`${API}/trips`, {
-        headers: { Authorization: `Bearer ${token}` }
+        headers: { Authorization: `Bearer ${token}` },
+        params: cursor ? { cursor } : {}
       });
-      setTrips(response.data);
+      setTrips(prev => cursor ? [...prev, ...response.data] : response.data);
+      setTripsCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error('Error fetching trips:', error);
     }
   };
 
+  const fetchTripCount = async () => {
+    // The list is paged, so the total comes from the server
+    try {
+      const response = await axios.get(`${API}/trips/count`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      setTripCount(response.data.count);
+    } catch (error) {
+      console.error('Error fetching trip count:', error);
+    }
+  };
+
   const fetchNotifications = async () => {
     try {
       const response = await axios.get(`${API}/notifications`, {
@@ -44,6 +69,21 @@ export default function Dashboard({ user, token, onLogout }) {
     }
   };
 
+  const fetchUnreadCount = async (refreshList = true) => {
+    try {
+      const response = await axios.get(`${API}/notifications/unread-count`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      // The badge counts every unread notification, not just the first page
+      if (refreshList && response.data.unread !== unreadCount) {
+        fetchNotifications();
+      }
+      setUnreadCount(response.data.unread);
+    } catch (error) {
+      console.error('Error fetching unread count:', error);
+    }
+  };
+
   const handleDeleteTrip = async (tripId) => {
     try {
       await axios.delete(`${API}/trips/${tripId}`, {
@@ -51,6 +91,7 @@ export default function Dashboard({ user, token, onLogout }) {
       });
       toast.success('Trip deleted successfully');
       fetchTrips();
+      fetchTripCount();
     } catch (error) {
       toast.error('Failed to delete trip');
     }
@@ -74,13 +115,24 @@ export default function Dashboard({ user, token, onLogout }) {
       await axios.put(`${API}/notifications/${notifId}/read`, {}, {
         headers: { Authorization: `Bearer ${token}` }
       });
-      fetchNotifications();
+      setNotifications(prev => prev.map(n => n.id === notifId ? { ...n, read: true } : n));
+      setUnreadCount(prev => Math.max(0, prev - 1));
     } catch (error) {
       console.error('Error marking notification as read:', error);
     }
   };
 
-  const unreadCount = notifications.filter(n => !n.read).length;
+  const markAllNotificationsRead = async () => {
+    try {
+      await axios.put(`${API}/notifications/read-all`, {}, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      setNotifications(prev => prev.map(n => ({ ...n, read: true })));
+      setUnreadCount(0);
+    } catch (error) {
+      console.error('Error marking notifications as read:', error);
+    }
+  };
 
   const planLimits = {
     free: { trips: 2, chats: 10 },
@@ -179,7 +231,7 @@ export default function Dashboard({ user, token, onLogout }) {
               <div className="flex items-center justify-between">
                 <div>
                   <p className="text-sm text-gray-600">Total Trips</p>
-                  <p className="text-2xl font-bold text-gray-900">{trips.length}</p>
+                  <p className="text-2xl font-bold text-gray-900">{tripCount}</p>
                 </div>
                 <div className="bg-cyan-100 p-3 rounded-lg">
                   <Plane className="w-6 h-6 text-cyan-600" />
@@ -290,6 +342,11 @@ export default function Dashboard({ user, token, onLogout }) {
                           </CardContent>
                         </Card>
                       ))}
+                      {tripsCursor && (
+                        <Button variant="outline" className="w-full" onClick={() => fetchTrips(tripsCursor)} data-testid="load-more-trips-btn">
+                          Load more
+                        </Button>
+                      )}
                     </div>
                   )}
                 </ScrollArea>
@@ -301,7 +358,14 @@ export default function Dashboard({ user, token, onLogout }) {
           <div>
             <Card className="shadow-xl border-0 bg-white/80 backdrop-blur-sm" data-testid="notifications-section">
               <CardHeader>
-                <CardTitle>Notifications</CardTitle>
+                <div className="flex items-center justify-between">
+                  <CardTitle>Notifications</CardTitle>
+                  {unreadCount > 0 && (
+                    <Button variant="ghost" size="sm" onClick={markAllNotificationsRead} data-testid="mark-all-read-btn">
+                      Mark all read
+                    </Button>
+                  )}
+                </div>
                 <CardDescription>{unreadCount} unread</CardDescription>
               </CardHeader>
               <CardContent>
@@ -99,7 +99,7 @@ export default function Pricing({ user, token }) {
         { headers: { Authorization: `Bearer ${token}` } }
       );
 
-      const { order_id, amount, currency, mock } = orderResponse.data;
+      const { order_id, amount, currency, mock, key_id } = orderResponse.data;
 
       if (mock) {
         // Mock payment for development (when Razorpay keys not configured)
@@ -113,7 +113,7 @@ export default function Pricing({ user, token }) {
       } else {
         // Real Razorpay payment
         const options = {
-          key: 'rzp_test_demo', // This will be replaced by backend key
+          key: key_id,
           amount: amount,
           currency: currency,
           name: 'AI Trip Planner',
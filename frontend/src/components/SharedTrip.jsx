@@ -6,6 +6,7 @@ import { ScrollArea } from "@/components/ui/scroll-area";
 import { Badge } from "@/components/ui/badge";
 import { Plane, MapPin, Calendar, DollarSign, Loader2 } from "lucide-react";
 import axios from "axios";
+import { budgetRows, overBudgetNote } from "@/lib/budget";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -125,7 +126,10 @@ export default function SharedTrip() {
                 <h3 className="text-xl font-semibold mb-4 text-gray-800">Budget Breakdown</h3>
                 <Card className="border border-gray-200">
                   <CardContent className="p-4 space-y-3">
-                    {trip?.budget_breakdown && Object.entries(trip.budget_breakdown).map(([key, value]) => (
+                    {overBudgetNote(trip?.budget_breakdown) && (
+                      <p className="text-sm text-amber-700" data-testid="over-budget-note">{overBudgetNote(trip?.budget_breakdown)}</p>
+                    )}
+                    {budgetRows(trip?.budget_breakdown).map(([key, value]) => (
                       <div key={key} className="flex justify-between items-center pb-2 border-b border-gray-100 last:border-0">
                         <span className="text-sm text-gray-600 capitalize">{key}</span>
                         <span className="text-sm font-semibold text-gray-900">{value}</span>
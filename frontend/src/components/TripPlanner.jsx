@@ -8,8 +8,8 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@
 import { Checkbox } from "@/components/ui/checkbox";
 import { ScrollArea } from "@/components/ui/scroll-area";
 import { ArrowLeft, Loader2, Plane, MapPin, Calendar, DollarSign, Heart, Globe } from "lucide-react";
-import axios from "axios";
 import { toast } from "sonner";
+import { budgetRows, overBudgetNote } from "@/lib/budget";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -63,24 +63,69 @@ export default function TripPlanner({ user, token }) {
 
     setLoading(true);
     try {
-      const response = await axios.post(
-        `${API}/trips`,
-        {
+      // SSE progress is per step: the itinerary arrives whole once the model is done, then the budget
+      const response = await fetch(`${API}/trips/stream`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Bearer ${token}`
+        },
+        body: JSON.stringify({
           destination,
           duration,
           budget,
           interests,
           travel_style: travelStyle,
           language
-        },
-        { headers: { Authorization: `Bearer ${token}` } }
-      );
-      
-      setCurrentItinerary(response.data);
+        })
+      });
+
+      if (!response.ok) {
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.detail || "Failed to generate trip");
+      }
+
+      setCurrentItinerary({ destination, duration, budget, itinerary: "", budget_breakdown: {} });
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let finished = false;
+
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const eventLine = raw.split("\n").find(line => line.startsWith("event: "));
+          const dataLine = raw.split("\n").find(line => line.startsWith("data: "));
+          if (!eventLine || !dataLine) continue;
+
+          const event = eventLine.slice(7);
+          const data = JSON.parse(dataLine.slice(6));
+          if (event === "chunk") {
+            setCurrentItinerary(prev => ({ ...prev, itinerary: prev.itinerary + data.text }));
+          } else if (event === "budget") {
+            setCurrentItinerary(prev => ({ ...prev, budget_breakdown: data }));
+          } else if (event === "done") {
+            setCurrentItinerary(data);
+            finished = true;
+          } else if (event === "error") {
+            throw new Error(data.detail);
+          }
+        }
+      }
+
+      if (!finished) {
+        throw new Error("Trip generation was interrupted");
+      }
       toast.success("Trip itinerary generated successfully!");
     } catch (error) {
-      const errorMsg = error.response?.data?.detail || "Failed to generate trip";
-      toast.error(errorMsg);
+      setCurrentItinerary(null);
+      toast.error(error.message || "Failed to generate trip");
     } finally {
       setLoading(false);
     }
@@ -290,7 +335,10 @@ export default function TripPlanner({ user, token }) {
                   <h3 className="text-lg font-semibold mb-4 text-gray-800">Budget Breakdown</h3>
                   <Card className="border border-gray-200" data-testid="budget-breakdown">
                     <CardContent className="p-4 space-y-3">
-                      {Object.entries(currentItinerary.budget_breakdown).map(([key, value]) => (
+                      {overBudgetNote(currentItinerary.budget_breakdown) && (
+                        <p className="text-sm text-amber-700" data-testid="over-budget-note">{overBudgetNote(currentItinerary.budget_breakdown)}</p>
+                      )}
+                      {budgetRows(currentItinerary.budget_breakdown).map(([key, value]) => (
                         <div key={key} className="flex justify-between items-center pb-2 border-b border-gray-100 last:border-0">
                           <span className="text-sm text-gray-600 capitalize">{key}</span>
                           <span className="text-sm font-semibold text-gray-900">{value}</span>
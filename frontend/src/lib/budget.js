@@ -0,0 +1,17 @@
+const inr = new Intl.NumberFormat("en-IN", { style: "currency", currency: "INR", maximumFractionDigits: 0 });
+
+// Budget breakdowns hold rupee amounts per category plus a total; trips
+// saved before that hold preformatted strings, which are shown as-is
+export function budgetRows(breakdown) {
+  if (!breakdown) return [];
+  return Object.entries(breakdown)
+    .filter(([key, value]) => key !== "currency" && (typeof value === "number" || typeof value === "string"))
+    .map(([key, value]) => [key, typeof value === "number" ? inr.format(value) : value]);
+}
+
+// Set when the stated budget is far below what the trip costs
+export function overBudgetNote(breakdown) {
+  const basis = breakdown?.basis;
+  if (!basis?.over_budget) return null;
+  return `This trip is likely to cost about ${inr.format(basis.estimated_total)}, well above your budget of ${inr.format(basis.budget_ceiling)}.`;
+}
@@ -0,0 +1,75 @@
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import mongomock_motor
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# Read when server is imported; tests never touch a real Mongo or LLM
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "trip_planner_test")
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["FAKE_LLM_DELAY_SECONDS"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ.pop("PAYMENT_PROVIDER", None)
+os.environ.pop("RAZORPAY_KEY_ID", None)
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # Each test gets its own app and its own in-memory database
+    monkeypatch.setattr(server, "AsyncIOMotorClient", mongomock_motor.AsyncMongoMockClient)
+    return server.create_app()
+
+
+@pytest.fixture
+def services(app):
+    return app.state.services
+
+
+@pytest.fixture
+async def client(app):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+
+
+@pytest.fixture
+def register(client):
+    async def register(email: str = "traveller@example.com") -> dict:
+        response = await client.post("/api/auth/register", json={"email": email, "password": "secret", "name": "Traveller"})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        return {"user": body["user"], "headers": {"Authorization": f"Bearer {body['token']}"}}
+    return register
+
+
+@pytest.fixture
+def make_admin(services):
+    async def make_admin(auth: dict):
+        await services.db.users.update_one({"id": auth["user"]["id"]}, {"$set": {"is_admin": True}})
+        services.invalidate_cached_user(auth["user"]["id"])
+    return make_admin
+
+
+@pytest.fixture
+def trip_request():
+    return {
+        "destination": "Goa",
+        "duration": "4-7 days",
+        "budget": "Moderate (₹10,000-30,000)",
+        "interests": ["Beach", "Food"],
+        "travel_style": "Couple"
+    }
@@ -0,0 +1,27 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_snapshot_is_computed_at_startup(app, services):
+    async with app.router.lifespan_context(app):
+        snapshot = await services.db.admin_stats.find_one({"_id": "global"})
+
+    assert snapshot is not None
+    assert len(snapshot["daily"]) == services.admin_stats.history_days
+
+
+async def test_refresh_counts_users_trips_and_plans(client, register, make_admin, trip_request):
+    auth = await register()
+    await register("second@example.com")
+    await make_admin(auth)
+    await client.post("/api/trips", json=trip_request, headers=auth["headers"])
+    await client.post("/api/subscription/verify", json={"mock": True, "plan": "pro"}, headers=auth["headers"])
+
+    stats = (await client.get("/api/admin/stats?refresh=true", headers=auth["headers"])).json()
+
+    assert stats["total_users"] == 2
+    assert stats["total_trips"] == 1
+    assert stats["plan_breakdown"] == {"free": 1, "pro": 1, "enterprise": 0}
+    today = stats["daily"][-1]
+    assert (today["signups"], today["trips"], today["revenue"]) == (2, 1, 499)
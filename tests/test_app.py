@@ -0,0 +1,9 @@
+import server
+
+
+def test_module_app_and_factory_are_independent():
+    # ``uvicorn server:app`` keeps working next to ``--factory server:create_app``
+    app = server.create_app()
+
+    assert server.app is not app
+    assert server.app.state.services is not app.state.services
@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_registrations_for_one_email(client):
+    user = {"email": "same@example.com", "password": "secret", "name": "Same"}
+
+    responses = await asyncio.gather(*(client.post("/api/auth/register", json=user) for _ in range(5)))
+
+    assert sorted(r.status_code for r in responses) == [200, 400, 400, 400, 400]
+    assert {r.json()["detail"] for r in responses if r.status_code == 400} == {"Email already registered"}
+
+
+async def test_login_after_register(client, register):
+    auth = await register()
+
+    response = await client.post("/api/auth/login", json={"email": "traveller@example.com", "password": "secret"})
+
+    assert response.status_code == 200
+    assert response.json()["user"]["id"] == auth["user"]["id"]
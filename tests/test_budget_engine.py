@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from budget_engine import BudgetEngine, parse_refined_budget
+
+CATEGORIES = ["accommodation", "food", "activities", "transport", "shopping", "miscellaneous"]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return BudgetEngine.load()
+
+
+def spent(breakdown: dict) -> int:
+    return sum(breakdown[category] for category in CATEGORIES)
+
+
+@pytest.mark.parametrize("budget, ceiling", [("50k", 50000), ("₹1.5 lakh", 150000), ("₹25000", 25000), ("Rs 40-60K", 60000)])
+def test_amount_shorthand_is_a_real_budget(engine, budget, ceiling):
+    breakdown = engine.estimate("Goa", "4-7 days", budget, "couple")
+
+    assert breakdown["basis"]["budget_ceiling"] == ceiling
+    assert all(breakdown[category] > 0 for category in CATEGORIES)
+    assert breakdown["total"] == spent(breakdown) <= ceiling
+
+
+@pytest.mark.parametrize("budget", ["₹25000", "₹24,950", "Moderate (₹10,000-30,000)", "₹19,999"])
+def test_total_never_exceeds_the_budget(engine, budget):
+    breakdown = engine.estimate("Goa", "4-7 days", budget, "couple")
+
+    assert breakdown["basis"]["scaled_to_budget"]
+    assert breakdown["total"] <= breakdown["basis"]["budget_ceiling"]
+
+
+def test_a_budget_far_below_the_estimate_is_flagged(engine):
+    breakdown = engine.estimate("Paris", "2+ weeks", "Budget-friendly (₹5,000-10,000)", "family")
+
+    assert breakdown["basis"]["over_budget"]
+    assert not breakdown["basis"]["scaled_to_budget"]
+    # The real cost of the trip, not 10,000 spread over a family fortnight
+    assert breakdown["total"] == breakdown["basis"]["estimated_total"] > 400000
+
+
+def test_a_tight_budget_drops_to_a_cheaper_tier(engine):
+    luxury = engine.estimate("Goa", "3 days", "Luxury", "solo")
+    capped = engine.estimate("Goa", "3 days", "Luxury (₹20,000)", "solo")
+
+    assert luxury["basis"]["tier"] == "luxury"
+    assert capped["basis"]["tier"] != "luxury"
+    assert capped["total"] <= 20000
+
+
+def test_no_stated_amount_is_the_plain_estimate(engine):
+    breakdown = engine.estimate("Goa", "3 days", "Moderate", "solo")
+
+    assert breakdown["basis"]["budget_ceiling"] is None
+    assert not breakdown["basis"]["over_budget"] and not breakdown["basis"]["scaled_to_budget"]
+    assert breakdown["total"] == breakdown["basis"]["estimated_total"]
+
+
+def test_refinement_cannot_exceed_the_budget(engine):
+    base = engine.estimate("Goa", "4-7 days", "₹25000", "couple")
+    reply = json.dumps({category: base[category] * 1.5 for category in CATEGORIES})
+
+    assert parse_refined_budget(reply, base) == base
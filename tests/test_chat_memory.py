@@ -0,0 +1,121 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import mongomock_motor
+import pytest
+
+import server
+from chat_memory import ChatMemory, count_tokens, format_turn
+from llm_gateway import LlmGateway
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["chat_memory_test"]
+
+
+async def add_turns(chats, count: int, user_id: str = "user-1", words: int = 30) -> list:
+    started = datetime.now(timezone.utc) - timedelta(hours=1)
+    turns = [{
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "message": f"Question {n} about Goa",
+        "response": f"Answer {n}: " + " ".join(["beaches"] * words),
+        "created_at": started + timedelta(seconds=n)
+    } for n in range(count)]
+    await chats.insert_many([dict(turn) for turn in turns])
+    return turns
+
+
+class Summarizer:
+    def __init__(self):
+        self.prompts = []
+
+    async def __call__(self, prompt: str, user_id: str) -> str:
+        self.prompts.append(prompt)
+        return f"SUMMARY {len(self.prompts)}: prefers quiet beaches in North Goa"
+
+
+async def test_window_keeps_the_newest_turns_within_the_budget(db):
+    turns = await add_turns(db.chats, 12)
+    memory = ChatMemory(db.chats, db.chat_memory, Summarizer(), window_tokens=200)
+
+    prompt, usage = await memory.build_prompt("user-1", "And the weather?")
+
+    assert 0 < usage["window_tokens"] <= 200
+    assert 0 < usage["window_turns"] < len(turns)
+    kept = turns[-usage["window_turns"]:]
+    assert "Recent conversation:\n" + "\n\n".join(format_turn(turn) for turn in kept) in prompt
+    assert format_turn(turns[-usage["window_turns"] - 1]) not in prompt
+    assert prompt.endswith("User: And the weather?")
+
+
+async def test_a_single_oversized_turn_is_trimmed(db):
+    await add_turns(db.chats, 1, words=2000)
+    memory = ChatMemory(db.chats, db.chat_memory, Summarizer(), window_tokens=200)
+
+    _, usage = await memory.build_prompt("user-1", "Hi")
+
+    assert usage["window_turns"] == 1
+    assert usage["window_tokens"] <= 200
+
+
+async def test_summary_replaces_the_turns_that_left_the_window(db):
+    turns = await add_turns(db.chats, 20)
+    summarizer = Summarizer()
+    memory = ChatMemory(db.chats, db.chat_memory, summarizer, window_tokens=200, summary_tokens=50, refresh_tokens=400)
+    _, before = await memory.build_prompt("user-1", "Hi")
+    evicted = turns[:-before["window_turns"]]
+
+    assert await memory.refresh("user-1") == len(evicted)
+    prompt, usage = await memory.build_prompt("user-1", "Where should we stay?")
+
+    # The summarizer saw exactly the evicted turns, and its summary stands in for them
+    assert all(format_turn(turn) in summarizer.prompts[0] for turn in evicted)
+    assert format_turn(turns[-1]) not in summarizer.prompts[0]
+    assert prompt.startswith("Summary of the earlier conversation:\nSUMMARY 1: prefers quiet beaches")
+    assert not any(format_turn(turn) in prompt for turn in evicted)
+    assert 0 < usage["summary_tokens"] <= 50
+    # Nothing new has left the window since
+    assert await memory.refresh("user-1") == 0
+    assert len(summarizer.prompts) == 1
+
+
+async def test_refresh_waits_for_enough_evicted_text(db):
+    await add_turns(db.chats, 6)
+    summarizer = Summarizer()
+    memory = ChatMemory(db.chats, db.chat_memory, summarizer, window_tokens=200, refresh_tokens=10_000)
+
+    assert await memory.refresh("user-1") == 0
+    assert summarizer.prompts == []
+
+
+class RecordingProvider:
+    def __init__(self):
+        self.calls = []
+
+    async def complete(self, text: str, system_message: str, session_id: str) -> str:
+        self.calls.append((session_id, system_message, text))
+        return "Try Palolem. " + " ".join(["beaches"] * 60)
+
+
+async def test_every_chat_keeps_the_system_prompt_and_stays_in_budget(client, services, register):
+    provider = RecordingProvider()
+    services.llm = LlmGateway(provider)
+    services.chat_memory.window_tokens = 150
+    auth = await register()
+
+    for n in range(6):
+        response = await client.post("/api/chat", json={"message": f"Question {n}"}, headers=auth["headers"])
+        assert response.status_code == 200, response.text
+
+    chats = [(system, text) for session, system, text in provider.calls if session.startswith(f"chat-{auth['user']['id']}")]
+    assert len(chats) == 6
+    assert all(system == server.CHAT_SYSTEM_MESSAGE for system, _ in chats)
+    assert all(text.endswith(f"User: Question {n}") for n, (_, text) in enumerate(chats))
+    # History grows, the prompt does not grow past the budget
+    budget = services.chat_memory.window_tokens + services.chat_memory.summary_tokens + 50
+    assert all(count_tokens(text) <= budget for _, text in chats)
+    assert "Question 4" in chats[5][1] and "Question 0" not in chats[5][1]
@@ -0,0 +1,85 @@
+import gzip
+import json
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import mongomock_motor
+import pytest
+
+from exports import ExportSource, csv_gzip_stream, export_batches, ndjson_stream
+
+pytestmark = pytest.mark.anyio
+
+BATCH_SIZE = 200
+COLUMNS = ["id", "destination", "interests", "created_at", "itinerary"]
+
+
+async def trips_collection(count: int):
+    collection = mongomock_motor.AsyncMongoMockClient()["exports_test"]["trips"]
+    started = datetime.now(timezone.utc)
+    await collection.insert_many([{
+        "id": str(uuid.uuid4()),
+        "user_id": "user-1",
+        "destination": "Goa",
+        "interests": ["Beach", "Food"],
+        "itinerary": f"## Day 1\n- Trip {n}: beaches, \"shacks\", night market\n" * 8,
+        "created_at": started - timedelta(seconds=n)
+    } for n in range(count)])
+    return collection
+
+
+async def export(count: int, format: str):
+    """Exported bytes, and the peak memory the stream allocated after its first chunk."""
+    source = ExportSource("trips", await trips_collection(count), {"_id": 0}, COLUMNS)
+    batches = export_batches([source], {"user_id": "user-1"}, BATCH_SIZE, csv_columns=format == "csv")
+    stream = csv_gzip_stream(batches, COLUMNS) if format == "csv" else ndjson_stream(batches)
+
+    # mongomock copies the whole result set on the first read, where Motor
+    # would fetch one batch per getMore, so tracing starts after the first chunk
+    sent = len(await stream.__anext__())
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        async for chunk in stream:
+            sent += len(chunk)
+            del chunk
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return sent, peak
+
+
+async def export_body(count: int, format: str) -> bytes:
+    source = ExportSource("trips", await trips_collection(count), {"_id": 0}, COLUMNS)
+    batches = export_batches([source], {"user_id": "user-1"}, BATCH_SIZE, csv_columns=format == "csv")
+    stream = csv_gzip_stream(batches, COLUMNS) if format == "csv" else ndjson_stream(batches)
+    return b"".join([chunk async for chunk in stream])
+
+
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+async def test_memory_does_not_grow_with_row_count(format):
+    small_sent, small_peak = await export(2 * BATCH_SIZE, format)
+    large_sent, large_peak = await export(20 * BATCH_SIZE, format)
+
+    assert large_sent > 5 * small_sent
+    # Nineteen more batches than one, about the same peak: a batch and its chunk
+    assert large_peak < small_peak * 1.5 + 64 * 1024
+    assert large_peak < 2 * 1024 * 1024
+
+
+async def test_ndjson_checkpoints_every_batch():
+    body = await export_body(3 * BATCH_SIZE + 7, "ndjson")
+    lines = [json.loads(line) for line in body.splitlines()]
+
+    checkpoints = [line for line in lines if line["type"] == "checkpoint"]
+    assert sum(line["type"] == "trips" for line in lines) == 3 * BATCH_SIZE + 7
+    assert len(checkpoints) == 5 and checkpoints[-1]["cursor"] is None
+
+
+async def test_csv_is_one_complete_gzip_stream():
+    body = await export_body(BATCH_SIZE + 1, "csv")
+    rows = gzip.decompress(body).decode("utf-8").split("\r\n")
+
+    assert rows[0] == ",".join(COLUMNS + ["resume_cursor"])
+    assert rows.count("") == 1 and rows[-1] == ""
@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import orjson
+import pytest
+from bson import ObjectId
+
+import server
+from fast_json import dumps
+
+
+def test_models_ids_and_datetimes():
+    object_id = ObjectId()
+    created_at = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    user = server.User(email="a@example.com", name="A", created_at=created_at)
+
+    decoded = orjson.loads(dumps({"_id": object_id, "user": user}))
+
+    assert decoded["_id"] == str(object_id)
+    assert decoded["user"]["created_at"] == "2026-01-02T03:04:05+00:00"
+    assert decoded["user"]["subscription_plan"] == "free"
+
+
+def test_unknown_types_are_an_error():
+    with pytest.raises(TypeError):
+        dumps({"amount": Decimal("1.5")})
+
+
+@pytest.mark.anyio
+async def test_list_routes_skip_response_model_validation(client, register, trip_request):
+    auth = await register()
+    await client.post("/api/trips", json=trip_request, headers=auth["headers"])
+
+    trips = (await client.get("/api/trips", headers=auth["headers"])).json()
+    schema = (await client.get("/openapi.json")).json()["components"]["schemas"]
+
+    assert "itinerary" not in trips[0]
+    assert "itinerary" not in schema["TripSummary"]["properties"]
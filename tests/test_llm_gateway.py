@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from llm_gateway import LlmBusy, LlmGateway
+
+pytestmark = pytest.mark.anyio
+
+
+class GatedProvider:
+    """Holds every call until the gate opens; fails the first ``failures`` calls."""
+
+    def __init__(self, failures: int = 0):
+        self.gate = asyncio.Event()
+        self.failures = failures
+
+    async def complete(self, text: str, system_message: str, session_id: str) -> str:
+        if self.failures:
+            self.failures -= 1
+            raise ValueError("provider exploded")
+        await self.gate.wait()
+        return "Pack light."
+
+
+async def chat(client, auth):
+    return await client.post("/api/chat", json={"message": "What should I pack?"}, headers=auth["headers"])
+
+
+async def until_in_flight(gateway: LlmGateway, count: int):
+    while gateway.snapshot()["in_flight"] < count:
+        await asyncio.sleep(0.01)
+
+
+async def test_per_user_limit_answers_429_with_retry_after(client, services, register):
+    provider = GatedProvider()
+    services.llm = LlmGateway(provider, per_user_concurrency=1, per_user_queue=0)
+    auth = await register()
+
+    held = asyncio.create_task(chat(client, auth))
+    await until_in_flight(services.llm, 1)
+    rejected = await chat(client, auth)
+    # Another account is not held up by the first one's limit
+    other = asyncio.create_task(chat(client, await register("other@example.com")))
+    await until_in_flight(services.llm, 2)
+    provider.gate.set()
+
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert "this account" in rejected.json()["detail"]
+    assert (await held).status_code == 200
+    assert (await other).status_code == 200
+    # The rejected message did not use up a chat
+    user = await services.db.users.find_one({"id": auth["user"]["id"]})
+    assert user["chats_this_month"] == 1
+
+
+async def test_global_limit_answers_429_with_retry_after(client, services, register):
+    provider = GatedProvider()
+    services.llm = LlmGateway(provider, max_concurrency=1, max_queue=0)
+    first, second = await register(), await register("other@example.com")
+
+    held = asyncio.create_task(chat(client, first))
+    await until_in_flight(services.llm, 1)
+    rejected = await chat(client, second)
+    provider.gate.set()
+
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert "capacity" in rejected.json()["detail"]
+    assert (await held).status_code == 200
+    assert services.llm.stats["rejected"] == 1
+
+
+async def test_slot_is_released_after_an_error(client, services, register):
+    provider = GatedProvider(failures=1)
+    provider.gate.set()
+    services.llm = LlmGateway(provider, max_concurrency=1, max_queue=0, per_user_concurrency=1, per_user_queue=0, retries=0)
+    auth = await register()
+
+    failed = await chat(client, auth)
+    snapshot = services.llm.snapshot()
+    # With both limits at one, a leaked slot would turn this into a 429
+    retried = await chat(client, auth)
+
+    assert failed.status_code == 500
+    assert snapshot["in_flight"] == snapshot["waiting"] == 0
+    assert retried.status_code == 200
+
+
+async def test_waiting_past_queue_timeout_is_busy():
+    provider = GatedProvider()
+    gateway = LlmGateway(provider, max_concurrency=1, queue_timeout=0.05)
+
+    held = asyncio.create_task(gateway.complete("hi", system_message="", session_id="a"))
+    await until_in_flight(gateway, 1)
+    with pytest.raises(LlmBusy) as busy:
+        await gateway.complete("hi", system_message="", session_id="b")
+    provider.gate.set()
+
+    assert busy.value.retry_after >= 1
+    assert await held == "Pack light."
+    assert gateway.snapshot()["waiting"] == 0
@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+
+import mongomock_motor
+import pytest
+
+from backfill_search_text import backfill_trips
+from itinerary_codec import decode_itinerary, is_compressed
+from migrate_dates import migrate_collection
+from migrate_itineraries import migrate_trips
+
+pytestmark = pytest.mark.anyio
+
+ITINERARY = "\n".join(f"## Day {day}\n- Morning: Baga beach and Fort Aguada\n- Afternoon: spice farm lunch\n- Evening: Anjuna night market" for day in range(1, 15))
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["migrations_test"]
+
+
+async def test_dates_are_converted_across_batches(db):
+    await db.users.insert_many([{"created_at": f"2025-01-{day:02d}T10:00:00"} for day in range(1, 8)] + [{"created_at": "yesterday"}])
+
+    assert await migrate_collection(db.users, ("created_at",), batch_size=3, dry_run=True) == 7
+    assert await migrate_collection(db.users, ("created_at",), batch_size=3, dry_run=False) == 7
+    assert await migrate_collection(db.users, ("created_at",), batch_size=3, dry_run=False) == 0
+
+    first = await db.users.find_one({}, sort=[("_id", 1)])
+    assert first["created_at"].replace(tzinfo=timezone.utc) == datetime(2025, 1, 1, 10, tzinfo=timezone.utc)
+
+
+async def test_itineraries_are_compressed_once(db):
+    await db.trips.insert_many([{"itinerary": ITINERARY} for _ in range(5)] + [{"itinerary": "short"}])
+
+    compressed, raw_bytes, stored_bytes = await migrate_trips(db.trips, batch_size=2, dry_run=False)
+
+    assert compressed == 5 and stored_bytes < raw_bytes
+    assert (await migrate_trips(db.trips, batch_size=2, dry_run=False))[0] == 0
+    trips = await db.trips.find({}).to_list(None)
+    assert sum(is_compressed(trip["itinerary"]) for trip in trips) == 5
+    assert {decode_itinerary(trip["itinerary"]) for trip in trips} == {ITINERARY, "short"}
+
+
+async def test_search_text_backfill_skips_indexed_trips(db):
+    await db.trips.insert_many([{"itinerary": ITINERARY} for _ in range(4)] + [{"itinerary": ITINERARY, "search_text": "kept"}])
+
+    assert await backfill_trips(db.trips, batch_size=3, dry_run=False) == 4
+
+    assert await db.trips.count_documents({"search_text": {"$exists": False}}) == 0
+    assert await db.trips.count_documents({"search_text": "kept"}) == 1
+    assert "anjuna" in (await db.trips.find_one({"search_text": {"$ne": "kept"}}))["search_text"]
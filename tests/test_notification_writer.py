@@ -0,0 +1,56 @@
+import uuid
+
+import mongomock_motor
+import pytest
+from pymongo.errors import BulkWriteError
+
+from notification_writer import NotificationWriter
+
+pytestmark = pytest.mark.anyio
+
+
+def notification(user_id: str = "user-1", read: bool = False) -> dict:
+    return {"id": str(uuid.uuid4()), "user_id": user_id, "title": "t", "message": "m", "type": "info", "read": read}
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["notifications_test"]
+
+
+async def test_counter_starts_from_existing_unread_notifications(db):
+    # Written before notification_counters existed
+    await db.notifications.insert_many([notification(), notification(), notification(read=True)])
+    writer = NotificationWriter(db.notifications, db.notification_counters)
+
+    writer.add(notification())
+    await writer.flush()
+
+    assert await writer.unread_count("user-1") == 3
+
+
+async def test_rejected_notification_is_dropped_after_max_attempts(db):
+    class RejectingCollection:
+        def __init__(self, collection):
+            self.collection = collection
+
+        def __getattr__(self, name):
+            return getattr(self.collection, name)
+
+        async def insert_many(self, docs, ordered=True):
+            error = {"index": 0, "code": 121, "errmsg": "Document failed validation"}
+            if docs[1:]:
+                await self.collection.insert_many(docs[1:])
+            raise BulkWriteError({"writeErrors": [error], "nInserted": len(docs) - 1})
+
+    writer = NotificationWriter(RejectingCollection(db.notifications), db.notification_counters, max_attempts=3)
+    writer.add(notification())
+    writer.add(notification(user_id="user-2"))
+
+    for _ in range(5):
+        await writer.flush()
+
+    assert len(writer) == 0
+    assert writer.stats["dropped"] == 1
+    assert writer.stats["flushes"] == 3
+    assert await writer.unread_count("user-2") == 1
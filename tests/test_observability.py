@@ -0,0 +1,42 @@
+import pytest
+
+import profiling
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_metrics_are_private_by_default(client, register, make_admin, monkeypatch):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    monkeypatch.delenv("METRICS_PUBLIC", raising=False)
+    auth = await register()
+
+    assert (await client.get("/metrics")).status_code == 401
+    assert (await client.get("/metrics", headers=auth["headers"])).status_code == 401
+
+    await make_admin(auth)
+    response = await client.get("/metrics", headers=auth["headers"])
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.text
+
+
+async def test_metrics_token_and_public_opt_in(client, monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "scrape-me")
+    assert (await client.get("/metrics", headers={"Authorization": "Bearer scrape-me"})).status_code == 200
+    assert (await client.get("/metrics", headers={"Authorization": "Bearer wrong"})).status_code == 401
+
+    monkeypatch.setenv("METRICS_PUBLIC", "true")
+    assert (await client.get("/metrics")).status_code == 200
+
+
+async def test_profiling_without_pyinstrument_is_a_clear_error(client, register, make_admin, monkeypatch):
+    monkeypatch.setattr(profiling, "_profiler_class", lambda: None)
+    auth = await register()
+    await make_admin(auth)
+
+    response = await client.get("/api/auth/me", headers={**auth["headers"], "X-Profile": "text"})
+
+    assert response.status_code == 501
+    assert "pyinstrument" in response.text
+    # Non-admins never see the profiler either way
+    other = await register("other@example.com")
+    assert (await client.get("/api/auth/me", headers={**other["headers"], "X-Profile": "text"})).status_code == 200
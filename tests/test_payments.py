@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+@pytest.fixture(autouse=True)
+def fake_razorpay(monkeypatch):
+    # Read by payment_gateway_from_env when the app fixture builds Services
+    monkeypatch.setenv("PAYMENT_PROVIDER", "fake")
+    monkeypatch.setenv("FAKE_RAZORPAY_DELAY_SECONDS", "0.05")
+    monkeypatch.setenv("RAZORPAY_WEBHOOK_SECRET", WEBHOOK_SECRET)
+
+
+async def create_order(client, auth, plan: str = "pro"):
+    return await client.post("/api/subscription/create-order", json={"plan": plan}, headers=auth["headers"])
+
+
+async def test_repeated_order_requests_get_the_same_order(client, services, register):
+    auth = await register()
+
+    concurrent = await asyncio.gather(*(create_order(client, auth) for _ in range(3)))
+    repeated = await create_order(client, auth)
+
+    assert {r.status_code for r in concurrent} == {200}
+    assert len({r.json()["order_id"] for r in concurrent} | {repeated.json()["order_id"]}) == 1
+    assert services.payment_gateway.client.orders_created == 1
+    assert services.payment_orders.stats == {"created": 1, "reused": 3}
+    # Another plan is another order
+    assert (await create_order(client, auth, "enterprise")).json()["order_id"] != repeated.json()["order_id"]
+
+
+async def test_webhook_rejects_a_bad_signature_and_activates_a_good_one(client, services, register):
+    auth = await register()
+    order_id = (await create_order(client, auth)).json()["order_id"]
+    body = json.dumps({
+        "event": "payment.captured",
+        "payload": {"payment": {"entity": {"id": "pay_test_1", "order_id": order_id}}}
+    })
+    signature = services.payment_gateway.client.sign_webhook(body, WEBHOOK_SECRET)
+
+    forged = await client.post("/api/subscription/webhook", content=body, headers={"X-Razorpay-Signature": "0" * 64})
+    tampered = await client.post("/api/subscription/webhook", content=body.replace("pay_test_1", "pay_test_2"), headers={"X-Razorpay-Signature": signature})
+    user = await services.db.users.find_one({"id": auth["user"]["id"]})
+    assert forged.status_code == tampered.status_code == 400
+    assert user["subscription_plan"] == "free"
+
+    accepted = await client.post("/api/subscription/webhook", content=body, headers={"X-Razorpay-Signature": signature})
+    user = await services.db.users.find_one({"id": auth["user"]["id"]})
+    assert accepted.status_code == 200
+    assert user["subscription_plan"] == "pro"
+    assert (await services.payment_orders.get(order_id))["payment_id"] == "pay_test_1"
+
+
+async def test_provider_timeout_is_a_clean_504(client, services, register):
+    services.payment_gateway.timeout = 0.01
+    services.payment_gateway.client.delay = 0.2
+    auth = await register()
+
+    response = await create_order(client, auth)
+
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Payment provider timed out, please retry"}
+    # The claim is released, so the next click creates an order
+    services.payment_gateway.timeout = 5
+    retried = await create_order(client, auth)
+    assert retried.status_code == 200
+    assert retried.json()["order_id"].startswith("order_fake_")
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+import server
+from llm_gateway import FakeProvider, LlmGateway
+from quota import QuotaExceeded
+
+pytestmark = pytest.mark.anyio
+
+FREE_TRIPS = server.PLAN_LIMITS[server.SubscriptionPlan.FREE]["trips_per_month"]
+
+
+async def usage(services, user_id: str) -> int:
+    return (await services.db.users.find_one({"id": user_id}))["trips_this_month"]
+
+
+async def test_parallel_reservations_stop_at_the_limit(client, services, register):
+    auth = await register()
+    user = server.User(**auth["user"])
+
+    results = await asyncio.gather(*(services.quota.reserve(user, "trip") for _ in range(10)), return_exceptions=True)
+
+    assert sum(not isinstance(r, QuotaExceeded) for r in results) == FREE_TRIPS
+    assert await usage(services, user.id) == FREE_TRIPS
+
+
+async def test_parallel_trip_creations_stop_at_the_limit(client, services, register, trip_request):
+    services.llm = LlmGateway(FakeProvider(delay=0.05), per_user_concurrency=10, per_user_queue=10)
+    auth = await register()
+
+    responses = await asyncio.gather(*(client.post("/api/trips", json=trip_request, headers=auth["headers"]) for _ in range(10)))
+
+    assert sorted(r.status_code for r in responses) == [200] * FREE_TRIPS + [403] * (10 - FREE_TRIPS)
+    assert await usage(services, auth["user"]["id"]) == FREE_TRIPS
+    assert await services.db.trips.count_documents({"user_id": auth["user"]["id"]}) == FREE_TRIPS
+
+
+async def test_failed_generation_refunds_the_reservation(client, services, register, trip_request):
+    services.llm = LlmGateway(FakeProvider(delay=0, failure_rate=1), retries=0)
+    auth = await register()
+
+    response = await client.post("/api/trips", json=trip_request, headers=auth["headers"])
+    assert response.status_code == 500
+
+    stream = await client.post("/api/trips/stream", json=trip_request, headers=auth["headers"])
+    assert "event: error" in stream.text
+    # The stream refunds from a detached task
+    await asyncio.sleep(0.05)
+
+    assert await usage(services, auth["user"]["id"]) == 0
+    services.llm = LlmGateway(FakeProvider(delay=0))
+    for _ in range(FREE_TRIPS):
+        response = await client.post("/api/trips", json=trip_request, headers=auth["headers"])
+        assert response.status_code == 200
@@ -0,0 +1,151 @@
+import uuid
+from datetime import datetime, timezone
+
+import mongomock_motor
+import pytest
+
+from itinerary_codec import encode_itinerary
+from text_search import highlight, highlight_pattern, query_terms, search_keywords
+
+pytestmark = pytest.mark.anyio
+
+# The weights of the user_text indexes in db_indexes
+WEIGHTS = {
+    "trips": {"destination": 10, "interests": 5, "search_text": 1},
+    "chats": {"message": 3, "response": 1}
+}
+
+
+class TextIndexStub:
+    """mongomock has no $text: documents are scored here, a weighted count
+    of matching words much like textScore, and the rest of the pipeline
+    runs in mongomock."""
+
+    def __init__(self, collection, weights: dict):
+        self.collection = collection
+        self.weights = weights
+
+    def aggregate(self, pipeline: list):
+        return self._Aggregation(self, pipeline)
+
+    class _Aggregation:
+        def __init__(self, index, pipeline):
+            self.index, self.pipeline = index, pipeline
+
+        async def to_list(self, length):
+            match, project, *rest = self.pipeline
+            query = dict(match["$match"])
+            pattern = highlight_pattern(query_terms(query.pop("$text")["$search"]))
+            fields = [name for name, shown in project["$project"].items() if shown == 1]
+            hits = []
+            async for doc in self.index.collection.find(query):
+                score = 0
+                for name, weight in self.index.weights.items():
+                    value = doc.get(name) or ""
+                    score += weight * len(pattern.findall(" ".join(value) if isinstance(value, list) else value))
+                if score:
+                    hits.append({**{name: doc[name] for name in fields if name in doc}, "score": float(score)})
+            scratch = mongomock_motor.AsyncMongoMockClient()["search_test"]["hits"]
+            if hits:
+                await scratch.insert_many(hits)
+            return await scratch.aggregate(rest + [{"$project": {"_id": 0}}]).to_list(length)
+
+
+@pytest.fixture
+def text_index(services):
+    for kind, source in services.text_search.sources.items():
+        source.collection = TextIndexStub(source.collection, WEIGHTS[kind])
+
+
+async def add_trip(services, user_id: str, destination: str, interests: list, itinerary: str) -> str:
+    trip_id = str(uuid.uuid4())
+    await services.db.trips.insert_one({
+        "id": trip_id, "user_id": user_id, "destination": destination, "duration": "4-7 days",
+        "budget": "Moderate", "interests": interests, "travel_style": "Couple",
+        "itinerary": encode_itinerary(itinerary), "search_text": search_keywords(itinerary),
+        "created_at": datetime.now(timezone.utc)
+    })
+    return trip_id
+
+
+async def search(client, auth, **params):
+    response = await client.get("/api/search", params=params, headers=auth["headers"])
+    assert response.status_code == 200, response.text
+    return response
+
+
+async def test_results_are_ranked_and_highlighted(client, services, register, text_index):
+    auth = await register()
+    user_id = auth["user"]["id"]
+    goa = await add_trip(services, user_id, "Goa", ["Beach", "Food"], "## Day 1\n- Calangute beach at sunrise")
+    kerala = await add_trip(services, user_id, "Kerala", ["Backwaters"], "## Day 2\n- A quiet beach in Varkala")
+    await add_trip(services, user_id, "Manali", ["Trekking"], "## Day 1\n- Solang valley")
+    other = await register("other@example.com")
+    await add_trip(services, other["user"]["id"], "Goa", ["Beach"], "Beach beach beach")
+
+    results = (await search(client, auth, q="goa beaches")).json()
+
+    assert [hit["id"] for hit in results] == [goa, kerala]
+    assert results[0]["score"] > results[1]["score"]
+    assert "itinerary" not in results[0]
+    destination = next(h for h in results[0]["highlights"] if h["field"] == "destination")
+    assert destination == {"field": "destination", "snippet": "Goa", "matches": [[0, 3]]}
+    snippet = next(h for h in results[1]["highlights"] if h["field"] == "itinerary")
+    start, end = snippet["matches"][0]
+    assert snippet["snippet"][start:end] == "beach"
+
+
+async def test_cursor_pages_through_trips_and_chats_without_repeats(client, services, register, text_index):
+    auth = await register()
+    user_id = auth["user"]["id"]
+    for n in range(4):
+        await add_trip(services, user_id, f"Beach town {n}", ["Beach"] * (n + 1), "Sun and sand")
+    await services.db.chats.insert_many([
+        {"id": str(uuid.uuid4()), "user_id": user_id, "message": "Best beach for surfing?", "response": "Try Varkala beach.",
+         "created_at": datetime.now(timezone.utc)}
+        for _ in range(3)
+    ])
+
+    everything = (await search(client, auth, q="beach", limit=50)).json()
+    pages, cursor = [], None
+    while True:
+        response = await search(client, auth, q="beach", limit=2, **({"cursor": cursor} if cursor else {}))
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    paged = [(hit["type"], hit["id"]) for page in pages for hit in page]
+    assert paged == [(hit["type"], hit["id"]) for hit in everything]
+    assert len(paged) == len(set(paged)) == 7
+    assert all(len(page) <= 2 for page in pages)
+    assert [hit["score"] for hit in everything] == sorted((hit["score"] for hit in everything), reverse=True)
+    assert {hit["type"] for hit in everything} == {"trips", "chats"}
+
+
+async def test_type_filter_and_bad_cursor(client, services, register, text_index):
+    auth = await register()
+    await add_trip(services, auth["user"]["id"], "Goa", ["Beach"], "Beach day")
+    await services.db.chats.insert_one({"id": "chat-1", "user_id": auth["user"]["id"], "message": "beach?", "response": "yes"})
+
+    trips = (await search(client, auth, q="beach", type="trips")).json()
+    bad = await client.get("/api/search", params={"q": "beach", "cursor": "not-a-cursor"}, headers=auth["headers"])
+
+    assert {hit["type"] for hit in trips} == {"trips"}
+    assert bad.status_code == 400
+
+
+def test_query_terms_follow_text_search_syntax():
+    assert query_terms('"night market" beaches -crowds') == ["night", "market", "beaches"]
+
+
+def test_highlight_snippets_and_offsets():
+    text = "x" * 100 + " Sunset at the beaches, then the night market. " + "y" * 100
+    pattern = highlight_pattern(query_terms("beach market"))
+
+    [snippet] = highlight("itinerary", text, pattern)
+
+    assert snippet["snippet"].startswith("…") and snippet["snippet"].endswith("…")
+    marked = [snippet["snippet"][start:end] for start, end in snippet["matches"]]
+    assert marked == ["beaches", "market"]
+    assert highlight_pattern(query_terms("-only")) is None
@@ -0,0 +1,42 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def share_url(client, register, trip_request):
+    auth = await register()
+    trip = (await client.post("/api/trips", json=trip_request, headers=auth["headers"])).json()
+    share = await client.post(f"/api/trips/{trip['id']}/share", headers=auth["headers"])
+    return "/api" + share.json()["share_url"]
+
+
+async def test_each_encoding_is_compressed_once_with_a_strong_etag(client, share_url, monkeypatch):
+    calls = []
+    compress = server.compress
+    monkeypatch.setattr(server, "COMPRESSION_MIN_BYTES", 0)
+    monkeypatch.setattr(server, "compress", lambda body, encoding: calls.append(encoding) or compress(body, encoding))
+
+    plain = await client.get(share_url, headers={"Accept-Encoding": "identity"})
+    responses = [await client.get(share_url, headers={"Accept-Encoding": encoding}) for encoding in ("br", "gzip", "br", "gzip")]
+
+    assert calls == ["br", "gzip"]
+    etags = {plain.headers["etag"]} | {r.headers["etag"] for r in responses}
+    assert len(etags) == 3 and not any(etag.startswith("W/") for etag in etags)
+    for response, encoding in zip(responses, ("br", "gzip", "br", "gzip")):
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.content == plain.content
+
+
+async def test_conditional_request_per_encoding(client, share_url, monkeypatch):
+    monkeypatch.setattr(server, "COMPRESSION_MIN_BYTES", 0)
+    first = await client.get(share_url, headers={"Accept-Encoding": "gzip"})
+
+    same = await client.get(share_url, headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]})
+    other = await client.get(share_url, headers={"Accept-Encoding": "br", "If-None-Match": first.headers["etag"]})
+
+    assert same.status_code == 304
+    assert other.status_code == 200
@@ -0,0 +1,41 @@
+import pytest
+
+import server
+from trip_cache import bucket_budget, parse_amounts, trip_cache_key
+
+
+def cache_key(trip_request: dict, **changes) -> str:
+    return trip_cache_key(server.TripRequest(**{**trip_request, **changes}))[0]
+
+
+def test_duration_is_keyed_on_the_exact_day_count(trip_request):
+    assert cache_key(trip_request, duration="5 days") != cache_key(trip_request, duration="4 days")
+    assert cache_key(trip_request, duration="5 Days") == cache_key(trip_request, duration="5 days")
+    assert cache_key(trip_request, duration="1 week") == cache_key(trip_request, duration="7 days")
+
+
+@pytest.mark.parametrize("text, amounts", [
+    ("Budget-friendly (₹5,000-10,000)", [5000, 10000]),
+    ("Luxury (₹30,000+)", [30000]),
+    ("50k", [50000]),
+    ("₹1.5 lakh", [150000]),
+    ("₹1,50,000", [150000]),
+    ("₹1-1.5 lakh", [100000, 150000]),
+    ("Rs 20 to 30K", [20000, 30000]),
+    ("no idea", []),
+])
+def test_parse_amounts(text, amounts):
+    assert parse_amounts(text) == amounts
+
+
+@pytest.mark.parametrize("budget, bucket", [
+    ("₹8,000", "budget"),
+    ("50k", "luxury"),
+    ("₹1.5 lakh", "luxury"),
+    ("20k", "mid"),
+    ("₹10,000+", "mid"),
+    ("₹30,000+", "luxury"),
+    ("Moderate (₹10,000-30,000)", "mid"),
+])
+def test_bucket_budget_understands_shorthand(budget, bucket):
+    assert bucket_budget(budget) == bucket
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import mongomock_motor
+import pytest
+
+from llm_gateway import LlmGateway
+from trip_jobs import FAILED, RUNNING, SUCCEEDED, TripJobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+class BrokenProvider:
+    async def complete(self, text: str, system_message: str, session_id: str) -> str:
+        raise ValueError("model unavailable")
+
+
+async def finished_job(client, location: str, headers: dict) -> dict:
+    for _ in range(200):
+        job = (await client.get(location, headers=headers)).json()
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job never finished: {job}")
+
+
+async def test_async_trip_is_accepted_then_polled_to_completion(client, services, register, trip_request):
+    auth = await register()
+
+    response = await client.post("/api/trips?async=true", json=trip_request, headers=auth["headers"])
+
+    assert response.status_code == 202
+    job = response.json()
+    assert response.headers["Location"] == f"/api/trips/jobs/{job['id']}"
+    assert job["status"] == "queued"
+
+    job = await finished_job(client, response.headers["Location"], auth["headers"])
+    assert job["status"] == SUCCEEDED and job["stage"] == "done" and job["attempts"] == 1
+    trip = (await client.get(f"/api/trips/{job['trip_id']}", headers=auth["headers"])).json()
+    assert trip["destination"] == trip_request["destination"]
+    assert (await services.db.users.find_one({"id": auth["user"]["id"]}))["trips_this_month"] == 1
+    # Jobs are private to the account that queued them
+    other = await register("other@example.com")
+    assert (await client.get(response.headers["Location"], headers=other["headers"])).status_code == 404
+
+
+async def test_failing_job_is_retried_then_failed_and_refunded(client, services, register, trip_request):
+    services.llm = LlmGateway(BrokenProvider(), retries=0)
+    services.trip_jobs.retry_backoff_seconds = 0
+    auth = await register()
+
+    response = await client.post("/api/trips?async=true", json=trip_request, headers=auth["headers"])
+    job = await finished_job(client, response.headers["Location"], auth["headers"])
+
+    assert job["status"] == FAILED
+    assert job["attempts"] == services.trip_jobs.max_attempts == 3
+    assert "model unavailable" in job["error"]
+    assert services.trip_jobs.stats["retried"] == 2
+    assert (await services.db.users.find_one({"id": auth["user"]["id"]}))["trips_this_month"] == 0
+    assert await services.db.trips.count_documents({}) == 0
+
+
+def queue(handler, on_failure=None, **options) -> TripJobQueue:
+    async def ignore_failure(job, error):
+        pass
+    collection = mongomock_motor.AsyncMongoMockClient()["jobs_test"]["trip_jobs"]
+    return TripJobQueue(collection, handler, on_failure or ignore_failure, **options)
+
+
+async def expire_lease(jobs: TripJobQueue, job_id: str):
+    # What a worker that died mid-job leaves behind
+    await jobs.collection.update_one({"id": job_id}, {"$set": {"lease_until": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+
+
+async def test_expired_lease_is_taken_over_and_the_old_worker_is_fenced_off():
+    leases = []
+
+    async def handler(job, set_stage):
+        leases.append(job["lease_owner"])
+        await set_stage("generating")
+
+    jobs = queue(handler)
+    queued = await jobs.enqueue("user-1", {"destination": "Goa"})
+    stale = await jobs.claim()
+    assert await jobs.claim() is None
+
+    await expire_lease(jobs, queued["id"])
+    current = await jobs.claim()
+
+    assert current["id"] == queued["id"] and current["attempts"] == 2
+    assert current["lease_owner"] != stale["lease_owner"]
+    # The old worker wakes up: its writes no longer match the lease
+    await jobs.process(stale)
+    assert (await jobs.collection.find_one({"id": queued["id"]}))["status"] == RUNNING
+    await jobs.process(current)
+    assert (await jobs.get(queued["id"], "user-1"))["status"] == SUCCEEDED
+    assert leases == [stale["lease_owner"], current["lease_owner"]]
+
+
+async def test_worker_dying_on_the_last_attempt_fails_the_job():
+    failures = []
+
+    async def handler(job, set_stage):
+        raise AssertionError("never runs")
+
+    async def on_failure(job, error):
+        failures.append(error)
+
+    jobs = queue(handler, on_failure, max_attempts=1)
+    queued = await jobs.enqueue("user-1", {"destination": "Goa"})
+    await jobs.claim()
+    await expire_lease(jobs, queued["id"])
+
+    await jobs.process(await jobs.claim())
+
+    assert (await jobs.get(queued["id"], "user-1"))["status"] == FAILED
+    assert failures == ["Worker stopped while processing the job"]
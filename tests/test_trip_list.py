@@ -0,0 +1,20 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_count_and_cursor_cover_every_trip(client, services, register, trip_request):
+    auth = await register()
+    await services.db.users.update_one({"id": auth["user"]["id"]}, {"$set": {"subscription_plan": "pro"}})
+    services.invalidate_cached_user(auth["user"]["id"])
+    for destination in ("Goa", "Jaipur", "Leh"):
+        response = await client.post("/api/trips", json={**trip_request, "destination": destination}, headers=auth["headers"])
+        assert response.status_code == 200, response.text
+
+    first = await client.get("/api/trips?limit=2", headers=auth["headers"])
+    rest = await client.get("/api/trips", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]}, headers=auth["headers"])
+    count = await client.get("/api/trips/count", headers=auth["headers"])
+
+    assert [trip["destination"] for trip in first.json() + rest.json()] == ["Leh", "Jaipur", "Goa"]
+    assert "X-Next-Cursor" not in rest.headers
+    assert count.json() == {"count": 3}
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from llm_gateway import FakeProvider, LlmGateway
+from trip_pipeline import PipelineStep, run_pipeline
+
+pytestmark = pytest.mark.anyio
+
+STEP_SECONDS = 0.3
+
+
+def sleeping_step(name: str, seconds: float) -> PipelineStep:
+    async def run():
+        await asyncio.sleep(seconds)
+        return name
+    return PipelineStep(name, run, timeout=5)
+
+
+async def test_steps_run_concurrently():
+    started = time.perf_counter()
+    results = await run_pipeline([sleeping_step("itinerary", STEP_SECONDS), sleeping_step("budget", STEP_SECONDS / 2)])
+    elapsed = time.perf_counter() - started
+
+    assert results == {"itinerary": "itinerary", "budget": "budget"}
+    # The slowest step, not the sum of both
+    assert elapsed < STEP_SECONDS * 1.4
+
+
+async def test_failed_step_uses_fallback_without_waiting_for_others():
+    async def fail():
+        raise RuntimeError("boom")
+
+    started = time.perf_counter()
+    results = await run_pipeline([
+        sleeping_step("itinerary", STEP_SECONDS),
+        PipelineStep("budget", fail, timeout=5, fallback=lambda: "estimate")
+    ])
+
+    assert results["budget"] == "estimate"
+    assert time.perf_counter() - started < STEP_SECONDS * 1.4
+
+
+async def test_generate_trip_content_overlaps_llm_calls(services, monkeypatch, trip_request):
+    # With refinement on, the itinerary and the budget are two LLM calls
+    monkeypatch.setattr(server, "BUDGET_LLM_REFINEMENT", True)
+    services.llm = LlmGateway(FakeProvider(delay=STEP_SECONDS))
+
+    started = time.perf_counter()
+    content = await server.generate_trip_content(services, server.TripRequest(**trip_request), "user-1")
+    elapsed = time.perf_counter() - started
+
+    assert services.llm.stats["calls"] == 2
+    assert content["itinerary"]
+    assert content["budget_breakdown"]["total"] > 0
+    assert elapsed < STEP_SECONDS * 1.6
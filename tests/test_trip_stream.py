@@ -0,0 +1,126 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from llm_gateway import FakeProvider, LlmGateway
+from trip_cache import trip_cache_key
+
+pytestmark = pytest.mark.anyio
+
+
+class StallingProvider:
+    """Streams one chunk, then waits until cancelled."""
+
+    def __init__(self):
+        self.cancelled = asyncio.Event()
+
+    async def stream(self, text: str, system_message: str, session_id: str):
+        yield "# Goa\n"
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+        yield "never sent"
+
+
+def parse_events(body: str) -> list:
+    events = []
+    for raw in body.split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in raw.split("\n") if line.startswith(("event: ", "data: ")))
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def test_stream_sends_itinerary_budget_and_saved_trip(client, register, trip_request):
+    auth = await register()
+
+    response = await client.post("/api/trips/stream", json=trip_request, headers=auth["headers"])
+    events = parse_events(response.text)
+
+    names = [name for name, _ in events]
+    assert names[0] == "start" and names[-2:] == ["budget", "done"]
+    itinerary = "".join(data["text"] for name, data in events if name == "chunk")
+    assert events[-1][1]["itinerary"] == itinerary
+    assert events[-1][1]["budget_breakdown"] == events[-2][1]
+
+
+async def test_concurrent_streams_share_one_generation(client, services, register, trip_request):
+    services.llm = LlmGateway(FakeProvider(delay=0.2), per_user_concurrency=8)
+    auth = await register()
+    # Free accounts only get two trips
+    await services.db.users.update_one({"id": auth["user"]["id"]}, {"$set": {"subscription_plan": "pro"}})
+    services.invalidate_cached_user(auth["user"]["id"])
+
+    streams = [client.post("/api/trips/stream", json=trip_request, headers=auth["headers"]) for _ in range(3)]
+    responses = await asyncio.gather(*streams, client.post("/api/trips", json=trip_request, headers=auth["headers"]))
+
+    itineraries = {parse_events(r.text)[-1][1]["itinerary"] for r in responses[:3]} | {responses[3].json()["itinerary"]}
+    assert len(itineraries) == 1
+    assert services.llm.stats["calls"] == 1
+    assert services.trip_cache.stats["coalesced"] == 3
+
+
+async def test_cache_hits_get_a_fresh_budget(client, services, register, trip_request):
+    # An entry cached before budgets moved out of the cache
+    key, params = trip_cache_key(server.TripRequest(**trip_request))
+    await services.db.itinerary_cache.insert_one({
+        "key": key, "params": params, "itinerary": "# Cached Goa itinerary",
+        "budget_breakdown": {"accommodation": "₹6000", "food": "₹3000"},
+        "expires_at": datetime.now(timezone.utc) + timedelta(hours=1)
+    })
+    auth = await register()
+
+    trip = (await client.post("/api/trips", json=trip_request, headers=auth["headers"])).json()
+    events = parse_events((await client.post("/api/trips/stream", json=trip_request, headers=auth["headers"])).text)
+
+    expected = services.budget_engine.estimate(trip_request["destination"], trip_request["duration"], trip_request["budget"], trip_request["travel_style"])
+    assert trip["itinerary"] == events[-1][1]["itinerary"] == "# Cached Goa itinerary"
+    assert trip["budget_breakdown"] == events[-1][1]["budget_breakdown"] == expected
+    assert services.llm.stats["calls"] == 0
+
+
+async def test_disconnect_cancels_the_llm_call(client, services, register, trip_request):
+    provider = StallingProvider()
+    services.llm = LlmGateway(provider)
+    auth = await register()
+    user = server.User(**auth["user"])
+    reservation = await services.quota.reserve(user, "trip")
+
+    events = server.stream_trip_events(services, server.TripRequest(**trip_request), user.id, reservation)
+    while not (await events.__anext__()).startswith("event: chunk"):
+        pass
+    # What Starlette does when the client closes the connection
+    await events.aclose()
+
+    await asyncio.wait_for(provider.cancelled.wait(), timeout=1)
+    await asyncio.sleep(0.05)
+    assert services.llm.snapshot()["in_flight"] == 0
+    assert services.trip_cache.snapshot()["inflight"] == 0
+    assert services.trip_cache.stats["abandoned"] == 1
+    assert await services.db.itinerary_cache.count_documents({}) == 0
+    # The reservation is refunded
+    assert (await services.db.users.find_one({"id": user.id}))["trips_this_month"] == 0
+
+
+async def test_shared_generation_survives_one_disconnect(client, services, register, trip_request):
+    services.llm = LlmGateway(FakeProvider(delay=0.2))
+    auth = await register()
+    user = server.User(**auth["user"])
+    request = server.TripRequest(**trip_request)
+    key, params = trip_cache_key(request)
+
+    first = server.stream_trip_events(services, request, user.id, await services.quota.reserve(user, "trip"))
+    while not (await first.__anext__()).startswith("event: chunk"):
+        pass
+    # A second caller joins the generation, then the first one leaves
+    second = asyncio.create_task(services.trip_cache.get_or_generate(key, params, None))
+    await asyncio.sleep(0)
+    await first.aclose()
+
+    assert (await second)["itinerary"].startswith("# Fake itinerary")
+    assert services.trip_cache.stats["abandoned"] == 0
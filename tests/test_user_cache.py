@@ -0,0 +1,41 @@
+import pytest
+
+from quota import current_period
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_subscription_upgrade_is_visible_immediately(client, register, trip_request):
+    auth = await register()
+    # Caches the free-plan user
+    assert (await client.get("/api/auth/me", headers=auth["headers"])).json()["subscription_plan"] == "free"
+
+    response = await client.post("/api/subscription/verify", json={"mock": True, "plan": "pro"}, headers=auth["headers"])
+    assert response.json()["success"] is True
+
+    me = (await client.get("/api/auth/me", headers=auth["headers"])).json()
+    assert me["subscription_plan"] == "pro"
+    # Past the free plan's two trips straight away
+    for _ in range(3):
+        response = await client.post("/api/trips", json=trip_request, headers=auth["headers"])
+        assert response.status_code == 200, response.text
+
+
+async def test_usage_counters_are_fresh_after_trip(client, register, trip_request):
+    auth = await register()
+    await client.get("/api/auth/me", headers=auth["headers"])
+
+    await client.post("/api/trips", json=trip_request, headers=auth["headers"])
+
+    assert (await client.get("/api/auth/me", headers=auth["headers"])).json()["trips_this_month"] == 1
+
+
+async def test_monthly_reset_drops_cached_users(client, services, register, trip_request):
+    auth = await register()
+    await client.post("/api/trips", json=trip_request, headers=auth["headers"])
+    assert (await client.get("/api/auth/me", headers=auth["headers"])).json()["trips_this_month"] == 1
+
+    await services.db.users.update_one({"id": auth["user"]["id"]}, {"$set": {"quota_period": "2000-01"}})
+    assert await services.quota.reset_period(current_period()) == 1
+
+    assert (await client.get("/api/auth/me", headers=auth["headers"])).json()["trips_this_month"] == 0